@@ -0,0 +1,256 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from metrics import peak_rss_bytes
+
+# Columnar cache of the Strava export. The CSV is parsed once into typed NumPy
+# arrays with dates, units and run filtering already normalized; later reads
+# load the arrays directly. When the export only grew, just the new rows are
+# parsed and appended.
+#
+# Parsing streams the CSV in INGEST_CHUNK_ROWS chunks, reads only the columns
+# below (no descriptions, gear, etc.; Filename is for streams.py) and keeps
+# only runs, so memory is bound by the runs kept rather than by the size of
+# the export. Distance and time
+# are stored as float32. Units (meters or miles) are detected from the median
+# distance of all the runs read, not just the first chunk.
+#
+# The web app refreshes a store from request threads and the scheduler at
+# once, and the CLI can run next to it, so the check-and-rebuild runs under a
+# per-path thread lock plus an flock on a sidecar .store.lock file, and temp
+# files carry the pid and thread id.
+
+RUN_TYPES = ["Run", "Virtual Run"]
+METERS_PER_MILE = 1609.34
+STORE_VERSION = 4
+TAIL_CHECK_BYTES = 4096
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))
+INGEST_COLUMNS = ("Activity Date", "Activity Type", "Activity Name", "Distance", "Moving Time", "Elapsed Time",
+                  "Filename")
+
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+@contextmanager
+def _store_lock(csv_path: str):
+    base, _ = os.path.splitext(csv_path)
+    with _path_locks_guard:
+        lock = _path_locks.setdefault(os.path.abspath(csv_path), threading.Lock())
+    with lock, open(base + ".store.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def store_paths(csv_path: str):
+    base, _ = os.path.splitext(csv_path)
+    return base + ".store.npz", base + ".store.json"
+
+def source_key(csv_path: str) -> dict:
+    st = os.stat(csv_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _tail_digest(csv_path: str, end: int) -> str:
+    # Cheap fingerprint of the bytes just before `end`, used to confirm the
+    # file was appended to rather than rewritten.
+    start = max(0, end - TAIL_CHECK_BYTES)
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+def _detect_unit_divisor(distance: pd.Series) -> float:
+    # Same heuristic as summarize_runner.to_miles: huge medians mean meters.
+    med = pd.to_numeric(distance, errors="coerce").dropna().median()
+    if pd.notna(med) and med > 1000:
+        return METERS_PER_MILE
+    return 1.0
+
+def _seconds(series: pd.Series) -> pd.Series:
+    # Strava can be hh:mm:ss (string) or seconds (numeric)
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        return pd.to_timedelta(series, errors="coerce").dt.total_seconds()
+    return pd.to_numeric(series, errors="coerce")
+
+def normalize(df: pd.DataFrame, unit_divisor=None):
+    """Reduce a raw Strava frame to the typed columns the analytics use, runs only."""
+    if "Distance" not in df.columns:
+        raise ValueError("No Distance column found in Strava CSV.")
+    if unit_divisor is None:
+        unit_divisor = _detect_unit_divisor(df["Distance"])
+
+    if "Moving Time" in df.columns:
+        seconds = _seconds(df["Moving Time"])
+    elif "Elapsed Time" in df.columns:
+        seconds = _seconds(df["Elapsed Time"])
+    else:
+        seconds = pd.Series(np.nan, index=df.index)
+
+    types = df["Activity Type"].astype(str) if "Activity Type" in df.columns else pd.Series("Run", index=df.index)
+    names = df["Activity Name"].astype(str).str[:80] if "Activity Name" in df.columns else pd.Series("", index=df.index)
+    # the run's GPS/FIT file in a bulk export (streams.py), "" if none
+    files = df["Filename"].fillna("").astype(str) if "Filename" in df.columns else pd.Series("", index=df.index)
+    dates = pd.to_datetime(df["Activity Date"], errors="coerce")
+
+    cols = {
+        "date": dates.to_numpy(dtype="datetime64[ns]"),
+        "activity_type": types.to_numpy(dtype=str),
+        "name": names.to_numpy(dtype=str),
+        "filename": files.to_numpy(dtype=str),
+        "distance_mi": (pd.to_numeric(df["Distance"], errors="coerce") / unit_divisor).to_numpy(dtype="float32"),
+        "moving_seconds": seconds.to_numpy(dtype="float32"),
+    }
+    keep = ~np.isnat(cols["date"]) & types.isin(RUN_TYPES).to_numpy(dtype=bool)
+    return {k: v[keep] for k, v in cols.items()}, unit_divisor
+
+def _projection(header: list):
+    # columns to read, and the rename for exports without "Activity Date"
+    rename = {}
+    if "Activity Date" not in header:
+        date_cols = [c for c in header if "Date" in c]
+        if not date_cols:
+            raise ValueError("No date column found in Strava CSV.")
+        rename[date_cols[0]] = "Activity Date"
+    if "Distance" not in header:
+        raise ValueError("No Distance column found in Strava CSV.")
+    return [c for c in header if c in INGEST_COLUMNS or c in rename], rename
+
+def peak_rss_mb():
+    peak = peak_rss_bytes()
+    return None if peak is None else round(peak / 2 ** 20, 1)
+
+def _ingest(f, header: list, unit_divisor=None, has_header=True):
+    """Stream run rows of the projected columns from an open CSV (at its start or an offset)."""
+    usecols, rename = _projection(header)
+    t0 = time.perf_counter()
+    reader = pd.read_csv(
+        f, header=0 if has_header else None, names=header, usecols=usecols,
+        dtype={"Activity Type": "category", "Activity Name": str, "Filename": str}, chunksize=INGEST_CHUNK_ROWS,
+    )
+    parts, rows = [], 0
+    for chunk in reader:
+        rows += len(chunk)
+        chunk = chunk.rename(columns=rename)
+        chunk["Activity Date"] = pd.to_datetime(chunk["Activity Date"], errors="coerce")
+        # raw distances until every chunk has been seen, unless the units are known
+        cols, _ = normalize(chunk, unit_divisor or 1.0)
+        parts.append(cols)
+    if not parts:
+        parts.append(normalize(pd.DataFrame(columns=usecols).rename(columns=rename), 1.0)[0])
+    # one column at a time, dropping its chunks as we go, so the runs are held
+    # about once rather than twice
+    cols = {k: np.concatenate([p.pop(k) for p in parts]) for k in list(parts[0])}
+    if unit_divisor is None:
+        unit_divisor = _detect_unit_divisor(pd.Series(cols["distance_mi"]))
+        if unit_divisor != 1.0:
+            cols["distance_mi"] = (cols["distance_mi"] / np.float32(unit_divisor)).astype("float32")
+    seconds = time.perf_counter() - t0
+    stats = {
+        "rows_read": rows,
+        "runs_kept": int(len(cols["date"])),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return cols, unit_divisor, stats
+
+def _read_header(csv_path: str) -> list:
+    return list(pd.read_csv(csv_path, nrows=0).columns)
+
+def _save(npz_path, meta_path, cols, meta):
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp = npz_path + suffix + ".npz"
+    np.savez(tmp, **cols)
+    os.replace(tmp, npz_path)
+    tmp = meta_path + suffix
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path)
+
+def _load_meta(meta_path):
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if meta.get("version") == STORE_VERSION else None
+
+def _full_ingest(csv_path):
+    header = _read_header(csv_path)
+    with open(csv_path, "rb") as f:
+        cols, unit_divisor, stats = _ingest(f, header)
+    return cols, {"header": header, "unit_divisor": unit_divisor or 1.0, "ingest": stats}
+
+def refresh_store(csv_path: str) -> dict:
+    """Bring the on-disk store up to date with the CSV and return its arrays."""
+    with _store_lock(csv_path):
+        return _refresh_locked(csv_path)
+
+def _refresh_locked(csv_path: str) -> dict:
+    npz_path, meta_path = store_paths(csv_path)
+    key = source_key(csv_path)
+    meta = _load_meta(meta_path)
+
+    if meta and meta["source"] == key and os.path.exists(npz_path):
+        with np.load(npz_path) as z:
+            return {k: z[k] for k in z.files}
+
+    cols = None
+    if (
+        meta
+        and os.path.exists(npz_path)
+        and key["size"] > meta["source"]["size"]
+        and _tail_digest(csv_path, meta["source"]["size"]) == meta["tail_digest"]
+    ):
+        # Export grew: parse only the appended rows.
+        with open(csv_path, "rb") as f:
+            f.seek(meta["source"]["size"])
+            new_cols, _, stats = _ingest(f, meta["header"], meta["unit_divisor"], has_header=False)
+        with np.load(npz_path) as z:
+            cols = {k: np.concatenate([z[k], new_cols[k]]) for k in z.files}
+        info = {"header": meta["header"], "unit_divisor": meta["unit_divisor"], "ingest": stats}
+
+    if cols is None:
+        cols, info = _full_ingest(csv_path)
+
+    meta = {
+        "version": STORE_VERSION,
+        "source": key,
+        "tail_digest": _tail_digest(csv_path, key["size"]),
+        "rows": int(len(cols["date"])),
+        **info,
+    }
+    _save(npz_path, meta_path, cols, meta)
+    return cols
+
+def load_activities(csv_path: str) -> pd.DataFrame:
+    """
+    Runs from the columnar store as a DataFrame. Column names follow the
+    Strava export so existing analytics keep working, but values are already
+    normalized: Distance is in miles and Moving Time in seconds.
+    """
+    cols = refresh_store(csv_path)
+    return pd.DataFrame({
+        "Activity Date": cols["date"],
+        "Activity Type": cols["activity_type"],
+        "Activity Name": cols["name"],
+        "Distance": cols["distance_mi"],
+        "Moving Time": cols["moving_seconds"],
+    })
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/activities.csv"
+    cols = refresh_store(path)
+    print(f"✅ {len(cols['date'])} runs cached for {path}")
+    stats = (_load_meta(store_paths(path)[1]) or {}).get("ingest")
+    if stats:
+        print(f"   last ingest: {stats['rows_read']} rows in {stats['seconds']} s "
+              f"({stats['rows_per_sec']} rows/s), peak RSS {stats['peak_rss_mb']} MB")
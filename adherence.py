@@ -0,0 +1,164 @@
+from datetime import date
+
+import numpy as np
+from analytics import daily_rollup, run_columns
+from plan_tools import compile_plan, get_date_range
+from workouts import parse_workout
+
+# Plan vs actual. The compiled plan is flattened once into per-day arrays
+# (date, week, parsed target), the activity store into per-day kilometres,
+# and the two are joined by date with a searchsorted merge. Day statuses
+# and the per-week and whole-plan totals are then array operations.
+#
+# Day status: done (planned run, ran), missed (planned run, didn't),
+# skipped_optional, extra (rest/cross day but ran), rest, upcoming (after
+# as_of).
+
+KM_PER_MILE = 1.60934
+RUN_KINDS = ("run", "race")
+
+def plan_table(plan) -> dict:
+    """Per-day arrays for the whole plan, built once per compiled plan."""
+    plan = compile_plan(plan)
+    table = getattr(plan, "_day_table", None)
+    if table is not None:
+        return table
+    days, weeks, texts, parsed = [], [], [], []
+    for i, w in enumerate(plan["weeks"]):
+        start, end = get_date_range(w)
+        for d in np.arange(np.datetime64(start), np.datetime64(end) + 1):
+            if plan.by_date.get(d.astype(date)) != i:
+                continue
+            text = w["sessions"].get(d.astype(date).strftime("%A"))
+            days.append(d)
+            weeks.append(i)
+            texts.append(text)
+            parsed.append(parse_workout(text))
+    order = np.argsort(np.array(days, dtype="datetime64[D]"), kind="stable")
+    kind = np.array([p["kind"] for p in parsed], dtype=object)[order]
+    table = {
+        "day": np.array(days, dtype="datetime64[D]")[order],
+        "week": np.array(weeks, dtype=np.int64)[order],
+        "text": np.array(texts, dtype=object)[order],
+        "planned_km": np.array([p["distance_km"] or 0.0 for p in parsed])[order],
+        "is_run": np.isin(kind, RUN_KINDS),
+        "optional": np.array([p["optional"] for p in parsed], dtype=bool)[order],
+        "type": np.array([p["type"] for p in parsed], dtype=object)[order],
+    }
+    plan._day_table = table
+    return table
+
+def actual_km_by_day(cols: dict):
+    daily = daily_rollup(run_columns(cols))
+    return daily["day"], daily["miles"] * KM_PER_MILE
+
+def compute_adherence(plan, cols: dict, as_of: date = None) -> dict:
+    plan = compile_plan(plan)
+    t = plan_table(plan)
+    as_of = np.datetime64(as_of or date.today(), "D")
+    if len(t["day"]) == 0:
+        return None
+
+    act_days, act_km = actual_km_by_day(cols)
+    actual = np.zeros(len(t["day"]))
+    if len(act_days):
+        idx = np.minimum(np.searchsorted(act_days, t["day"]), len(act_days) - 1)
+        hit = act_days[idx] == t["day"]
+        actual[hit] = act_km[idx[hit]]
+
+    past = t["day"] <= as_of
+    actual[~past] = 0.0
+    ran = actual > 0
+    status = np.select(
+        [~past, t["is_run"] & ran, t["is_run"] & t["optional"], t["is_run"], ran],
+        ["upcoming", "done", "skipped_optional", "missed", "extra"],
+        default="rest",
+    )
+
+    # runs on span days the plan doesn't cover also count as extra
+    lo = np.searchsorted(act_days, t["day"][0], side="left")
+    hi = np.searchsorted(act_days, min(t["day"][-1], as_of), side="right")
+    in_span = act_days[lo:hi]
+    unplanned = ~np.isin(in_span, t["day"])
+    extra_unplanned = int(unplanned.sum())
+    extra_unplanned_km = float(act_km[lo:hi][unplanned].sum())
+
+    n_weeks = len(plan["weeks"])
+    def per_week(mask, values=None):
+        w = values[mask] if values is not None else None
+        return np.bincount(t["week"][mask], weights=w, minlength=n_weeks)
+
+    required = t["is_run"] & ~t["optional"]
+    week_planned = per_week(np.ones(len(t["day"]), dtype=bool), t["planned_km"])
+    week_planned_to_date = per_week(past, t["planned_km"])
+    week_actual = per_week(past, actual)
+    week_sessions = per_week(past & required)
+    week_done = per_week(status == "done")
+    week_missed = per_week(status == "missed")
+    week_extra = per_week(status == "extra")
+    has_days = per_week(np.ones(len(t["day"]), dtype=bool)) > 0
+
+    weeks = []
+    for i, w in enumerate(plan["weeks"]):
+        if not has_days[i]:
+            continue
+        start, end = get_date_range(w)
+        weeks.append({
+            "week_label": w["week_label"],
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "planned_km": round(float(week_planned[i]), 1),
+            "planned_km_to_date": round(float(week_planned_to_date[i]), 1),
+            "actual_km": round(float(week_actual[i]), 1),
+            "sessions_to_date": int(week_sessions[i]),
+            "done": int(week_done[i]),
+            "missed": int(week_missed[i]),
+            "extra": int(week_extra[i]),
+            "km_ratio": round(float(week_actual[i] / week_planned_to_date[i]), 2)
+                        if week_planned_to_date[i] > 0 else None,
+        })
+
+    planned_to_date = float(t["planned_km"][past].sum())
+    sessions = int((past & required).sum())
+    done = int((status == "done").sum())
+    totals = {
+        "as_of": str(as_of),
+        "planned_km": round(float(t["planned_km"].sum()), 1),
+        "planned_km_to_date": round(planned_to_date, 1),
+        "actual_km": round(float(actual[past].sum()) + extra_unplanned_km, 1),
+        "km_ratio": round((float(actual[past].sum()) + extra_unplanned_km) / planned_to_date, 2)
+                    if planned_to_date > 0 else None,
+        "sessions_to_date": sessions,
+        "done": done,
+        "missed": int((status == "missed").sum()),
+        "extra": int((status == "extra").sum()) + extra_unplanned,
+        "completion": round(done / sessions, 2) if sessions else None,
+    }
+    days = [{
+        "date": str(d),
+        "workout": text or "OFF",
+        "type": typ,
+        "planned_km": round(float(p), 1),
+        "actual_km": round(float(a), 1),
+        "status": s,
+    } for d, text, typ, p, a, s in zip(t["day"], t["text"], t["type"], t["planned_km"], actual, status)]
+    return {"plan": totals, "weeks": weeks, "days": days}
+
+def adherence_summary(report: dict, as_of: date = None):
+    """Whole-plan totals plus the current and previous week, for status and prompts."""
+    if not report:
+        return None
+    as_of = (as_of or date.today()).isoformat()
+    weeks = report["weeks"]
+    i = next((k for k, w in enumerate(weeks) if w["start"] <= as_of <= w["end"]), None)
+    if i is None:
+        # outside the plan: the last week that already started, if any
+        started = [k for k, w in enumerate(weeks) if w["start"] <= as_of]
+        i = started[-1] if started else None
+    current = weeks[i] if i is not None else None
+    previous = weeks[i - 1] if i else None
+    recent = [{"date": d["date"], "workout": d["workout"], "status": d["status"],
+               "actual_km": d["actual_km"]}
+              for d in report["days"] if current and current["start"] <= d["date"] <= current["end"]]
+    return {"plan": report["plan"], "current_week": current, "previous_week": previous,
+            "current_week_days": recent}
@@ -1,50 +1,118 @@
 import json
+import os
+import sys
 from datetime import datetime
+from functools import cached_property
 
-from load_data import load_strava_activities
-from summarize_runner import summarize_runs
+from athletes import athlete_paths, DEFAULT_ATHLETE
+from llm_backends import LazyLLM
 from prompt_builder import build_prompt
-from llm_openai import call_llm
+from coach_prompt import coach_chat_context
+from chat_sessions import ChatSession, converse
+from memory_store import MemoryStore, RECENT_NOTES
+from metrics import request, stage, timed_call
 from plan_tools import load_plan, get_week, pretty_week, workout_on
 from datetime import date, timedelta
 from plan_tools import week_for_date, next_week
-from coach_prompt import build_coach_chat_prompt
 from datetime import date
 
-MEMORY_PATH = "memory.json"
-DATA_PATH = "data/activities.csv"
+# pandas/NumPy (analytics) and the OpenAI SDK are imported on first use, so
+# plan-only commands start without them. Check with: python import_report.py
+
+# MARATHON_ATHLETE picks whose files the terminal agent works on (see athletes.py)
+ATHLETE = os.getenv("MARATHON_ATHLETE", DEFAULT_ATHLETE)
+_paths = athlete_paths(ATHLETE)
+MEMORY_PATH = _paths["memory"]
+DATA_PATH = _paths["activities"]
+HISTORY_PATH = _paths["history"]
+PLAN_PATH = _paths["plan"]
+
+# backend chosen by MARATHON_LLM_BACKEND (see llm_backends.py); the default
+# answers identical prompts (same data, same question) from disk
+call_llm = LazyLLM()
+
+# "plan" is built locally (plan_rules.py); set to 1 to have the LLM reword it
+PLAN_LLM = os.getenv("MARATHON_PLAN_LLM", "0") == "1"
+
+memory_store = MemoryStore(MEMORY_PATH)
 
 def load_memory():
-    with open(MEMORY_PATH, "r") as f:
-        return json.load(f)
+    return memory_store.load()
 
 def save_memory(mem):
-    with open(MEMORY_PATH, "w") as f:
-        json.dump(mem, f, indent=2)
+    # persist top-level keys through the journal; notes go through add_note
+    for key, value in mem.items():
+        if key != "notes":
+            memory_store.set(key, value)
 
 def get_training_summary():
-    df = load_strava_activities(DATA_PATH)
-    return summarize_runs(df)
+    from analytics import training_summary
+    return training_summary(DATA_PATH)
+
+def get_status_windows():
+    # 7/28/56/365-day views ending on the latest activity
+    from rolling_stats import status_windows
+    return status_windows(DATA_PATH)
+
+def get_training_load():
+    # acute/chronic load and form, checkpointed next to the activity store
+    from training_load import training_load
+    return training_load(DATA_PATH)
 
-def generate_plan(mem):
+def get_adherence():
+    # plan vs actual for the whole reference plan, as of today
+    from activity_store import refresh_store
+    from adherence import adherence_summary, compute_adherence
+    return adherence_summary(compute_adherence(load_plan(PLAN_PATH), refresh_store(DATA_PATH)))
+
+def get_training_report():
+    # summary + history from one pass over the activity store
+    from analytics import training_report
+    return training_report(DATA_PATH)
+
+def generate_plan(mem, ask=None, plan_ref=None):
+    """
+    This week's plan from plan_rules, without an LLM call; recent injury notes
+    hold and cut its volume. The LLM is asked only for a special request or,
+    with MARATHON_PLAN_LLM=1, to reword the local plan; a reply that fails the
+    plan checks is rejected and the local plan kept.
+    """
+    from plan_rules import PlanRejected, injury_notes, llm_plan, local_plan, plan_limits
     runner = mem["runner_profile"]
     summary = get_training_summary()
-
-    # include notes in the prompt (injuries, soreness, constraints)
+    load = get_training_load()
+    reference = week_for_date(plan_ref or load_plan(PLAN_PATH), date.today())
     notes = mem.get("notes", [])
-    runner_context = dict(runner)
-    runner_context["notes"] = notes
 
-    prompt = build_prompt(runner_context, summary)
-    response = call_llm(prompt)  # swap this later with real LLM API
-    plan = json.loads(response)
+    with stage("plan_rules"):
+        limits = plan_limits(runner, summary, load, notes)
+        plan = local_plan(runner, summary, load, reference, notes)
+    last_plan = {"source": "rules"}
+    flagged = injury_notes(notes)
+    if flagged:
+        last_plan["injury_notes"] = flagged
+
+    if ask or PLAN_LLM:
+        # include notes in the prompt (injuries, soreness, constraints)
+        runner_context = dict(runner)
+        runner_context["notes"] = notes
+        with stage("build_prompt"):
+            prompt = build_prompt(runner_context, summary, training_load=load, draft=plan, request=ask)
+        response = timed_call(call_llm, prompt, call_llm.model)
+        try:
+            plan = llm_plan(response, limits, reference)
+            last_plan["source"] = "llm"
+        except PlanRejected as e:
+            call_llm.discard(prompt)  # don't replay it next time
+            last_plan["rejected"] = e.violations
 
     mem["last_plan"] = {
         "generated_at": datetime.now().isoformat(timespec="seconds"),
         "summary": summary,
-        "plan": plan
+        "plan": plan,
+        **last_plan,
     }
-    save_memory(mem)
+    memory_store.set("last_plan", mem["last_plan"])
     return plan, summary
 
 def show_last_plan(mem):
@@ -57,11 +125,12 @@ def show_last_plan(mem):
         print(f"  {day}: {workout}")
 
 def add_note(mem, note_text):
-    mem.setdefault("notes", []).append({
+    note = {
         "time": datetime.now().isoformat(timespec="seconds"),
         "text": note_text
-    })
-    save_memory(mem)
+    }
+    memory_store.add_note(note)
+    mem.setdefault("notes", []).append(note)
     print("Saved note ✅")
 
 def show_status(mem):
@@ -69,14 +138,28 @@ def show_status(mem):
     print("\nTraining status (last 56 days):")
     for k, v in summary.items():
         print(f"  {k}: {v}")
-    notes = mem.get("notes", [])
+    load = get_training_load()
+    if load:
+        print(f"\nTraining load (as of {load['as_of']}, weekly-mile equivalents):")
+        print(f"  acute (7d): {load['acute_weekly_miles']}  chronic (28d): {load['chronic_weekly_miles']}")
+        print(f"  acute:chronic ratio: {load['acwr']} ({load['acwr_zone']})  form: {load['form']:+}")
+    adherence = get_adherence()
+    if adherence:
+        p = adherence["plan"]
+        print("\nPlan adherence (to date):")
+        print(f"  {p['actual_km']} of {p['planned_km_to_date']} planned km; "
+              f"{p['done']}/{p['sessions_to_date']} sessions done, {p['missed']} missed, {p['extra']} extra")
+        week = adherence["current_week"]
+        if week:
+            print(f"  {week['week_label']}: {week['actual_km']} of {week['planned_km']} km")
+    notes = memory_store.recent_notes(5)
     if notes:
         print("\nNotes:")
-        for n in notes[-5:]:
-            print(f"  - {n['time']}: {n['text']}")
-def load_runner_history(path="runner_history.json"):
+        for n in notes:
+            print(f"  - {n.get('time') or n.get('ts')}: {n['text']}")
+def load_runner_history(path=HISTORY_PATH):
     try:
-        with open(path, "r") as f:
+        with stage("load_runner_history"), open(path, "r") as f:
             return json.load(f)
     except FileNotFoundError:
         return None
@@ -85,21 +168,145 @@ def load_runner_history(path="runner_history.json"):
 def help_text():
     print("""
 Commands:
-  plan                Generate a new 7-day plan (uses Strava + profile + notes)
+  plan                Generate a new 7-day plan (uses Strava + profile + notes + reference plan)
+  plan <request>      Ask the coach to adjust it (e.g., plan I'm away Thursday to Saturday)
   last                Show last generated plan
-  status              Show training summary + recent notes
+  status              Show training summary, training load + recent notes
   note <text>         Save a note (e.g., soreness, schedule changes)
   profile             Show runner profile
   plan week <n>         Show a specific week from your reference plan (e.g., plan week 1)
   plan today            Show today's scheduled workout from reference plan
   plan tomorrow         Show tomorrow's scheduled workout from reference plan
   chat <question>       Ask coaching questions about your reference plan + your training
+                        (follow-ups continue the conversation; "chat new" starts over)
   exit                Quit
+
+Any command can also be run once from the shell: python3 agent.py plan today
 """.strip())
 
-def main():
-    mem = load_memory()
-    plan_ref = load_plan()
+class Session:
+    # memory and plan are loaded the first time a command needs them
+    @cached_property
+    def mem(self):
+        return load_memory()
+
+    @cached_property
+    def plan_ref(self):
+        return load_plan(PLAN_PATH)
+
+    @cached_property
+    def chat(self):
+        return ChatSession("cli", ATHLETE)
+
+def show_new_plan(session, ask=None):
+    plan, summary = generate_plan(session.mem, ask, session.plan_ref)
+    flagged = session.mem["last_plan"].get("injury_notes")
+    if flagged:
+        print("\n🩹 Holding back volume this week because of your notes:")
+        for n in flagged:
+            print(f"  - {n.get('time') or n.get('ts')}: {n['text']}")
+    rejected = session.mem["last_plan"].get("rejected")
+    if rejected:
+        print("\n⚠️  The coach's plan broke the training rules, keeping the standard plan:")
+        for v in rejected:
+            print(f"  - {v['message']}")
+    print("\n✅ Generated plan:")
+    for day, workout in plan.items():
+        print(f"  {day}: {workout}")
+
+def handle(cmd, session):
+    """Run one command. Returns False when the user asked to quit."""
+    if cmd == "help":
+        help_text()
+    elif cmd == "exit":
+        print("bye!")
+        return False
+    elif cmd == "profile":
+        print(json.dumps(session.mem["runner_profile"], indent=2))
+    elif cmd == "status":
+        show_status(session.mem)
+    elif cmd == "plan":
+        show_new_plan(session)
+    elif cmd == "last":
+        show_last_plan(session.mem)
+    elif cmd == "note":
+        note_text = input("note> ").strip()
+        if note_text:
+            add_note(session.mem, note_text)
+        else: 
+            print("No note saved.")
+    elif cmd.startswith("note "):
+        add_note(session.mem, cmd[len("note "):].strip())
+    elif cmd.startswith("plan week "):
+        wk = cmd[len("plan week "):].strip()
+        w = get_week(session.plan_ref, f"Week {wk}" if wk.isdigit() else wk)
+        if not w:
+            print("Week not found. Try: plan week 1")
+        else:
+            print(pretty_week(w))
+
+    elif cmd == "plan today":
+        wk, dow, workout = workout_on(session.plan_ref, date.today())
+        print(f"{wk or 'Unknown week'} — {dow}: {workout or 'No workout found'}")
+
+    elif cmd == "plan tomorrow":
+        d = date.today() + timedelta(days=1)
+        wk, dow, workout = workout_on(session.plan_ref, d)
+        print(f"{d.isoformat()} ({wk or 'Unknown week'}) — {dow}: {workout or 'No workout found'}")
+    
+    elif cmd.startswith("plan "):
+        show_new_plan(session, cmd[len("plan "):].strip())
+
+    elif cmd == "chat new":
+        session.__dict__.pop("chat", None)
+        print("Started a new conversation.")
+
+    elif cmd.startswith("chat "):
+        question = cmd[len("chat "):].strip()
+        report = get_training_report()
+        summary = report["summary"]
+        with stage("retrieve_notes"):
+            notes = memory_store.relevant_notes(question, recent=0)
+            past_chats = memory_store.relevant_chats(question)
+        history = load_runner_history() or report["history"]
+        cw = week_for_date(session.plan_ref, date.today())
+        nw = next_week(session.plan_ref, date.today())
+        load = get_training_load()
+        adherence = get_adherence()
+
+        with stage("build_prompt"):
+            ctx, _ = coach_chat_context(
+                runner_profile=session.mem["runner_profile"],
+                summary=summary,
+                notes=memory_store.recent_notes(RECENT_NOTES),
+                current_week=cw,
+                next_week=nw,
+                history=history,
+                training_load=load,
+                adherence=adherence,
+            )
+
+        answer = converse(session.chat, call_llm, ctx, question, notes, past_chats)
+        memory_store.add_chat(question, answer, datetime.now().isoformat(timespec="seconds"))
+        print("\ncoach> " + answer)
+
+    else:
+        print("Unknown command. Type 'help'.")
+    return True
+
+def run(cmd, session):
+    # one command, timed into the request log (see metrics.py)
+    with request("agent", cmd.split()[0].lower()):
+        return handle(cmd, session)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    session = Session()
+    if argv:
+        # one-shot: python3 agent.py plan today
+        run(" ".join(argv).strip(), session)
+        return
+
     print("🏃 Marathon Agent (Terminal) — type 'help' to see commands.\n")
 
     while True:
@@ -112,71 +319,8 @@ def main():
         if not cmd:
             continue
 
-        if cmd == "help":
-            help_text()
-        elif cmd == "exit":
-            print("bye!")
+        if not run(cmd, session):
             break
-        elif cmd == "profile":
-            print(json.dumps(mem["runner_profile"], indent=2))
-        elif cmd == "status":
-            show_status(mem)
-        elif cmd == "plan":
-            plan, summary = generate_plan(mem)
-            print("\n✅ Generated plan:")
-            for day, workout in plan.items():
-                print(f"  {day}: {workout}")
-        elif cmd == "last":
-            show_last_plan(mem)
-        elif cmd == "note":
-            note_text = input("note> ").strip()
-            if note_text:
-                add_note(mem, note_text)
-            else: 
-                print("No note saved.")
-        elif cmd.startswith("note "):
-            add_note(mem, cmd[len("note "):].strip())
-        elif cmd.startswith("plan week "):
-            wk = cmd[len("plan week "):].strip()
-            w = get_week(plan_ref, f"Week {wk}" if wk.isdigit() else wk)
-            if not w:
-                print("Week not found. Try: plan week 1")
-            else:
-                print(pretty_week(w))
-
-        elif cmd == "plan today":
-            wk, dow, workout = workout_on(plan_ref, date.today())
-            print(f"{wk or 'Unknown week'} — {dow}: {workout or 'No workout found'}")
-
-        elif cmd == "plan tomorrow":
-            d = date.today() + timedelta(days=1)
-            wk, dow, workout = workout_on(plan_ref, d)
-            print(f"{d.isoformat()} ({wk or 'Unknown week'}) — {dow}: {workout or 'No workout found'}")
-        
-        elif cmd.startswith("chat "):
-            question = cmd[len("chat "):].strip()
-            summary = get_training_summary()
-            notes = mem.get("notes", [])
-            history = load_runner_history()
-            cw = week_for_date(plan_ref, date.today())
-            nw = next_week(plan_ref, date.today())
-
-            prompt = build_coach_chat_prompt(
-                question=question,
-                runner_profile=mem["runner_profile"],
-                summary=summary,
-                notes=notes,
-                current_week=cw,
-                next_week=nw,
-                history=history
-            )
-
-            answer = call_llm(prompt)
-            print("\ncoach> " + answer.strip())
-
-        else:
-            print("Unknown command. Type 'help'.")
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,167 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from activity_store import refresh_store, source_key, normalize
+from metrics import stage
+
+# One vectorized pass over the activity store produces both the training
+# summary (agent/web status) and the runner history (build_history.py).
+# Weeks are Monday–Sunday everywhere, matching the reference plan.
+# training_report() keeps the last REPORT_CACHE_SIZE reports; the web app's
+# athletes memoize theirs on the Athlete instead (athletes.py).
+
+PACE_BAND_DAYS = 56
+TREND_WEEKS = 16
+BEST_EFFORT_BANDS = {
+    "best_1_mileish": (0.8, 1.3),
+    "best_5kish": (2.5, 4.0),
+    "best_10kish": (5.5, 7.0),
+}
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "8"))
+
+_report_cache = OrderedDict()
+
+def run_columns(cols: dict) -> dict:
+    # runs with a distance, sorted by date, plus derived pace and day
+    # (the columns are runs only; see activity_store.normalize)
+    keep = cols["distance_mi"] > 0
+    runs = {k: v[keep] for k, v in cols.items()}
+    order = np.argsort(runs["date"], kind="stable")
+    runs = {k: v[order] for k, v in runs.items()}
+    # the store keeps float32; sums and prefix sums run in float64
+    runs["distance_mi"] = runs["distance_mi"].astype(np.float64)
+    runs["moving_seconds"] = runs["moving_seconds"].astype(np.float64)
+    secs = runs["moving_seconds"]
+    runs["pace_min_per_mi"] = (secs / 60.0) / runs["distance_mi"]
+    runs["day"] = runs["date"].astype("datetime64[D]")
+    return runs
+
+def daily_rollup(runs: dict) -> dict:
+    """Collapse sorted runs to one row per day with miles, seconds and run count."""
+    days, start, counts = np.unique(runs["day"], return_index=True, return_counts=True)
+    seconds = np.nan_to_num(runs["moving_seconds"])
+    return {
+        "day": days,
+        "miles": np.add.reduceat(runs["distance_mi"], start) if len(days) else np.zeros(0),
+        "seconds": np.add.reduceat(seconds, start) if len(days) else np.zeros(0),
+        "runs": counts,
+    }
+
+def week_start(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday, so shift by 3 to land on Mondays.
+    ordinal = days.astype("int64")
+    return (ordinal - (ordinal + 3) % 7).astype("datetime64[D]")
+
+def _weekly(daily: dict, mask: np.ndarray):
+    weeks, inverse = np.unique(week_start(daily["day"][mask]), return_inverse=True)
+    return weeks, np.bincount(inverse, weights=daily["miles"][mask], minlength=len(weeks))
+
+def _pace_band(paces: np.ndarray):
+    paces = paces[~np.isnan(paces)]
+    if len(paces) < 5:
+        return None
+    p20, p50, p80 = np.quantile(paces, [0.2, 0.5, 0.8])
+    return {"p20": round(float(p20), 2), "p50": round(float(p50), 2), "p80": round(float(p80), 2)}
+
+def _best_effort(recent: dict, min_mi: float, max_mi: float):
+    d = recent["distance_mi"]
+    pace = np.where((d >= min_mi) & (d <= max_mi), recent["pace_min_per_mi"], np.nan)
+    if np.isnan(pace).all():
+        return None
+    i = int(np.nanargmin(pace))
+    return {
+        "date": str(recent["day"][i]),
+        "distance_mi": round(float(d[i]), 2),
+        "pace_min_per_mi": round(float(pace[i]), 2),
+        "activity_name": str(recent["name"][i])[:80],
+    }
+
+def compute_report(cols: dict, days_back: int = 56) -> dict:
+    """Summary and history from normalized activity columns (see activity_store)."""
+    if len(cols["date"]) == 0:
+        raise ValueError("No activities found in Strava CSV.")
+
+    runs = run_columns(cols)
+    daily = daily_rollup(runs)
+
+    # Summary window is anchored on the latest run: the store only keeps runs,
+    # so cross-training after it doesn't push the window forward. (The
+    # training load is the one anchored on today.)
+    most_recent = cols["date"].max().astype("datetime64[D]")
+    in_window = daily["day"] >= most_recent - np.timedelta64(days_back, "D")
+    _, window_weeks = _weekly(daily, in_window)
+    last_4 = window_weeks[-4:]
+    summary = {
+        "days_back": days_back,
+        "runs_count": int(daily["runs"][in_window].sum()),
+        "total_miles": round(float(daily["miles"][in_window].sum()), 2),
+        "avg_weekly_miles_last_4_weeks": round(float(last_4.mean()) if len(last_4) else 0.0, 2),
+        "max_weekly_miles": round(float(window_weeks.max()) if len(window_weeks) else 0.0, 2),
+        "last_week_miles": round(float(window_weeks[-1]) if len(window_weeks) else 0.0, 2),
+    }
+
+    history = None
+    if len(runs["day"]):
+        weeks, weekly_miles = _weekly(daily, np.ones(len(daily["day"]), dtype=bool))
+        cutoff = runs["date"][-1] - np.timedelta64(PACE_BAND_DAYS, "D")
+        first = int(np.searchsorted(runs["date"], cutoff, side="left"))
+        recent = {k: v[first:] for k, v in runs.items()}
+        history = {
+            "runs_count_total": int(len(runs["day"])),
+            "date_range": {"start": str(runs["day"][0]), "end": str(runs["day"][-1])},
+            "weekly_mileage_last_16_weeks": [
+                {"week_start": str(w), "miles": round(float(m), 2)}
+                for w, m in zip(weeks[-TREND_WEEKS:], weekly_miles[-TREND_WEEKS:])
+            ],
+            "pace_band_last_8_weeks_min_per_mile": _pace_band(recent["pace_min_per_mi"]),
+            "best_efforts_last_8_weeks": {
+                label: _best_effort(recent, lo, hi) for label, (lo, hi) in BEST_EFFORT_BANDS.items()
+            },
+        }
+
+    return {"summary": summary, "history": history}
+
+def training_report(csv_path: str, days_back: int = 56) -> dict:
+    """Memoized report for the export at csv_path; recomputed only when it changes."""
+    key = (csv_path, days_back)
+    version = source_key(csv_path)
+    hit = _report_cache.get(key)
+    if hit and hit[0] == version:
+        _report_cache.move_to_end(key)
+        return hit[1]
+    with stage("load_activities"):
+        cols = refresh_store(csv_path)
+    with stage("summarize_runs"):
+        report = compute_report(cols, days_back)
+    _report_cache[key] = (version, report)
+    _report_cache.move_to_end(key)
+    while len(_report_cache) > REPORT_CACHE_SIZE:
+        _report_cache.popitem(last=False)
+    return report
+
+def training_summary(csv_path: str, days_back: int = 56) -> dict:
+    return training_report(csv_path, days_back)["summary"]
+
+def runner_history(csv_path: str, report=None) -> dict:
+    """History for build_history.py; pass the export's report if it is already at hand."""
+    history = (report or training_report(csv_path))["history"]
+    if history is None:
+        raise ValueError("No runs found in Strava CSV.")
+    history = {"generated_at": pd.Timestamp.now().isoformat(timespec="seconds"), **history}
+    # GPS/FIT streams give true fastest segments; the distance bands are the fallback
+    from streams import stream_best_efforts
+    efforts = stream_best_efforts(csv_path)
+    history["best_efforts_source"] = "streams" if efforts else "activity_bands"
+    if efforts:
+        history["best_efforts_last_8_weeks"] = efforts
+    return history
+
+def report_from_frame(df: pd.DataFrame, days_back: int = 56) -> dict:
+    """Same report for an in-memory Strava frame (raw or from the store)."""
+    if "Activity Date" not in df.columns:
+        raise ValueError("Missing Activity Date column after parsing.")
+    cols, _ = normalize(df)
+    return compute_report(cols, days_back)
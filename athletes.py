@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+from memory_store import MemoryStore, memory_paths
+from metrics import process_rss_bytes, stage
+from plan_tools import load_plan
+
+# Per-athlete state for serving a whole club from one deployment.
+#
+# The default athlete keeps the original single-user layout in the repo root
+# (memory.json, data/activities.csv, runner_history.json,
+# plan_reference.json). Every other athlete lives in athletes/<id>/ with the
+# same four files; an athlete without its own plan falls back to the shared
+# plan_reference.json.
+#
+# Loaded athletes sit in a bounded LRU. Each one memoizes its derived data
+# (report, daily series, training load, adherence, compiled plan, history) keyed by the version of the
+# source file, so a hit costs a few stat() calls and nothing is re-parsed
+# until a file actually changes.
+
+ATHLETES_DIR = "athletes"
+DEFAULT_ATHLETE = "default"
+ATHLETE_CACHE_SIZE = int(os.getenv("ATHLETE_CACHE_SIZE", "128"))
+ATHLETE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+ADHERENCE_DATES = 4  # adherence memos kept per athlete, one per as_of date
+
+class UnknownAthlete(KeyError):
+    pass
+
+def athlete_paths(athlete_id: str) -> dict:
+    if athlete_id == DEFAULT_ATHLETE:
+        return {
+            "memory": "memory.json",
+            "activities": "data/activities.csv",
+            "history": "runner_history.json",
+            "plan": "plan_reference.json",
+        }
+    if not ATHLETE_ID.match(athlete_id):
+        raise UnknownAthlete(athlete_id)
+    base = os.path.join(ATHLETES_DIR, athlete_id)
+    plan = os.path.join(base, "plan_reference.json")
+    return {
+        "memory": os.path.join(base, "memory.json"),
+        "activities": os.path.join(base, "activities.csv"),
+        "history": os.path.join(base, "runner_history.json"),
+        "plan": plan if os.path.exists(plan) else "plan_reference.json",
+    }
+
+def list_athletes() -> list:
+    ids = [DEFAULT_ATHLETE] if os.path.exists("memory.json") else []
+    if os.path.isdir(ATHLETES_DIR):
+        ids += sorted(d for d in os.listdir(ATHLETES_DIR)
+                      if ATHLETE_ID.match(d) and os.path.isdir(os.path.join(ATHLETES_DIR, d)))
+    return ids
+
+def source_paths(athlete_id: str) -> list:
+    """The files an athlete's derived data is built from (export, plan, memory and its logs)."""
+    paths = athlete_paths(athlete_id)
+    memory = memory_paths(paths["memory"])
+    return [paths["activities"], paths["plan"], memory["snapshot"], memory["journal"], memory["notes"]]
+
+def file_version(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _nbytes(value) -> int:
+    # rough resident size of cached values: NumPy buffers plus JSON-ish objects
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_nbytes(k) + _nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + _nbytes(vars(value))
+    return sys.getsizeof(value)
+
+class Athlete:
+    def __init__(self, athlete_id: str):
+        self.id = athlete_id
+        self.paths = athlete_paths(athlete_id)
+        if not os.path.exists(self.paths["memory"]):
+            raise UnknownAthlete(athlete_id)
+        self.memory = MemoryStore(self.paths["memory"])
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _versioned(self, name, sources, build, extra=(), keep=None):
+        # extra: anything else the value depends on (e.g. today's date)
+        # keep: (prefix, n) to hold at most n memos whose names start with prefix
+        version = tuple(file_version(p) for p in sources) + tuple(extra)
+        with self._lock:
+            hit = self._memo.get(name)
+            if hit and hit[0] == version and keep:
+                self._memo[name] = self._memo.pop(name)  # most recently used last
+        if hit and hit[0] == version:
+            return hit[1]
+        value = build()
+        with self._lock:
+            self._memo.pop(name, None)
+            self._memo[name] = (version, value)
+            if keep:
+                prefix, n = keep
+                names = [k for k in self._memo if k.startswith(prefix)]
+                for old in names[:-n]:
+                    del self._memo[old]
+        return value
+
+    def state(self) -> dict:
+        return self._versioned("state", [self.paths["memory"], self.memory.journal_path], self.memory.state)
+
+    def profile(self) -> dict:
+        return self.state().get("runner_profile") or {}
+
+    def report(self, days_back: int = 56) -> dict:
+        csv = self.paths["activities"]
+        if not os.path.exists(csv):
+            return {"summary": None, "history": None}
+        from activity_store import refresh_store  # pandas/NumPy on first use
+        from analytics import compute_report
+
+        def build():
+            with stage("load_activities"):
+                cols = refresh_store(csv)
+            with stage("summarize_runs"):
+                return compute_report(cols, days_back)
+        return self._versioned(f"report:{days_back}", [csv], build)
+
+    def series(self):
+        csv = self.paths["activities"]
+        if not os.path.exists(csv):
+            return None
+        from activity_store import refresh_store
+        from rolling_stats import DailySeries
+        return self._versioned("series", [csv], lambda: DailySeries(refresh_store(csv)))
+
+    def training_load(self):
+        csv = self.paths["activities"]
+        if not os.path.exists(csv):
+            return None
+        from activity_store import refresh_store
+        from datetime import date
+        from training_load import load_from_columns, load_path
+        today = date.today()
+        return self._versioned("training_load", [csv],
+                               lambda: load_from_columns(refresh_store(csv), load_path(csv), today), extra=(today,))
+
+    def adherence(self, as_of=None):
+        """Plan vs actual as of `as_of` (default today); None without an export."""
+        csv = self.paths["activities"]
+        if not os.path.exists(csv):
+            return None
+        from datetime import date
+        from activity_store import refresh_store
+        from adherence import compute_adherence
+        as_of = as_of or date.today()
+        return self._versioned(f"adherence:{as_of}", [csv, self.paths["plan"]],
+                               lambda: compute_adherence(self.plan(), refresh_store(csv), as_of),
+                               keep=("adherence:", ADHERENCE_DATES))
+
+    def plan(self):
+        return self._versioned("plan", [self.paths["plan"]], lambda: load_plan(self.paths["plan"]))
+
+    def history(self):
+        def read():
+            try:
+                with stage("load_runner_history"), open(self.paths["history"], "r") as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                return None
+        return self._versioned("history", [self.paths["history"]], read) or self.report()["history"]
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(_nbytes(value) for _, value in self._memo.values())
+
+class AthleteCache:
+    """Bounded LRU of loaded athletes. on_evict callbacks get the evicted id."""
+
+    def __init__(self, capacity=ATHLETE_CACHE_SIZE):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.on_evict = []
+
+    def loaded(self) -> list:
+        """Ids of the loaded athletes, least recently used first."""
+        with self._lock:
+            return list(self._items)
+
+    def peek(self, athlete_id: str):
+        """The loaded athlete, or None; doesn't load it or touch the LRU order."""
+        with self._lock:
+            return self._items.get(athlete_id)
+
+    def get(self, athlete_id: str) -> Athlete:
+        with self._lock:
+            athlete = self._items.get(athlete_id)
+            if athlete is not None:
+                self._items.move_to_end(athlete_id)
+                self.stats["hits"] += 1
+                return athlete
+            self.stats["misses"] += 1
+        athlete = Athlete(athlete_id)
+        evicted = []
+        with self._lock:
+            self._items[athlete_id] = athlete
+            self._items.move_to_end(athlete_id)
+            while len(self._items) > self.capacity:
+                evicted.append(self._items.popitem(last=False)[0])
+                self.stats["evictions"] += 1
+        for evicted_id in evicted:
+            for callback in self.on_evict:
+                callback(evicted_id)
+        return athlete
+
+    def report(self) -> dict:
+        with self._lock:
+            loaded = list(self._items.values())
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+            "loaded": len(loaded),
+            "capacity": self.capacity,
+            "cached_bytes": sum(a.resident_bytes() for a in loaded),
+            "process_rss_bytes": process_rss_bytes(),
+        }
+
+athletes = AthleteCache()
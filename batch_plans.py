@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+
+from athletes import athletes, list_athletes
+from llm_backends import get_backend
+from plan_rules import PlanRejected, llm_plan, local_plan, plan_limits
+from plan_tools import week_for_date
+from prompt_builder import build_prompt
+
+# Weekly plan generation for every athlete at once. Plans come from the
+# local rules (plan_rules.py); with --llm the LLM rewords them, through a
+# bounded worker pool and a token-bucket rate limiter, and failed calls
+# (including replies that are not valid JSON or break the plan checks) are
+# retried with exponential backoff; a rejected reply is dropped from the LLM
+# response cache. Each plan is saved to the athlete's last_plan as soon
+# as it arrives, and a checkpoint file lets an interrupted run resume. Jobs
+# started from the web app each get their own checkpoint file.
+
+CHECKPOINT_PATH = "batch_checkpoint.json"
+
+def job_checkpoint_path(job_id: str) -> str:
+    base, ext = os.path.splitext(CHECKPOINT_PATH)
+    return f"{base}.{job_id}{ext}"
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def plan_for(athlete_id, call_llm, bucket, retries=3, backoff=1.0, use_llm=False):
+    """
+    Build the athlete's plan locally (plan_rules) and save it as last_plan. With
+    use_llm the LLM rewords it (with retries); replies that fail the plan checks
+    are retried like invalid JSON, and the local plan is kept if all fail.
+    """
+    a = athletes.get(athlete_id)
+    summary = a.report()["summary"]
+    profile = a.profile()
+    load = a.training_load()
+    notes = a.memory.recent_notes(10)
+    limits = plan_limits(profile, summary, load, notes)
+    reference = week_for_date(a.plan(), date.today())
+    plan = local_plan(profile, summary, load, reference, notes)
+    extra = {"source": "rules"}
+
+    if use_llm:
+        runner_context = dict(profile)
+        runner_context["notes"] = notes
+        prompt = build_prompt(runner_context, summary, training_load=load, draft=plan)
+
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            try:
+                # retries skip the cache; the first call may be a cached reply
+                plan = llm_plan(call_llm(prompt, bypass=attempt > 0), limits, reference)
+                extra["source"] = "llm"
+                break
+            except PlanRejected as e:
+                # so the next run doesn't replay a rejected reply
+                call_llm.discard(prompt)
+                if attempt == retries:
+                    extra["rejected"] = e.violations
+                    break
+            except Exception:
+                if attempt == retries:
+                    raise
+            time.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+
+    a.memory.set("last_plan", {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "summary": summary,
+        "plan": plan,
+        **extra,
+    })
+    return plan
+
+def _load_checkpoint(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"done": [], "failed": {}}
+
+def _save_checkpoint(path, checkpoint):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+def run_batch(athlete_ids, call_llm, concurrency=4, rate=2.0, burst=4, retries=3, backoff=1.0,
+              checkpoint_path=CHECKPOINT_PATH, resume=False, progress=None, use_llm=False, resume_from=None):
+    """
+    Generate plans for athlete_ids. Returns {"done": [...], "failed": {id: error}}.
+    progress(event) is called after each athlete with counts so far. With resume,
+    athletes done in resume_from (default checkpoint_path) are skipped.
+    """
+    checkpoint = _load_checkpoint(resume_from or checkpoint_path) if resume else {"done": [], "failed": {}}
+    done = set(checkpoint["done"])
+    todo = [i for i in athlete_ids if i not in done]
+    checkpoint["failed"] = {}
+    bucket = TokenBucket(rate, burst)
+    lock = threading.Lock()
+    started = time.monotonic()
+    total = len(todo)
+    finished = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(plan_for, i, call_llm, bucket, retries, backoff, use_llm): i for i in todo}
+        for future in as_completed(futures):
+            athlete_id = futures[future]
+            error = future.exception()
+            with lock:
+                finished += 1
+                if error is None:
+                    checkpoint["done"].append(athlete_id)
+                else:
+                    checkpoint["failed"][athlete_id] = str(error)
+                if checkpoint_path:
+                    _save_checkpoint(checkpoint_path, checkpoint)
+            if progress:
+                progress({
+                    "athlete": athlete_id,
+                    "ok": error is None,
+                    "error": None if error is None else str(error),
+                    "finished": finished,
+                    "total": total,
+                    "elapsed_s": round(time.monotonic() - started, 2),
+                })
+    return checkpoint
+
+jobs = {}
+_jobs_lock = threading.Lock()
+
+def start_job(athlete_ids, call_llm, resume_job=None, **options) -> str:
+    """
+    Run a batch in a background thread; poll jobs[job_id] for progress. The job
+    checkpoints to its own file; resume_job continues from an earlier job's.
+    """
+    job_id = datetime.now().strftime("%Y%m%d-%H%M%S-") + f"{random.randrange(16 ** 4):04x}"
+    options["checkpoint_path"] = job_checkpoint_path(job_id)
+    if resume_job:
+        options.update(resume=True, resume_from=job_checkpoint_path(resume_job))
+    job = {"id": job_id, "status": "running", "total": len(athlete_ids), "finished": 0,
+           "failed": {}, "started_at": datetime.now().isoformat(timespec="seconds")}
+    with _jobs_lock:
+        jobs[job_id] = job
+
+    def progress(event):
+        with _jobs_lock:
+            job["finished"] = event["finished"]
+            job["total"] = event["total"]
+            if not event["ok"]:
+                job["failed"][event["athlete"]] = event["error"]
+
+    def work():
+        try:
+            result = run_batch(athlete_ids, call_llm, progress=progress, **options)
+            with _jobs_lock:
+                job.update(status="done", done=len(result["done"]), failed=result["failed"])
+        except Exception as e:
+            with _jobs_lock:
+                job.update(status="error", error=str(e))
+
+    threading.Thread(target=work, name=f"batch-{job_id}", daemon=True).start()
+    return job_id
+
+def _print_progress(event):
+    mark = "✅" if event["ok"] else f"❌ {event['error']}"
+    print(f"[{event['finished']}/{event['total']}] {event['athlete']} {mark} ({event['elapsed_s']}s)")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Generate a fresh 7-day plan for every athlete.")
+    p.add_argument("--athletes", help="comma-separated ids (default: all)")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--rate", type=float, default=2.0, help="LLM calls per second (0 = unlimited)")
+    p.add_argument("--burst", type=int, default=4)
+    p.add_argument("--retries", type=int, default=3)
+    p.add_argument("--backoff", type=float, default=1.0, help="base seconds for exponential backoff")
+    p.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    p.add_argument("--resume", action="store_true", help="skip athletes already done in the checkpoint")
+    p.add_argument("--llm", action="store_true", help="have the LLM reword each local plan")
+    p.add_argument("--mock", action="store_true", help="use mock_llm instead of OpenAI")
+    args = p.parse_args(argv)
+
+    call_llm = get_backend("mock" if args.mock else None)
+    ids = args.athletes.split(",") if args.athletes else list_athletes()
+    result = run_batch(ids, call_llm, concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+                       retries=args.retries, backoff=args.backoff, checkpoint_path=args.checkpoint,
+                       resume=args.resume, progress=_print_progress, use_llm=args.llm)
+    print(f"\nDone: {len(result['done'])}, failed: {len(result['failed'])}")
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,2 @@
+# Offline benchmarks for the data, plan, prompt and web layers.
+# Run with: python -m bench --help
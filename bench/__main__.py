@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench.synth import make_plan, write_export  # noqa: E402
+
+def timeit(fn, repeat):
+    fn()  # warm-up (imports, first-touch caches)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+        "repeat": repeat,
+    }
+
+def prepare_workspace(args):
+    """Temp directory laid out like the repo: data/, memory.json, plan_reference.json."""
+    ws = tempfile.mkdtemp(prefix="marathon-bench-")
+    os.makedirs(os.path.join(ws, "data"))
+    rows = write_export(os.path.join(ws, "data", "activities.csv"), years=args.years, per_week=args.per_week,
+                        seed=args.seed, units=args.units, time_format=args.time_format)
+    with open(os.path.join(ws, "plan_reference.json"), "w") as f:
+        json.dump(make_plan(args.plan_weeks, seed=args.seed), f)
+    with open(os.path.join(REPO_ROOT, "runner_profile.json")) as f:
+        profile = json.load(f)
+    with open(os.path.join(ws, "memory.json"), "w") as f:
+        json.dump({"runner_profile": profile}, f)
+    return ws, rows
+
+def run(args):
+    ws, rows = prepare_workspace(args)
+    os.chdir(ws)  # every module resolves its data files relative to the cwd
+    os.environ.setdefault("OPENAI_API_KEY", "bench-offline")  # llm_openai builds its client at import
+    os.environ["MOCK_LLM_FIRST_TOKEN_DELAY"] = "0"
+    os.environ["MOCK_LLM_CHUNK_DELAY"] = "0"
+    os.environ["MARATHON_LLM_BACKEND"] = "cached:mock"
+    csv_path = "data/activities.csv"
+    results = {}
+
+    def bench(name, fn):
+        results[name] = timeit(fn, args.repeat)
+        print(f"  {name:<38} {results[name]['median_ms']:>10.3f} ms")
+
+    from load_data import load_strava_activities
+    from activity_store import refresh_store, store_paths
+    from summarize_runner import summarize_runs
+    import analytics
+    import build_history
+
+    def cold_store():
+        for p in store_paths(csv_path):
+            if os.path.exists(p):
+                os.remove(p)
+        refresh_store(csv_path)
+
+    bench("load_strava_activities", lambda: load_strava_activities(csv_path))
+    bench("activity_store.cold", cold_store)
+    bench("activity_store.warm", lambda: refresh_store(csv_path))
+    raw = load_strava_activities(csv_path)
+    bench("summarize_runs", lambda: summarize_runs(raw))
+    bench("analytics.compute_report", lambda: analytics.compute_report(refresh_store(csv_path)))
+    bench("build_history.main", build_history.main)
+    from training_load import load_from_columns
+    bench("training_load.full", lambda: load_from_columns(refresh_store(csv_path)))
+
+    from plan_tools import load_plan, workout_on, week_for_date, next_week, get_week
+    plan = load_plan()
+    first = date.fromisoformat(plan["start_date"])
+    span = [first + timedelta(days=i) for i in range(args.plan_weeks * 7)]
+    bench("plan_tools.load_plan", load_plan)
+    bench("plan_tools.workout_on(all days)", lambda: [workout_on(plan, d) for d in span])
+    bench("plan_tools.next_week(all days)", lambda: [next_week(plan, d) for d in span])
+    bench("plan_tools.get_week(all)", lambda: [get_week(plan, w["week_label"]) for w in plan["weeks"]])
+    from adherence import compute_adherence
+    cols = refresh_store(csv_path)
+    bench("adherence.compute_adherence", lambda: compute_adherence(plan, cols, span[-1]))
+    import plan_rules
+    summary = analytics.training_summary(csv_path)
+    with open("memory.json") as f:
+        runner = json.load(f)["runner_profile"]
+    limits = plan_rules.plan_limits(runner, summary)
+    bench("plan_rules.local_plan", lambda: plan_rules.local_plan(runner, summary, None, plan["weeks"][0]))
+    week = plan_rules.local_plan(runner, summary, None, plan["weeks"][0])
+    bench("plan_rules.check_plan", lambda: plan_rules.check_plan(week, limits))
+    bench("plan_rules.check_reference(all weeks)", lambda: plan_rules.check_reference(plan, 5, "Saturday"))
+
+    from prompt_builder import build_prompt
+    from coach_prompt import build_coach_chat_prompt
+    report = analytics.training_report(csv_path)
+    with open("memory.json") as f:
+        profile = json.load(f)["runner_profile"]
+    notes = [{"time": f"2026-01-{i % 28 + 1:02d}T08:00:00", "text": f"note {i}: calves tight after long run"}
+             for i in range(40)]
+    cw, nw = week_for_date(plan, first), next_week(plan, first)
+    bench("prompt_builder.build_prompt", lambda: build_prompt(dict(profile, notes=notes), report["summary"]))
+    bench("coach_prompt.build_coach_chat_prompt", lambda: build_coach_chat_prompt(
+        "How should I adjust this week?", profile, report["summary"], notes[-10:], cw, nw, report["history"]))
+
+    from memory_store import MemoryStore
+    words = "calf shin knee hamstring tight sore easy tempo long run hills sleep travel heat rain race shoes".split()
+    with open("memory.notes.jsonl", "w") as f:
+        for i in range(args.notes):
+            text = " ".join(words[(i * 7 + j * 3) % len(words)] for j in range(8))
+            f.write(json.dumps({"time": f"2025-{i % 12 + 1:02d}-01T08:00:00", "text": f"{text} {i}"}) + "\n")
+    bench(f"MemoryStore.relevant_notes (index {args.notes})", lambda: MemoryStore("memory.json").relevant_notes(
+        "left calf tight after the long run"))
+    store = MemoryStore("memory.json")
+    bench(f"MemoryStore.relevant_notes ({args.notes}, warm)", lambda: store.relevant_notes(
+        "left calf tight after the long run"))
+
+    import web_app
+    client = web_app.app.test_client()
+    day = first.isoformat()
+    bench("GET /api/status", lambda: client.get("/api/status"))
+    etag = client.get("/api/status").headers["ETag"]
+    bench("GET /api/status (304)", lambda: client.get("/api/status", headers={"If-None-Match": etag}))
+    bench("GET /api/plan/today", lambda: client.get("/api/plan/today"))
+    bench("GET /api/plan/week", lambda: client.get(f"/api/plan/week?start={day}"))
+    bench("GET /api/stats", lambda: client.get("/api/stats"))
+    bench("POST /api/chat (mock, no cache)", lambda: client.post(
+        "/api/chat", json={"question": "Am I on track?", "fresh": True}))
+    sid = client.post("/api/chat", json={"question": "Am I on track?"}).get_json()["session_id"]
+    bench("POST /api/chat (mock, follow-up)", lambda: client.post(
+        "/api/chat", json={"question": "And next week?", "session_id": sid, "fresh": True}))
+    bench("POST /api/chat/stream (mock)", lambda: client.post(
+        "/api/chat/stream", json={"question": "Am I on track?", "fresh": True}).get_data())
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "rows": rows,
+            "years": args.years,
+            "per_week": args.per_week,
+            "units": args.units,
+            "time_format": args.time_format,
+            "plan_weeks": args.plan_weeks,
+            "notes": args.notes,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+def compare(current, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\nvs {baseline_path}:")
+    for name, r in current["results"].items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_ms"], r["median_ms"]
+        change = (after - before) / before * 100 if before else 0.0
+        flag = "  <-- regression" if change > threshold else ""
+        print(f"  {name:<38} {before:>10.3f} -> {after:>10.3f} ms ({change:+.1f}%){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m bench", description="Offline Marathon Agent benchmarks")
+    p.add_argument("--years", type=int, default=3)
+    p.add_argument("--per-week", type=float, default=5)
+    p.add_argument("--units", choices=["meters", "miles"], default="meters")
+    p.add_argument("--time-format", choices=["seconds", "hms"], default="seconds")
+    p.add_argument("--plan-weeks", type=int, default=11)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--notes", type=int, default=20000, help="notes in the retrieval benchmark")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--compare", help="previous results file to diff against")
+    p.add_argument("--threshold", type=float, default=20.0, help="%% slowdown reported as a regression")
+    args = p.parse_args(argv)
+
+    out_path = os.path.abspath(args.out)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    cwd = os.getcwd()
+    try:
+        current = run(args)
+    finally:
+        os.chdir(cwd)
+
+    with open(out_path, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"\n✅ Wrote {out_path}")
+
+    if baseline:
+        return 1 if compare(current, baseline, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench.__main__ import prepare_workspace  # noqa: E402
+from bench.synth import make_plan  # noqa: E402
+
+# End-to-end load test of web_app over real HTTP, offline. The app runs
+# in-process behind serving.PooledWSGIServer on a synthetic workspace, with
+# the mock LLM backend simulating provider latency, output speed and errors
+# (mock_llm.configure). Each virtual user is one keep-alive connection that
+# picks requests from a weighted mix, revalidates GETs with the ETag it was
+# last given and keeps one chat session, like the web page does.
+#
+#   python -m bench.loadtest --concurrency 32 --duration 30 \
+#       --llm-latency lognormal:1.5,0.5 --llm-tokens-per-sec 40 --llm-error-rate 0.02
+
+DEFAULT_MIX = "status=35,plan_today=15,plan_tomorrow=5,plan_week=10,plan_range=5,note=5,chat=15,chat_stream=10"
+QUESTIONS = [
+    "How is my week going?",
+    "Should I move the long run to Sunday?",
+    "My left calf is tight, what should I do today?",
+    "Am I on track for the race?",
+    "Can I add strides to the easy run?",
+]
+NOTES = ["calf tight after long run", "slept badly", "shins fine today", "travel Thursday", "legs fresh"]
+
+def _today_range(days=14):
+    start = date.today()
+    return start.isoformat(), (start + timedelta(days=days - 1)).isoformat()
+
+def op_request(name, user):
+    """(method, path, json body or None) for one request of kind `name`."""
+    if name == "status":
+        return "GET", "/api/status", None
+    if name == "plan_today":
+        return "GET", "/api/plan/today", None
+    if name == "plan_tomorrow":
+        return "GET", "/api/plan/tomorrow", None
+    if name == "plan_week":
+        return "GET", "/api/plan/week", None
+    if name == "plan_range":
+        start, end = _today_range()
+        return "GET", f"/api/plan/range?start={start}&end={end}", None
+    if name == "note":
+        return "POST", "/api/note", {"text": user.rng.choice(NOTES)}
+    if name in ("chat", "chat_stream"):
+        path = "/api/chat" if name == "chat" else "/api/chat/stream"
+        return "POST", path, {"question": user.rng.choice(QUESTIONS), "session_id": user.session_id, "fresh": True}
+    raise ValueError(f"Unknown request kind {name!r}")
+
+OPS = ("status", "plan_today", "plan_tomorrow", "plan_week", "plan_range", "note", "chat", "chat_stream")
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise SystemExit(f"Unknown request kind {name!r}; choose from {', '.join(OPS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values, q):
+    # nearest rank
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))]
+
+class User:
+    """One virtual user: a keep-alive connection, its ETags and its chat session."""
+
+    def __init__(self, host, port, timeout, seed):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.rng = random.Random(seed)
+        self.etags = {}
+        self.session_id = None
+        self.conn = None
+        self.samples = {}  # kind -> list of (seconds, status, first_chunk_seconds)
+
+    def _connection(self):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self.conn
+
+    def send(self, kind, use_etags=True):
+        method, path, body = op_request(kind, self)
+        headers = {"Accept-Encoding": "gzip"}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if method == "GET" and use_etags and path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+
+        t0 = time.perf_counter()
+        first = None
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            parts = []
+            while True:
+                chunk = resp.read1(65536)
+                if not chunk:
+                    break
+                # for streams, the first answer chunk rather than the session event
+                if first is None and (kind != "chat_stream" or b'"delta"' in chunk):
+                    first = time.perf_counter() - t0
+                parts.append(chunk)
+            status = resp.status
+            data = b"".join(parts)
+            if resp.getheader("Connection", "").lower() == "close":
+                self.close()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            status, data = type(e).__name__, b""
+        elapsed = time.perf_counter() - t0
+        self.samples.setdefault(kind, []).append((elapsed, status, first))
+
+        if status == 200:
+            etag = resp.getheader("ETag")
+            if etag and method == "GET":
+                self.etags[path] = etag
+            if kind == "chat" and data:
+                self.session_id = json.loads(data).get("session_id", self.session_id)
+            elif kind == "chat_stream" and b"event: error" in data:
+                self.samples[kind][-1] = (elapsed, "stream_error", first)
+            elif kind == "chat_stream":
+                head = data.split(b"\n\n", 1)[0]
+                if head.startswith(b"event: session"):
+                    self.session_id = json.loads(head.split(b"data: ", 1)[1]).get("session_id")
+        return status
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def _run_user(user, kinds, weights, stop, think, use_etags, max_requests, counter, lock):
+    while not stop.is_set():
+        if max_requests:
+            with lock:
+                if counter[0] >= max_requests:
+                    return
+                counter[0] += 1
+        user.send(user.rng.choices(kinds, weights)[0], use_etags)
+        if think:
+            time.sleep(user.rng.expovariate(1.0 / think))
+    user.close()
+
+def summarize(users, elapsed):
+    merged = {}
+    for u in users:
+        for kind, samples in u.samples.items():
+            merged.setdefault(kind, []).extend(samples)
+    out = {}
+    for kind in sorted(merged):
+        samples = merged[kind]
+        ok = sorted(s for s, status, _ in samples if status in (200, 304))
+        firsts = sorted(f for s, status, f in samples if status == 200 and f is not None)
+        statuses = {}
+        for _, status, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(n for st, n in statuses.items() if st not in ("200", "304"))
+        ms = lambda v: round(v * 1000, 1) if v is not None else None
+        out[kind] = {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 2),
+            "errors": errors,
+            "statuses": statuses,
+            "p50_ms": ms(percentile(ok, 0.50)),
+            "p95_ms": ms(percentile(ok, 0.95)),
+            "p99_ms": ms(percentile(ok, 0.99)),
+            "max_ms": ms(ok[-1] if ok else None),
+        }
+        if kind == "chat_stream":
+            out[kind]["first_chunk_p50_ms"] = ms(percentile(firsts, 0.50))
+            out[kind]["first_chunk_p95_ms"] = ms(percentile(firsts, 0.95))
+    total = sum(r["requests"] for r in out.values())
+    out["total"] = {
+        "requests": total,
+        "rps": round(total / elapsed, 2),
+        "errors": sum(r["errors"] for r in out.values()),
+    }
+    return out
+
+def print_report(results, elapsed):
+    print(f"\n{'endpoint':<14} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for kind, r in results.items():
+        if kind == "total":
+            continue
+        cells = [f"{r[k]:>9}" if r[k] is not None else f"{'-':>9}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(f"{kind:<14} {r['requests']:>7} {r['rps']:>8} {' '.join(cells)} {r['errors']:>7}")
+        if r.get("first_chunk_p50_ms") is not None:
+            print(f"{'  first chunk':<14} {'':>7} {'':>8} {r['first_chunk_p50_ms']:>9} {r['first_chunk_p95_ms']:>9}")
+        if r["errors"]:
+            print(f"{'':<14} statuses: {r['statuses']}")
+    t = results["total"]
+    print(f"{'total':<14} {t['requests']:>7} {t['rps']:>8} {'':>39} {t['errors']:>7}   ({elapsed:.1f} s)")
+
+def _get_json(host, port, path):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        conn.request("GET", path)
+        return json.loads(conn.getresponse().read())
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+    finally:
+        conn.close()
+
+def start_server(args):
+    """Synthetic workspace + the app behind the pooled server on a free port; returns (server, ws)."""
+    ws, _ = prepare_workspace(args)
+    monday = date.today() - timedelta(days=date.today().weekday())
+    with open(os.path.join(ws, "plan_reference.json"), "w") as f:
+        json.dump(make_plan(args.plan_weeks, start=monday - timedelta(weeks=2), seed=args.seed), f)
+    os.chdir(ws)  # every module resolves its data files relative to the cwd
+    os.environ["MARATHON_LLM_BACKEND"] = "mock"
+    os.environ["LLM_WORKERS"] = str(args.llm_workers)
+    os.environ["LLM_QUEUE_LIMIT"] = str(args.llm_queue)
+    os.environ.setdefault("OPENAI_API_KEY", "loadtest-offline")
+
+    import mock_llm
+    mock_llm.configure(args.llm_latency, args.llm_tokens_per_sec, args.llm_error_rate, seed=args.seed)
+    from serving import PooledWSGIServer
+    from web_app import app
+    if not args.verbose:
+        # per-request access lines and the tracebacks of simulated LLM errors
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        app.logger.disabled = True
+    server = PooledWSGIServer("127.0.0.1", 0, app, threads=args.web_threads)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+    return server, ws
+
+def run(args):
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    server = None
+    if args.url:
+        # an already running server: the LLM simulation options don't apply
+        host, _, port = args.url.split("://")[-1].rstrip("/").partition(":")
+        port = int(port or 80)
+    else:
+        server, ws = start_server(args)
+        host, port = "127.0.0.1", server.server_port
+        print(f"Serving synthetic workspace {ws} on port {port}")
+
+    # warm-up: first loads (pandas, plan compile, indexes) are not part of the numbers
+    warm = User(host, port, args.timeout, args.seed)
+    for kind in kinds:
+        warm.send(kind)
+    warm.close()
+
+    users = [User(host, port, args.timeout, args.seed + i + 1) for i in range(args.concurrency)]
+    stop, lock, counter = threading.Event(), threading.Lock(), [0]
+    threads = [threading.Thread(target=_run_user, daemon=True,
+                                args=(u, kinds, weights, stop, args.think, not args.no_etag, args.requests, counter, lock))
+               for u in users]
+    print(f"{args.concurrency} users, mix {args.mix}, "
+          + (f"{args.requests} requests" if args.requests else f"{args.duration:.0f} s") + " ...")
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    if not args.requests:
+        stop.wait(args.duration)
+        stop.set()
+    for t in threads:
+        t.join(args.timeout + args.duration if not args.requests else None)
+    elapsed = time.perf_counter() - t0
+
+    results = summarize(users, elapsed)
+    print_report(results, elapsed)
+    server_stats = {name: _get_json(host, port, path) for name, path in
+                    [("llm_pool", "/api/llm/pool"), ("chat_sessions", "/api/chat/sessions"),
+                     ("http_cache", "/api/http/cache")]}
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 2),
+            "mix": mix,
+            "think_s": args.think,
+            "web_threads": args.web_threads,
+            "llm_workers": args.llm_workers,
+            "llm_queue": args.llm_queue,
+            "llm_latency": args.llm_latency,
+            "llm_tokens_per_sec": args.llm_tokens_per_sec,
+            "llm_error_rate": args.llm_error_rate,
+            "seed": args.seed,
+        },
+        "results": results,
+        "server": server_stats,
+    }
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m bench.loadtest", description="Offline end-to-end load test of web_app")
+    p.add_argument("--concurrency", type=int, default=16, help="virtual users (one connection each)")
+    p.add_argument("--duration", type=float, default=20, help="seconds to run")
+    p.add_argument("--requests", type=int, default=0, help="stop after this many requests instead")
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted request kinds (default {DEFAULT_MIX})")
+    p.add_argument("--think", type=float, default=0.0, help="mean pause between a user's requests, seconds")
+    p.add_argument("--no-etag", action="store_true", help="don't send If-None-Match on repeat GETs")
+    p.add_argument("--timeout", type=float, default=120.0)
+    p.add_argument("--url", help="load an already running server (e.g. http://127.0.0.1:5000) instead")
+    p.add_argument("--web-threads", type=int, default=int(os.getenv("WEB_THREADS", "16")))
+    p.add_argument("--llm-workers", type=int, default=int(os.getenv("LLM_WORKERS", "8")))
+    p.add_argument("--llm-queue", type=int, default=int(os.getenv("LLM_QUEUE_LIMIT", "16")))
+    p.add_argument("--llm-latency", default="lognormal:1.0,0.5",
+                   help="time to first token: fixed:<s>, uniform:<lo>,<hi> or lognormal:<median>,<sigma>")
+    p.add_argument("--llm-tokens-per-sec", type=float, default=50.0)
+    p.add_argument("--llm-error-rate", type=float, default=0.0)
+    p.add_argument("--years", type=int, default=3)
+    p.add_argument("--per-week", type=float, default=5)
+    p.add_argument("--units", choices=["meters", "miles"], default="meters")
+    p.add_argument("--time-format", choices=["seconds", "hms"], default="seconds")
+    p.add_argument("--plan-weeks", type=int, default=16)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="write the results as JSON here")
+    p.add_argument("--verbose", action="store_true", help="keep the server's access log and error tracebacks")
+    args = p.parse_args(argv)
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    cwd = os.getcwd()
+    try:
+        current = run(args)
+    finally:
+        os.chdir(cwd)
+    if out_path:
+        with open(out_path, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\n✅ Wrote {out_path}")
+    return 1 if current["results"]["total"]["requests"] == 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import csv
+import random
+from datetime import date, datetime, timedelta
+
+# Deterministic synthetic Strava exports and reference plans for benchmarks.
+# Same arguments + seed always give byte-identical files.
+
+HEADER = [
+    "Activity ID", "Activity Date", "Activity Name", "Activity Type",
+    "Activity Description", "Elapsed Time", "Distance", "Moving Time",
+    "Max Heart Rate", "Average Heart Rate", "Elevation Gain", "Activity Gear",
+]
+TYPE_MIX = {"Run": 0.7, "Virtual Run": 0.05, "Ride": 0.12, "Walk": 0.08, "Swim": 0.05}
+METERS_PER_MILE = 1609.34
+
+def _hms(seconds: int) -> str:
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def write_export(path, years=3, per_week=5, seed=0, units="meters", time_format="seconds",
+                 type_mix=TYPE_MIX, end=date(2026, 3, 1)):
+    """
+    Write a Strava-style activities CSV and return the number of rows.
+    units: "meters" or "miles" for the Distance column.
+    time_format: "seconds" (numeric) or "hms" (hh:mm:ss strings).
+    """
+    rng = random.Random(seed)
+    types, weights = list(type_mix), list(type_mix.values())
+    start = end - timedelta(days=365 * years)
+    p_day = min(per_week / 7.0, 1.0)
+    rows = 0
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        d = start
+        while d <= end:
+            if rng.random() < p_day:
+                kind = rng.choices(types, weights)[0]
+                miles = rng.lognormvariate(1.4, 0.45) * (3.0 if kind == "Ride" else 1.0)
+                pace = rng.uniform(7.5, 11.5) * (0.35 if kind == "Ride" else 1.0)  # min per mile
+                moving = int(miles * pace * 60)
+                elapsed = moving + rng.randint(0, 600)
+                when = datetime(d.year, d.month, d.day, rng.randint(5, 19), rng.randint(0, 59))
+                distance = miles * METERS_PER_MILE if units == "meters" else miles
+                fmt = _hms if time_format == "hms" else str
+                rows += 1
+                w.writerow([
+                    rows, when.strftime("%b %d, %Y, %I:%M:%S %p"), f"{when:%A} {kind}", kind,
+                    "Synthetic activity " * rng.randint(0, 6), fmt(elapsed), round(distance, 1),
+                    fmt(moving), rng.randint(150, 190), rng.randint(120, 160),
+                    round(rng.uniform(0, 300), 1), "Shoe " + str(rng.randint(1, 4)),
+                ])
+            d += timedelta(days=1)
+    return rows
+
+def make_plan(weeks=11, start=date(2026, 1, 12), seed=0):
+    """Reference plan dict shaped like plan_reference.json."""
+    rng = random.Random(seed)
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    out = []
+    for i in range(weeks):
+        ws = start + timedelta(weeks=i)
+        long_km = 8 + (i % 12)
+        sessions = {
+            "Monday": "Strength",
+            "Tuesday": "OFF",
+            "Wednesday": f"{rng.randint(5, 8)} km + 6×20s strides",
+            "Thursday": f"{rng.randint(5, 8)} km easy",
+            "Friday": "OFF",
+            "Saturday": f"{long_km} km long slow",
+            "Sunday": f"{rng.randint(4, 6)} km easy",
+        }
+        out.append({
+            "week_label": f"Week {i + 1}",
+            "date_range": f"{ws.isoformat()} to {(ws + timedelta(days=6)).isoformat()}",
+            "goal": "",
+            "sessions": {d: sessions[d] for d in days},
+            "approx_km": 20 + long_km + rng.randint(0, 10),
+        })
+    return {"plan_name": "Synthetic plan", "start_date": start.isoformat(), "weeks": out}
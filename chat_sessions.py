@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import metrics
+from coach_prompt import COACH_INSTRUCTIONS, context_message, related_message
+from context_builder import CHARS_PER_TOKEN, estimate_tokens
+from llm_chat import StaleResponse, render_chat
+
+# Server-side coach chat sessions. A session's conversation only grows at
+# the end: fixed instructions, the context block (tagged with a hash of its
+# JSON), then per turn the notes retrieved for the question, the question and
+# the answer. When the data behind the context changes between turns, a
+# "Context updated" block is appended rather than rewriting the first one.
+#
+# Backends that keep conversation state get only the messages added since
+# their last response (previous_response_id); the others get the whole
+# transcript, which starts with the previous turn's prompt, so the provider's
+# prompt cache covers everything but the new turn.
+
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+CHAT_SESSIONS = int(os.getenv("CHAT_SESSIONS", "1000"))
+CHAT_MAX_TURNS = int(os.getenv("CHAT_MAX_TURNS", "20"))
+
+def context_version(ctx: str) -> str:
+    return hashlib.sha1(ctx.encode("utf-8")).hexdigest()[:12]
+
+class ChatSession:
+    def __init__(self, session_id, athlete_id):
+        self.id = session_id
+        self.athlete_id = athlete_id
+        self.lock = threading.Lock()
+        self.touched = time.monotonic()
+        self._reset()
+
+    def _reset(self):
+        self.messages = []
+        self.version = None
+        self.turns = 0
+        self.response_id = None  # provider response covering messages[:sent]
+        self.sent = 0
+        self._seen = {}  # notes/chats already in the conversation -> message index
+
+    def _unseen(self, items, mark) -> list:
+        out = []
+        for item in items or []:
+            key = json.dumps(item, sort_keys=True)
+            if key not in self._seen:
+                self._seen[key] = mark
+                out.append(item)
+        return out
+
+    def begin(self, ctx: str, question: str, notes=(), past_chats=()) -> int:
+        """
+        Append a turn: a context block if the context changed, the retrieved
+        notes/chats not already sent in this session, and the question.
+        Returns the mark to roll back to if the call fails.
+        """
+        if self.turns >= CHAT_MAX_TURNS:
+            self._reset()  # starts over with one full send
+        mark = len(self.messages)
+        self._version_before = self.version
+        version = context_version(ctx)
+        if version != self.version:
+            update = self.version is not None
+            self.messages.append({"role": "developer", "content": context_message(ctx, version, update)})
+            self.version = version
+        related = related_message(self._unseen(notes, mark), self._unseen(past_chats, mark))
+        if related:
+            self.messages.append({"role": "developer", "content": related})
+        self.messages.append({"role": "user", "content": question})
+        return mark
+
+    def request(self) -> dict:
+        """Arguments for llm.chat()/chat_stream() for the pending turn."""
+        kwargs = {"instructions": COACH_INSTRUCTIONS, "messages": list(self.messages)}
+        if self.response_id:
+            kwargs["previous_response_id"] = self.response_id
+            kwargs["new_messages"] = self.messages[self.sent:]
+        return kwargs
+
+    def finish(self, answer: str, response_id=None):
+        self.messages.append({"role": "assistant", "content": answer})
+        self.turns += 1
+        self.response_id = response_id
+        self.sent = len(self.messages)
+        self.touched = time.monotonic()
+
+    def rollback(self, mark: int):
+        del self.messages[mark:]
+        self._seen = {k: m for k, m in self._seen.items() if m < mark}
+        self.version = self._version_before
+
+class SessionStore:
+    def __init__(self, capacity=CHAT_SESSIONS, ttl=CHAT_SESSION_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "expired": 0, "turns": 0, "continued": 0, "stale": 0,
+                      "chars_full": 0, "chars_sent": 0}
+
+    def get(self, session_id, athlete_id) -> ChatSession:
+        """The live session with this id, or a new one (unknown, expired or another athlete's id)."""
+        now = time.monotonic()
+        with self._lock:
+            s = self._items.get(session_id) if session_id else None
+            if s is not None and (now - s.touched > self.ttl or s.athlete_id != athlete_id):
+                self._items.pop(session_id)
+                self.stats["expired"] += 1
+                s = None
+            if s is None:
+                s = ChatSession(uuid.uuid4().hex, athlete_id)
+                self._items[s.id] = s
+                self.stats["created"] += 1
+            self._items.move_to_end(s.id)
+            s.touched = now
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+            return s
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def record(self, kwargs: dict) -> int:
+        """Counts a call's full transcript and what is actually sent; returns the characters sent."""
+        full = len(render_chat(kwargs["instructions"], kwargs["messages"]))
+        if "previous_response_id" in kwargs:
+            sent = len(kwargs["instructions"]) + sum(len(m["content"]) for m in kwargs["new_messages"])
+        else:
+            sent = full
+        with self._lock:
+            self.stats["turns"] += 1
+            self.stats["continued"] += "previous_response_id" in kwargs
+            self.stats["chars_full"] += full
+            self.stats["chars_sent"] += sent
+        return sent
+
+    def report(self) -> dict:
+        with self._lock:
+            return {**self.stats, "sessions": len(self._items), "capacity": self.capacity, "ttl": self.ttl}
+
+sessions = SessionStore()
+
+def _tokens(chars):
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def converse(session, llm, ctx, question, notes=(), past_chats=(), run=None, bypass=False) -> str:
+    """One turn: appends it to the session and returns the answer. run(fn, **kw) defaults to calling fn."""
+    run = run or (lambda fn, **kw: fn(**kw))
+    with session.lock:
+        mark = session.begin(ctx, question, notes, past_chats)
+        try:
+            kwargs = session.request()
+            sent = sessions.record(kwargs)
+            with metrics.llm_call(llm.model):
+                try:
+                    answer, response_id = run(llm.chat, bypass=bypass, **kwargs)
+                except StaleResponse:
+                    # the provider dropped the conversation: resend it whole
+                    sessions.count("stale")
+                    session.response_id = None
+                    kwargs = session.request()
+                    sent = sessions.record(kwargs)
+                    answer, response_id = run(llm.chat, bypass=bypass, **kwargs)
+        except BaseException:
+            session.rollback(mark)
+            raise
+        answer = (answer or "").strip()
+        session.finish(answer, response_id)
+    metrics.record_tokens(llm.model, _tokens(sent), estimate_tokens(answer))
+    return answer
+
+def converse_stream(session, llm, ctx, question, notes=(), past_chats=(), stream=None, bypass=False, done=None):
+    """
+    Streaming converse(): yields the answer's chunks. stream(gen_fn, **kw)
+    drives the backend generator (e.g. through the LLM pool). done(answer)
+    runs once the turn is complete.
+    """
+    stream = stream or (lambda fn, **kw: fn(**kw))
+    with session.lock:
+        mark = session.begin(ctx, question, notes, past_chats)
+        parts, result = [], {}
+        try:
+            kwargs = session.request()
+            sent = sessions.record(kwargs)
+            try:
+                for chunk in stream(llm.chat_stream, bypass=bypass, result=result, **kwargs):
+                    parts.append(chunk)
+                    yield chunk
+            except StaleResponse:
+                if parts:
+                    raise
+                sessions.count("stale")
+                session.response_id = None
+                kwargs = session.request()
+                sent = sessions.record(kwargs)
+                for chunk in stream(llm.chat_stream, bypass=bypass, result=result, **kwargs):
+                    parts.append(chunk)
+                    yield chunk
+        except BaseException:
+            session.rollback(mark)
+            raise
+        answer = "".join(parts).strip()
+        session.finish(answer, result.get("response_id"))
+    metrics.record_tokens(llm.model, _tokens(sent), estimate_tokens(answer))
+    if done is not None:
+        done(answer)
@@ -1,27 +1,76 @@
-import json
-
-def build_coach_chat_prompt(question, runner_profile, summary, notes, current_week, next_week, history):
-    ctx = {
-        "runner_profile": runner_profile,
-        "training_summary": summary,
-        "notes": notes[-10:],  # last 10 notes
-        "current_week": current_week,
-        "next_week": next_week,
-        "runner_history": history
-    }
+from context_builder import (build_context, compact_adherence, compact_chats, compact_history, compact_json,
+                             compact_notes, compact_week, prune)
+
+# Fixed guidance first, then the context, then the question(s): every coach
+# prompt starts with the same bytes, and a chat session's prompt only grows
+# at the end (see chat_sessions.py).
+COACH_INSTRUCTIONS = """
+You are a helpful, safety-minded running coach. Answer the user's questions using the plan context.
+
+Guidelines:
+- Keep advice aligned with the provided plan unless the user asks to modify it.
+- Use plan_adherence (planned vs actual km, missed/extra sessions) when judging how training is going.
+- notes and past_chats are the ones most related to the question; stay consistent with earlier advice.
+- The latest context block is the current one; earlier blocks describe the data when those turns were asked.
+- If suggesting changes, give a clear, conservative adjustment.
+- Be concise and specific.
+""".strip()
+
+def coach_chat_context(runner_profile, summary, notes, current_week, next_week, history, budget=None,
+                       training_load=None, adherence=None, past_chats=None):
+    # Returns (context_json, token usage per section)
+    return build_context([
+        ("runner_profile", prune(runner_profile)),
+        ("training_summary", summary),
+        ("training_load", training_load),
+        ("plan_adherence", compact_adherence(adherence)),
+        ("current_week", compact_week(current_week)),
+        ("next_week", compact_week(next_week)),
+        ("runner_history", compact_history(history)),
+        ("past_chats", compact_chats(past_chats)),
+        ("notes", compact_notes(notes)),  # relevant + latest notes, trimmed to budget
+    ], budget)
+
+def build_coach_chat_prompt(question, runner_profile, summary, notes, current_week, next_week, history, budget=None,
+                            training_load=None, adherence=None, past_chats=None):
+    # notes/past_chats: MemoryStore.relevant_notes(question) / relevant_chats(question)
+    ctx, _ = coach_chat_context(runner_profile, summary, notes, current_week, next_week, history, budget,
+                                training_load, adherence, past_chats)
 
     return f"""
-You are a helpful, safety-minded running coach. Answer the user's question using the plan context.
+{COACH_INSTRUCTIONS}
 
 Context (JSON):
-{json.dumps(ctx, indent=2)}
+{ctx}
 
 User question:
 {question}
-
-Guidelines:
-- Keep advice aligned with the provided plan unless the user asks to modify it.
-- If suggesting changes, give a clear, conservative adjustment.
-- Be concise and specific.
 """.strip()
 
+def context_message(ctx: str, version: str, update=False) -> str:
+    head = "Context updated" if update else "Context"
+    return f"{head} (v{version}, JSON):\n{ctx}"
+
+def related_message(notes, past_chats):
+    # retrieved for one question, so sent with that turn rather than in the context block
+    related = prune({"notes": compact_notes(notes), "past_chats": compact_chats(past_chats)})
+    return f"Related to the next question (JSON):\n{compact_json(related)}" if related else None
+
+def build_daily_brief_prompt(runner_profile, summary, today, workout, notes, training_load=None, budget=None):
+    ctx, _ = build_context([
+        ("runner_profile", prune(runner_profile)),
+        ("training_summary", summary),
+        ("training_load", training_load),
+        ("today", {"date": today.isoformat(), "weekday": today.strftime("%A"), "workout": workout or "OFF"}),
+        ("notes", compact_notes(notes[-10:])),
+    ], budget)
+
+    return f"""
+You are a helpful, safety-minded running coach writing a short morning brief.
+
+Context (JSON):
+{ctx}
+
+Write 3-5 sentences: today's session and its purpose, how to pace it given the recent
+training load, and one thing to watch based on the notes. Plain text, no lists.
+""".strip()
@@ -0,0 +1,127 @@
+import json
+import os
+
+# Compact, token-budgeted context for the LLM prompts. Sections are
+# serialized as minified JSON, low-value fields are summarized or dropped,
+# and notes are trimmed oldest-first until the context fits the budget.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4  # rough average for English/JSON with GPT tokenizers
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def prune(value):
+    # drop None, empty strings/lists/dicts recursively
+    if isinstance(value, dict):
+        out = {k: prune(v) for k, v in value.items()}
+        return {k: v for k, v in out.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [prune(v) for v in value if v not in (None, "", [], {})]
+    return value
+
+def mileage_trend(weekly):
+    """Collapse [{"week_start", "miles"}, ...] into a few trend statistics."""
+    miles = [w["miles"] for w in weekly or []]
+    if not miles:
+        return None
+    n = len(miles)
+    mean_x = (n - 1) / 2
+    mean_y = sum(miles) / n
+    var_x = sum((i - mean_x) ** 2 for i in range(n))
+    slope = sum((i - mean_x) * (m - mean_y) for i, m in enumerate(miles)) / var_x if var_x else 0.0
+    last_4 = miles[-4:]
+    return {
+        "weeks": n,
+        "from": weekly[0]["week_start"],
+        "last": miles[-1],
+        "avg_last_4": round(sum(last_4) / len(last_4), 1),
+        "avg": round(mean_y, 1),
+        "max": max(miles),
+        "slope_per_week": round(slope, 2),
+    }
+
+def compact_history(history):
+    if not history:
+        return None
+    out = {k: v for k, v in history.items() if k not in ("generated_at", "weekly_mileage_last_16_weeks")}
+    out["weekly_mileage_trend"] = mileage_trend(history.get("weekly_mileage_last_16_weeks"))
+    efforts = out.get("best_efforts_last_8_weeks") or {}
+    out["best_efforts_last_8_weeks"] = {
+        label: {k: v for k, v in e.items() if k not in ("activity_name", "activity_file")} if e else None
+        for label, e in efforts.items()
+    }
+    return prune(out)
+
+def compact_week(week):
+    if not week:
+        return None
+    return prune(dict(week))
+
+def compact_adherence(summary):
+    # adherence_summary() without the per-week date bookkeeping; days as "date status km"
+    if not summary:
+        return None
+    drop = ("start", "end", "planned_km_to_date", "sessions_to_date")
+    out = {"plan": {k: v for k, v in summary["plan"].items() if k != "planned_km_to_date"}}
+    for key in ("previous_week", "current_week"):
+        if summary.get(key):
+            out[key] = {k: v for k, v in summary[key].items() if k not in drop}
+    out["current_week_days"] = [f"{d['date'][5:]} {d['status']} {d['actual_km']}km"
+                                for d in summary.get("current_week_days") or []]
+    return prune(out)
+
+def compact_notes(notes):
+    # "YYYY-MM-DD text", keeping just the date of each note
+    out = []
+    for n in notes or []:
+        if isinstance(n, dict):
+            day = (n.get("time") or n.get("ts") or "")[:10]
+            out.append(f"{day} {n.get('text', '')}".strip())
+        else:
+            out.append(str(n))
+    return out
+
+CHAT_ANSWER_CHARS = 300
+
+def compact_chats(chats):
+    # "YYYY-MM-DD Q: ... A: ..." with long answers cut short
+    out = []
+    for c in chats or []:
+        answer = " ".join((c.get("answer") or "").split())
+        if len(answer) > CHAT_ANSWER_CHARS:
+            answer = answer[:CHAT_ANSWER_CHARS].rsplit(" ", 1)[0] + "…"
+        out.append(f"{(c.get('time') or '')[:10]} Q: {c.get('question', '')} A: {answer}".strip())
+    return out
+
+def build_context(sections, budget=None):
+    """
+    sections: ordered list of (name, value); a section named "notes" (a list)
+    is the one trimmed, oldest first, to respect the budget.
+    Returns (context_json, usage) where usage reports tokens per section.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    ctx = {name: value for name, value in sections if value not in (None, "", [], {})}
+    notes = list(ctx.get("notes") or [])
+    dropped = 0
+
+    text = compact_json(ctx)
+    while notes and estimate_tokens(text) > budget:
+        notes.pop(0)
+        dropped += 1
+        if notes:
+            ctx["notes"] = notes
+        else:
+            ctx.pop("notes", None)
+        text = compact_json(ctx)
+
+    usage = {
+        "sections": {name: estimate_tokens(compact_json(value)) for name, value in ctx.items()},
+        "total": estimate_tokens(text),
+        "budget": budget,
+        "notes_dropped": dropped,
+    }
+    return text, usage
@@ -1,22 +1,43 @@
 import json
-from load_data import load_strava_activities
+import os
+import sys
+from datetime import date
+from activity_store import load_activities
 from summarize_runner import summarize_runs
+from training_load import training_load
+from plan_rules import PlanRejected, llm_plan, local_plan, plan_limits
+from plan_tools import load_plan, week_for_date
 from prompt_builder import build_prompt
-from mock_llm import call_llm
+from llm_backends import get_backend
+from memory_store import MemoryStore
+
+# python3 generate_plan.py [request...]: the local plan, or with a request
+# the LLM's adjustment of it (kept only if it passes the plan checks)
 
 # Load data
-df = load_strava_activities("data/activities.csv")
+df = load_activities("data/activities.csv")
 summary = summarize_runs(df)
 
 with open("runner_profile.json") as f:
     runner = json.load(f)
 
-prompt = build_prompt(runner, summary)
-response = call_llm(prompt)
+load = training_load("data/activities.csv")
+notes = MemoryStore("memory.json").recent_notes(10)
+reference = week_for_date(load_plan(), date.today())
+plan = local_plan(runner, summary, load, reference, notes)
+request = " ".join(sys.argv[1:]).strip()
 
-plan = json.loads(response)
+if request:
+    prompt = build_prompt(dict(runner, notes=notes), summary, training_load=load, draft=plan, request=request)
+    call_llm = get_backend(os.getenv("MARATHON_LLM_BACKEND", "mock"))
+    try:
+        plan = llm_plan(call_llm(prompt), plan_limits(runner, summary, load, notes), reference)
+        print("Your AI-generated plan:")
+    except PlanRejected as e:
+        call_llm.discard(prompt)
+        print(f"Rejected the AI plan ({e}); your plan:")
+else:
+    print("Your plan:")
 
-print("Your AI-generated plan:")
 for day, workout in plan.items():
     print(f"{day}: {workout}")
-
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, current_app, request, stream_with_context
+from werkzeug.http import http_date
+
+from athletes import file_version
+
+# Conditional GET and a serialized-response cache for the read endpoints.
+#
+# A response's version is the (mtime_ns, size) of every source file it is
+# built from plus anything else it depends on (query args, today's date).
+# The ETag is a hash of that version, so a matching If-None-Match gets a 304
+# after a few stat() calls, without building anything. Otherwise the JSON
+# body (and a gzipped copy when it is large) is served from memory until a
+# source changes. The gzipped body is a different representation, so its
+# ETag gets a "-gz" suffix; either tag validates. If-Modified-Since is
+# ignored: every response has an ETag, and Last-Modified only has 1 s
+# resolution, so a file changed twice within a second would look unchanged.
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_SUFFIX = "-gz"
+
+class ResponseCache:
+    def __init__(self, capacity=RESPONSE_CACHE_SIZE):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, key, version):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit and hit[0] == version:
+                self._items.move_to_end(key)
+                self.stats["hits"] += 1
+                return hit[1]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, version, entry):
+        with self._lock:
+            self._items[key] = (version, entry)
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._items), "capacity": self.capacity}
+
+responses = ResponseCache()
+
+def _last_modified(versions, as_of=None):
+    mtimes = [v[0] for v in versions if v]
+    if not mtimes and as_of is None:
+        return None
+    lm = datetime.fromtimestamp(max(mtimes) // 10**9, timezone.utc) if mtimes else None
+    if as_of is not None:
+        as_of = as_of.astimezone(timezone.utc).replace(microsecond=0)
+        lm = max(lm, as_of) if lm else as_of
+    return lm
+
+def _matching_tag(etag):
+    # the matching tag, or None
+    tags = request.if_none_match
+    for tag in (etag, etag + GZIP_SUFFIX):
+        if tags and tags.contains_weak(tag):
+            return tag
+    return None
+
+def _validators(key, sources, vary, as_of):
+    # (version, etag, headers, is_not_modified) for the current request
+    versions = tuple(file_version(p) for p in sources)
+    version = (versions, tuple(vary))
+    etag = hashlib.sha1(repr((key, version)).encode("utf-8")).hexdigest()[:20]
+    last_modified = _last_modified(versions, as_of)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    matched = _matching_tag(etag)
+    not_modified = matched is not None
+    if not_modified:
+        headers["ETag"] = f'"{matched}"'
+        with responses._lock:
+            responses.stats["not_modified"] += 1
+    return version, etag, headers, not_modified
+
+def conditional_json(key, sources, build, vary=(), as_of=None):
+    """
+    JSON response for `build()` with ETag/Last-Modified from `sources`.
+    vary: extra values the body depends on (query args, today's date).
+    as_of: aware datetime the body can't predate (e.g. midnight for "today").
+    """
+    version, etag, headers, not_modified = _validators(key, sources, vary, as_of)
+    if not_modified:
+        return Response(status=304, headers=headers)
+
+    entry = responses.get(key, version)
+    if entry is None:
+        body = current_app.json.dumps(build()).encode("utf-8") + b"\n"
+        zipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        entry = (body, zipped)
+        responses.put(key, version, entry)
+
+    body, zipped = entry
+    if zipped is not None and "gzip" in request.accept_encodings:
+        headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = f'"{etag}{GZIP_SUFFIX}"'
+        body = zipped
+    return Response(body, mimetype="application/json", headers=headers)
+
+def conditional_stream(key, sources, generate, mimetype, vary=(), as_of=None, headers=None):
+    """Like conditional_json, but streams generate()'s chunks instead of caching a body."""
+    _, _, validators, not_modified = _validators(key, sources, vary, as_of)
+    validators.pop("Vary")
+    validators.update(headers or {})
+    if not_modified:
+        return Response(status=304, headers=validators)
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=validators)
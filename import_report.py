@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+# Import-time report: imports each module in a fresh interpreter with
+# -X importtime and prints its total cost plus the slowest dependencies.
+# Usage: python3 import_report.py [module ...] [--top N]
+
+DEFAULT_MODULES = ["plan_tools", "agent", "analytics", "llm_openai", "web_app"]
+
+def import_times(module: str) -> list:
+    """[(cumulative_us, self_us, name), ...] for everything `import module` pulls in."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name[1:].rstrip()))
+    return rows
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    top = 5
+    if "--top" in argv:
+        i = argv.index("--top")
+        top = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    for module in argv or DEFAULT_MODULES:
+        try:
+            rows = import_times(module)
+        except RuntimeError as e:
+            print(f"{module}: failed ({e})")
+            continue
+        total = next((c for c, _, n in rows if n.strip() == module), 0)
+        print(f"{module}: {total / 1000:.1f} ms")
+        # top-level packages only (one indent level below the module itself)
+        children = sorted((r for r in rows if r[2].startswith("  ") and not r[2].startswith("   ")), reverse=True)
+        for cumulative, _, name in children[:top]:
+            print(f"    {name.strip():<30} {cumulative / 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import importlib
+import os
+import threading
+
+from llm_chat import ChatMixin
+
+# LLM backend registry. Backends are named and imported only when first
+# used, so commands that never talk to a model never pay for the OpenAI
+# SDK. MARATHON_LLM_BACKEND picks one:
+#
+#   openai          llm_openai, every call goes to the API
+#   mock            mock_llm, offline canned answers
+#   cached          LLMCache in front of openai (default)
+#   cached:<name>   LLMCache in front of any other registered backend
+#
+# Every backend is exposed with the same interface as LLMCache:
+# backend(prompt, bypass=False), backend.stream(prompt, bypass=False),
+# backend.chat(...)/chat_stream(...) for multi-turn sessions (llm_chat.py),
+# backend.discard(prompt) to drop a cached reply the caller rejected,
+# backend.model and backend.stats.
+
+DEFAULT_BACKEND = "cached"
+
+_registry = {
+    "openai": "llm_openai",
+    "mock": "mock_llm",
+}
+_loaded = {}
+_lock = threading.Lock()
+
+def register(name: str, module_name: str):
+    """
+    Register a module exposing call_llm(prompt), MODEL and optionally
+    stream_llm(prompt), chat_llm(...) and chat_stream_llm(...) (see llm_chat.py).
+    """
+    _registry[name] = module_name
+
+def available() -> list:
+    return sorted(_registry) + ["cached"] + [f"cached:{n}" for n in sorted(_registry)]
+
+class ModuleBackend(ChatMixin):
+    def __init__(self, module):
+        self.module = module
+        self.call = module.call_llm
+        self.stream_call = getattr(module, "stream_llm", None)
+        self.chat_call = getattr(module, "chat_llm", None)
+        self.chat_stream_call = getattr(module, "chat_stream_llm", None)
+        self.model = getattr(module, "MODEL", module.__name__)
+        self.stats = {"calls": 0}
+
+    def __call__(self, prompt: str, bypass: bool = False) -> str:
+        self.stats["calls"] += 1
+        return self.call(prompt)
+
+    def stream(self, prompt: str, bypass: bool = False):
+        self.stats["calls"] += 1
+        if self.stream_call is None:
+            yield self.call(prompt)
+        else:
+            yield from self.stream_call(prompt)
+
+    def discard(self, prompt: str):
+        pass  # nothing cached
+
+def _build(name: str):
+    if name == "cached" or name.startswith("cached:"):
+        from llm_cache import LLMCache
+        inner = get_backend(name.partition(":")[2] or "openai")
+        return LLMCache(inner.call, model=inner.model, stream_call=inner.stream_call,
+                        chat_call=inner.chat_call, chat_stream_call=inner.chat_stream_call)
+    if name not in _registry:
+        raise ValueError(f"Unknown LLM backend {name!r}; choose from {', '.join(available())}")
+    return ModuleBackend(importlib.import_module(_registry[name]))
+
+def get_backend(name=None):
+    name = name or os.getenv("MARATHON_LLM_BACKEND", DEFAULT_BACKEND)
+    with _lock:
+        backend = _loaded.get(name)
+    if backend is None:
+        backend = _build(name)
+        with _lock:
+            backend = _loaded.setdefault(name, backend)
+    return backend
+
+class LazyLLM:
+    """Stands in for a backend and resolves it on first use."""
+
+    def __init__(self, name=None):
+        self._name = name
+
+    @property
+    def backend(self):
+        return get_backend(self._name)
+
+    def __call__(self, prompt: str, bypass: bool = False) -> str:
+        return self.backend(prompt, bypass=bypass)
+
+    def stream(self, prompt: str, bypass: bool = False):
+        return self.backend.stream(prompt, bypass=bypass)
+
+    def __getattr__(self, attr):
+        return getattr(self.backend, attr)
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from llm_chat import ChatMixin, render_chat
+
+# Content-addressed cache in front of an LLM backend. Entries live on disk as
+# one JSON file per (model, normalized prompt) hash. Reads refresh the file
+# mtime, which doubles as the LRU clock for eviction. Concurrent identical
+# requests share a single backend call. Chat calls are cached under their
+# rendered transcript (llm_chat.render_chat), the same key a backend without
+# chat_call uses. Follow-ups that continue a provider response
+# (previous_response_id) go straight to the backend. A hit has no response
+# id, so the session's next turn sends its whole transcript. A bypassed
+# call ("fresh") skips the lookup but stores its reply, replacing the entry.
+# Callers that reject a reply (unparseable, failed checks) discard() it so it
+# isn't replayed. Eviction scans the directory only when the running entry
+# and byte counts go over the limits, or every EVICT_RESCAN_EVERY writes to
+# pick up other processes' entries.
+
+CACHE_DIR = ".llm_cache"
+DEFAULT_TTL_SECONDS = 24 * 3600
+MAX_ENTRIES = 500
+MAX_BYTES = 20 * 1024 * 1024
+EVICT_RESCAN_EVERY = 100
+EVICT_TO = 0.9  # evict down to this share of the limits, so a full cache doesn't rescan on every write
+
+def normalize_prompt(prompt: str) -> str:
+    lines = prompt.replace("\r\n", "\n").strip().split("\n")
+    return "\n".join(line.rstrip() for line in lines)
+
+def cache_key(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class LLMCache(ChatMixin):
+    def __init__(self, call, model: str, cache_dir=CACHE_DIR, ttl=DEFAULT_TTL_SECONDS,
+                 max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, stream_call=None, chat_call=None,
+                 chat_stream_call=None):
+        self.call = call
+        self.stream_call = stream_call
+        self.chat_call = chat_call
+        self.chat_stream_call = chat_stream_call
+        self.model = model
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "coalesced": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._usage = None  # [entries, bytes], from the last scan plus our writes
+        self._writes = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        return entry["response"]
+
+    def put(self, key, response: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"model": self.model, "created": time.time(), "response": response}, f)
+        try:
+            old = os.path.getsize(path)
+        except FileNotFoundError:
+            old = None
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._writes += 1
+            usage = self._usage
+            if usage is not None:
+                usage[0] += old is None
+                usage[1] += size - (old or 0)
+            scan = (usage is None or self._writes % EVICT_RESCAN_EVERY == 0
+                    or usage[0] > self.max_entries or usage[1] > self.max_bytes)
+        if scan:
+            self._evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        over = len(entries) > self.max_entries or total > self.max_bytes
+        max_entries, max_bytes = int(self.max_entries * EVICT_TO), int(self.max_bytes * EVICT_TO)
+        while over and entries and (len(entries) > max_entries or total > max_bytes):
+            _, size, name = entries.pop(0)
+            self._remove(os.path.join(self.cache_dir, name))
+            total -= size
+            with self._lock:
+                self.stats["evictions"] += 1
+        with self._lock:
+            self._usage = [len(entries), total]
+
+    def discard(self, prompt: str):
+        """Drop the cached reply for prompt, e.g. one the caller couldn't use."""
+        self._remove(self._path(cache_key(prompt, self.model)))
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                self._remove(os.path.join(self.cache_dir, name))
+        with self._lock:
+            self._usage = None
+
+    def __call__(self, prompt: str, bypass: bool = False) -> str:
+        key = cache_key(prompt, self.model)
+        if bypass or os.getenv("LLM_CACHE_BYPASS") == "1":
+            with self._lock:
+                self.stats["bypassed"] += 1
+            result = self.call(prompt)
+            self.put(key, result)
+            return result
+
+        cached = self.get(key)
+        if cached is not None:
+            with self._lock:
+                self.stats["hits"] += 1
+            return cached
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.call(prompt)
+            self.put(key, flight.result)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stream(self, prompt: str, bypass: bool = False):
+        """
+        Streaming counterpart of __call__. A hit is replayed as a single
+        chunk; a miss is streamed from the backend and stored once complete.
+        Streams are not coalesced, since every caller wants its own tokens.
+        """
+        if self.stream_call is None:
+            yield self(prompt, bypass=bypass)
+            return
+        key = cache_key(prompt, self.model)
+        if bypass or os.getenv("LLM_CACHE_BYPASS") == "1":
+            cached = None
+            with self._lock:
+                self.stats["bypassed"] += 1
+        else:
+            cached = self.get(key)
+            with self._lock:
+                self.stats["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        for chunk in self.stream_call(prompt):
+            parts.append(chunk)
+            yield chunk
+        self.put(key, "".join(parts))
+
+    def _chat_cached(self, instructions, messages, previous_response_id, bypass, call):
+        # (key, cached text) for a cacheable chat turn; key None when it isn't
+        if previous_response_id or call is None:
+            return None, None
+        key = cache_key(render_chat(instructions, messages), self.model)
+        if bypass or os.getenv("LLM_CACHE_BYPASS") == "1":
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return key, None  # the fresh reply replaces the entry
+        cached = self.get(key)
+        with self._lock:
+            self.stats["hits" if cached is not None else "misses"] += 1
+        return key, cached
+
+    def chat(self, instructions, messages, previous_response_id=None, new_messages=None, bypass=False):
+        key, cached = self._chat_cached(instructions, messages, previous_response_id, bypass, self.chat_call)
+        if cached is not None:
+            return cached, None
+        text, response_id = super().chat(instructions, messages, previous_response_id, new_messages, bypass)
+        if key is not None:
+            self.put(key, text)
+        return text, response_id
+
+    def chat_stream(self, instructions, messages, previous_response_id=None, new_messages=None, bypass=False,
+                    result=None):
+        result = {} if result is None else result
+        key, cached = self._chat_cached(instructions, messages, previous_response_id, bypass,
+                                        self.chat_stream_call)  # else super() goes through chat()
+        if cached is not None:
+            result["response_id"] = None
+            yield cached
+            return
+        parts = []
+        for chunk in super().chat_stream(instructions, messages, previous_response_id, new_messages, bypass, result):
+            parts.append(chunk)
+            yield chunk
+        if key is not None:
+            self.put(key, "".join(parts))
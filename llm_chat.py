@@ -0,0 +1,59 @@
+# Multi-turn calls on top of the single-prompt backends. A conversation is
+# fixed instructions plus a list of {"role", "content"} messages. Backends
+# that keep conversation state on the provider side (chat_llm(instructions,
+# messages, previous_response_id) -> (text, response_id)) get only the new
+# messages and the id of the response they continue. The others get the
+# whole transcript as one prompt, instructions first, so every follow-up
+# starts with the previous prompt and the provider can reuse its cached
+# prefix.
+
+ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+
+class StaleResponse(LookupError):
+    """The provider no longer has the response a follow-up points at."""
+
+def render_chat(instructions: str, messages: list) -> str:
+    parts = [instructions]
+    for m in messages:
+        label = ROLE_LABELS.get(m["role"])
+        parts.append(f"{label}: {m['content']}" if label else m["content"])
+    return "\n\n".join(parts + ["Assistant:"])
+
+class ChatMixin:
+    """chat()/chat_stream() for a backend with __call__/stream and optional chat_call/chat_stream_call."""
+
+    chat_call = None
+    chat_stream_call = None
+
+    def chat(self, instructions, messages, previous_response_id=None, new_messages=None, bypass=False):
+        """
+        messages: the whole conversation, ending with the new user turn.
+        previous_response_id/new_messages: the response it continues and the
+        messages added since; stateful backends send only those.
+        Returns (text, response_id), response_id None for stateless backends.
+        """
+        if self.chat_call is None:
+            return self(render_chat(instructions, messages), bypass=bypass), None
+        self.stats["chat_calls"] = self.stats.get("chat_calls", 0) + 1
+        if previous_response_id:
+            return self.chat_call(instructions, new_messages, previous_response_id)
+        return self.chat_call(instructions, messages)
+
+    def chat_stream(self, instructions, messages, previous_response_id=None, new_messages=None, bypass=False,
+                    result=None):
+        """Streaming chat(); the response id is stored in result["response_id"]."""
+        result = {} if result is None else result
+        result["response_id"] = None
+        if self.chat_stream_call is None:
+            if self.chat_call is None:
+                yield from self.stream(render_chat(instructions, messages), bypass=bypass)
+            else:
+                text, result["response_id"] = self.chat(instructions, messages, previous_response_id, new_messages,
+                                                      bypass=bypass)
+                yield text
+            return
+        self.stats["chat_calls"] = self.stats.get("chat_calls", 0) + 1
+        if previous_response_id:
+            yield from self.chat_stream_call(instructions, new_messages, previous_response_id, result=result)
+        else:
+            yield from self.chat_stream_call(instructions, messages, result=result)
@@ -1,7 +1,27 @@
 import os
-from openai import OpenAI
+import threading
 
-client = OpenAI()  # reads OPENAI_API_KEY from env automatically :contentReference[oaicite:3]{index=3}
+from llm_chat import StaleResponse
+
+MODEL = "gpt-5-mini"
+TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# One client, built on first use: its keep-alive connection pool is shared by
+# every request thread, so concurrent chats reuse connections instead of
+# re-handshaking. The SDK import is deferred too, since it is slow to load.
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(  # reads OPENAI_API_KEY from env automatically :contentReference[oaicite:3]{index=3}
+                timeout=TIMEOUT_SECONDS,
+                max_retries=2,
+            )
+    return _client
 
 def call_llm(prompt: str) -> str:
     """
@@ -10,9 +30,67 @@ def call_llm(prompt: str) -> str:
     if not os.getenv("OPENAI_API_KEY"):
         raise RuntimeError("OPENAI_API_KEY is not set. Add it to your environment variables.")
 
-    response = client.responses.create(
-        model="gpt-5-mini",
+    response = get_client().responses.create(
+        model=MODEL,
         input=prompt,
     )
     return response.output_text
 
+def stream_llm(prompt: str):
+    """
+    Yields the response text in pieces as the model produces them.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is not set. Add it to your environment variables.")
+
+    stream = get_client().responses.create(
+        model=MODEL,
+        input=prompt,
+        stream=True,
+    )
+    for event in stream:
+        if event.type == "response.output_text.delta":
+            yield event.delta
+
+def _conversation(instructions, messages, previous_response_id):
+    # instructions are not carried over from previous_response_id, so they go on every call
+    kwargs = {"model": MODEL, "instructions": instructions, "input": messages, "store": True}
+    if previous_response_id:
+        kwargs["previous_response_id"] = previous_response_id
+    return kwargs
+
+def _stale(e, previous_response_id):
+    from openai import BadRequestError, NotFoundError
+    return previous_response_id and isinstance(e, (BadRequestError, NotFoundError))
+
+def chat_llm(instructions: str, messages: list, previous_response_id=None):
+    """
+    One conversation turn: (answer, response id). With previous_response_id
+    only the new messages are sent; the provider keeps the rest.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is not set. Add it to your environment variables.")
+    try:
+        response = get_client().responses.create(**_conversation(instructions, messages, previous_response_id))
+    except Exception as e:
+        if _stale(e, previous_response_id):
+            raise StaleResponse(previous_response_id) from e
+        raise
+    return response.output_text, response.id
+
+def chat_stream_llm(instructions: str, messages: list, previous_response_id=None, result=None):
+    """Streaming chat_llm(); the response id goes to result["response_id"]."""
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is not set. Add it to your environment variables.")
+    try:
+        stream = get_client().responses.create(**_conversation(instructions, messages, previous_response_id),
+                                               stream=True)
+    except Exception as e:
+        if _stale(e, previous_response_id):
+            raise StaleResponse(previous_response_id) from e
+        raise
+    for event in stream:
+        if event.type == "response.created" and result is not None:
+            result["response_id"] = event.response.id
+        elif event.type == "response.output_text.delta":
+            yield event.delta
@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# Bounded worker pool for LLM calls. Request threads hand the slow network
+# round trip to the pool and wait with a timeout; once every worker is busy
+# and the wait queue is full, new calls are rejected straight away so the
+# server sheds load instead of piling up requests.
+
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "8"))
+LLM_QUEUE_LIMIT = int(os.getenv("LLM_QUEUE_LIMIT", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "90"))
+
+class LLMBusy(RuntimeError):
+    pass
+
+class LLMTimeout(RuntimeError):
+    pass
+
+_DONE = object()
+
+class LLMPool:
+    def __init__(self, workers=LLM_WORKERS, queue_limit=LLM_QUEUE_LIMIT, timeout=LLM_TIMEOUT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self.stats = {"in_flight": 0, "completed": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise LLMBusy("Too many coaching requests in progress, try again shortly.")
+        with self._lock:
+            self.stats["in_flight"] += 1
+
+    def _release(self, ok=True):
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            self.stats["completed" if ok else "errors"] += 1
+        self._slots.release()
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn in the pool and return its result, waiting at most `timeout` seconds."""
+        self._acquire()
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self._release(f.exception() is None))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # The worker keeps its slot until the backend call actually returns.
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise LLMTimeout(f"LLM call took longer than {self.timeout:.0f}s")
+
+    def stream(self, gen_fn, *args, **kwargs):
+        """
+        Drive a streaming generator in the pool and yield its chunks here.
+        The timeout applies to the gap between chunks.
+        """
+        self._acquire()
+        chunks = queue.Queue()
+
+        def pump():
+            ok = True
+            try:
+                for chunk in gen_fn(*args, **kwargs):
+                    chunks.put(chunk)
+            except Exception as e:
+                ok = False
+                chunks.put(e)
+            finally:
+                chunks.put(_DONE)
+                self._release(ok)
+
+        self._executor.submit(pump)
+        while True:
+            try:
+                item = chunks.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self.stats["timeouts"] += 1
+                raise LLMTimeout(f"LLM stream stalled for {self.timeout:.0f}s")
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+pool = LLMPool()
@@ -1,8 +1,9 @@
 import pandas as pd
 
 def load_strava_activities(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+    return normalize_columns(pd.read_csv(path))
 
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     # Normalize date column
     if "Activity Date" in df.columns:
         df["Activity Date"] = pd.to_datetime(df["Activity Date"], errors="coerce")
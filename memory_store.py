@@ -0,0 +1,252 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+# Durable agent memory shared by the terminal agent and the web app.
+#
+#   memory.json                 snapshot of profile, last_plan, ... (rewritten atomically)
+#   memory.journal.jsonl        "set" operations since the last snapshot
+#   memory.notes.jsonl          every note, append-only
+#   memory.chats.jsonl          coach chat transcripts (question + answer), append-only
+#
+# Writers append one JSON line under an exclusive flock, so concurrent
+# processes never interleave or clobber each other. Once the journal
+# reaches COMPACT_EVERY entries it is folded into a new snapshot. Notes have
+# their own log so the latest N can be read from the end of the file without
+# touching the rest of the history. Notes and chats are also searchable: the
+# prompts get the entries most relevant to the question (text_index.py) plus
+# the latest few notes, rather than just the last ten.
+#
+# Readers take a shared flock so they never see a snapshot from after a
+# compaction together with the journal from before it, or a note both inline
+# and in the log mid-migration. Older memory.json files kept notes inline;
+# reads and searches still see those, and they are moved to the notes log by
+# the first write (or `python3 memory_store.py migrate`), never just by
+# opening the store.
+
+COMPACT_EVERY = 50
+TAIL_BLOCK = 8192
+NOTES_TOP_K = int(os.getenv("NOTES_TOP_K", "8"))
+RECENT_NOTES = int(os.getenv("RECENT_NOTES", "3"))
+CHATS_TOP_K = int(os.getenv("CHATS_TOP_K", "3"))
+
+def memory_paths(path="memory.json") -> dict:
+    """The snapshot and its logs, so their versions can be checked without a MemoryStore."""
+    base, _ = os.path.splitext(path)
+    return {"snapshot": path, "journal": base + ".journal.jsonl", "notes": base + ".notes.jsonl",
+            "chats": base + ".chats.jsonl", "lock": path + ".lock"}
+
+class MemoryStore:
+    def __init__(self, path="memory.json"):
+        paths = memory_paths(path)
+        self.path = path
+        self.journal_path = paths["journal"]
+        self.notes_path = paths["notes"]
+        self.chats_path = paths["chats"]
+        self.lock_path = paths["lock"]
+        self._indexes = {}
+        self._migrated = False
+
+    @contextmanager
+    def _locked(self, shared=False):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_snapshot(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_snapshot(self, snap):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snap, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _append(self, path, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with open(path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _read_lines(path):
+        try:
+            with open(path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        out = []
+        for line in lines:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                continue  # torn write from a crashed process
+        return out
+
+    def _migrate_locked(self) -> int:
+        # move inline notes to the notes log; called with the lock held
+        if self._migrated:
+            return 0
+        snap = self._read_snapshot()
+        notes = snap.pop("notes", None)
+        if notes is not None:
+            for note in notes:
+                self._append(self.notes_path, note)
+            self._write_snapshot(snap)
+        self._migrated = True
+        return len(notes or [])
+
+    def migrate(self) -> int:
+        """Move notes kept inline in an older memory.json to the notes log. Returns how many."""
+        with self._locked():
+            return self._migrate_locked()
+
+    def _inline_notes(self, snap=None) -> list:
+        # notes of a memory.json that hasn't been migrated yet; once none are
+        # found there never will be, since nothing writes them inline any more
+        if self._migrated:
+            return []
+        snap = self._read_snapshot() if snap is None else snap
+        if "notes" not in snap:
+            self._migrated = True
+        return snap.get("notes") or []
+
+    def _state_locked(self) -> dict:
+        mem = self._read_snapshot()
+        for op in self._read_lines(self.journal_path):
+            mem[op["key"]] = op["value"]
+        return mem
+
+    def load(self) -> dict:
+        """Full memory dict (snapshot + journal + all notes), as memory.json used to hold."""
+        with self._locked(shared=True):
+            mem = self._state_locked()
+            mem["notes"] = self._inline_notes(mem) + self._read_lines(self.notes_path)
+        return mem
+
+    def state(self) -> dict:
+        """Snapshot + journal without notes; cheap, since notes live in their own log."""
+        with self._locked(shared=True):
+            mem = self._state_locked()
+        mem.pop("notes", None)
+        return mem
+
+    def set(self, key, value):
+        with self._locked():
+            self._migrate_locked()
+            self._append(self.journal_path, {"op": "set", "key": key, "value": value})
+            if len(self._read_lines(self.journal_path)) >= COMPACT_EVERY:
+                self._compact_locked()
+
+    def add_note(self, note: dict):
+        with self._locked():
+            self._migrate_locked()
+            self._append(self.notes_path, note)
+
+    def add_chat(self, question: str, answer: str, time: str):
+        with self._locked():
+            self._migrate_locked()
+            self._append(self.chats_path, {"time": time, "question": question, "answer": answer})
+
+    def _index(self, path, text_of):
+        from text_index import LogIndex  # NumPy on first search
+        index = self._indexes.get(path)
+        if index is None:
+            index = self._indexes.setdefault(path, LogIndex(path, text_of))
+        return index
+
+    def relevant_notes(self, query: str, k=NOTES_TOP_K, recent=RECENT_NOTES) -> list:
+        """The k notes most relevant to query plus the latest `recent`, oldest first."""
+        text_of = lambda n: n.get("text", "")
+        with self._locked(shared=True):
+            inline = self._inline_notes()
+            if inline:
+                # not migrated yet: one throwaway index over the inline notes and the log
+                from text_index import TextIndex
+                index = TextIndex()
+                for note in inline + self._read_lines(self.notes_path):
+                    index.add(note, text_of(note))
+                hits = index.search(query, k)
+        if not inline:
+            hits = self._index(self.notes_path, text_of).search(query, k)
+        notes = [n for _, n in hits] + self.recent_notes(recent)
+        seen, out = set(), []
+        for n in notes:
+            key = json.dumps(n, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                out.append(n)
+        return sorted(out, key=lambda n: n.get("time") or "")
+
+    def relevant_chats(self, query: str, k=CHATS_TOP_K) -> list:
+        """Past chat exchanges most relevant to query, oldest first."""
+        text_of = lambda c: f"{c.get('question', '')} {c.get('answer', '')}"
+        hits = self._index(self.chats_path, text_of).search(query, k)
+        return sorted((c for _, c in hits), key=lambda c: c.get("time") or "")
+
+    def recent_notes(self, n=10) -> list:
+        """Latest n notes, oldest first, reading backwards from the end of the log."""
+        if n <= 0:
+            return []
+        # shared lock: a migration moves inline notes into the log
+        with self._locked(shared=True):
+            return self._recent_notes_locked(n)
+
+    def _recent_notes_locked(self, n) -> list:
+        inline = self._inline_notes()[-n:]
+        try:
+            f = open(self.notes_path, "rb")
+        except FileNotFoundError:
+            return inline
+        with f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            buf = b""
+            while pos > 0 and buf.count(b"\n") <= n:
+                step = min(TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+        lines = buf.splitlines()
+        if pos > 0:
+            lines = lines[1:]  # first line of the block may be cut off
+        notes = []
+        for line in reversed(lines):
+            if len(notes) == n:
+                break
+            try:
+                notes.append(json.loads(line))
+            except ValueError:
+                continue  # torn write from a crashed process
+        return (inline + notes[::-1])[-n:]
+
+    def _compact_locked(self):
+        snap = self._read_snapshot()
+        for op in self._read_lines(self.journal_path):
+            snap[op["key"]] = op["value"]
+        self._write_snapshot(snap)
+        open(self.journal_path, "w").close()
+
+    def compact(self):
+        with self._locked():
+            self._migrate_locked()
+            self._compact_locked()
+
+if __name__ == "__main__":
+    import sys
+    # python3 memory_store.py migrate [memory.json]
+    if sys.argv[1:2] != ["migrate"]:
+        raise SystemExit("usage: python3 memory_store.py migrate [memory.json]")
+    path = sys.argv[2] if len(sys.argv) > 2 else "memory.json"
+    print(f"Moved {MemoryStore(path).migrate()} inline notes from {path} to the notes log.")
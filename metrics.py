@@ -0,0 +1,227 @@
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from context_builder import estimate_tokens
+
+# Lightweight instrumentation: stage timers, counters and histograms kept in
+# process, rendered in the Prometheus text format by /metrics, plus one JSON
+# log line per web request or agent command with its stage breakdown, and
+# the process's current and peak RSS.
+#
+#   MARATHON_METRICS=0     turns everything off; stage() then hands back a
+#                          shared no-op context manager
+#   REQUEST_LOG=<path>     write the per-request JSON lines there (off by
+#                          default); the file rotates at REQUEST_LOG_MAX_BYTES,
+#                          keeping REQUEST_LOG_BACKUPS old files
+
+ENABLED = os.getenv("MARATHON_METRICS", "1") != "0"
+REQUEST_LOG = os.getenv("REQUEST_LOG", "")
+REQUEST_LOG_MAX_BYTES = int(os.getenv("REQUEST_LOG_MAX_BYTES", str(10 * 2 ** 20)))
+REQUEST_LOG_BACKUPS = int(os.getenv("REQUEST_LOG_BACKUPS", "3"))
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NOOP = nullcontext()
+_current = ContextVar("marathon_request", default=None)
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_help = {}
+
+log = logging.getLogger("marathon.requests")
+log.propagate = False
+if ENABLED and REQUEST_LOG:
+    from logging.handlers import RotatingFileHandler
+    _handler = RotatingFileHandler(REQUEST_LOG, maxBytes=REQUEST_LOG_MAX_BYTES,
+                                   backupCount=REQUEST_LOG_BACKUPS, delay=True)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+def describe(name: str, text: str):
+    _help[name] = text
+
+def inc(metric: str, value: float = 1.0, /, **labels):
+    if not ENABLED:
+        return
+    key = (metric, _key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+def observe(metric: str, seconds: float, /, **labels):
+    if not ENABLED:
+        return
+    key = (metric, _key(labels))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = Histogram()
+        h.observe(seconds)
+
+@contextmanager
+def _timed_stage(name, labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        observe("marathon_stage_seconds", elapsed, stage=name, **labels)
+        rec = _current.get()
+        if rec is not None:
+            rec["stages"][name] = round(rec["stages"].get(name, 0.0) + elapsed * 1000, 3)
+
+def stage(name: str, **labels):
+    """Time a block as `name`; also added to the current request's log line."""
+    if not ENABLED:
+        return _NOOP
+    return _timed_stage(name, labels)
+
+@contextmanager
+def _timed_llm(model):
+    t0 = time.perf_counter()
+    with _timed_stage("llm_call", {}):
+        yield
+    observe("marathon_llm_seconds", time.perf_counter() - t0, model=model)
+
+def llm_call(model: str):
+    """Time an LLM round trip, both as the llm_call stage and per model."""
+    if not ENABLED:
+        return _NOOP
+    return _timed_llm(model)
+
+def record_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    if not ENABLED:
+        return
+    inc("marathon_llm_prompt_tokens_total", prompt_tokens, model=model)
+    inc("marathon_llm_completion_tokens_total", completion_tokens, model=model)
+    rec = _current.get()
+    if rec is not None:
+        rec["tokens"] = {"model": model, "prompt": prompt_tokens, "completion": completion_tokens}
+
+def timed_call(call, prompt: str, model: str, **kwargs) -> str:
+    """call(prompt, **kwargs) timed as an LLM call, with estimated token counts."""
+    with llm_call(model):
+        answer = call(prompt, **kwargs)
+    record_tokens(model, estimate_tokens(prompt), estimate_tokens(answer or ""))
+    return answer
+
+def begin_request(kind: str, name: str):
+    """Start a request record; returns a handle for end_request (None when disabled)."""
+    if not ENABLED:
+        return None
+    rec = {"kind": kind, "name": name, "start": time.perf_counter(), "stages": {}}
+    return rec, _current.set(rec)
+
+def end_request(handle, status="ok", **fields):
+    if handle is None:
+        return
+    rec, token = handle
+    try:
+        _current.reset(token)
+    except ValueError:  # finished from another context (e.g. after a streamed body)
+        _current.set(None)
+    elapsed = time.perf_counter() - rec.pop("start")
+    observe("marathon_request_seconds", elapsed, kind=rec["kind"], name=rec["name"])
+    inc("marathon_requests_total", kind=rec["kind"], name=rec["name"], status=str(status))
+    if log.handlers:
+        log.info(json.dumps({
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **rec,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            **fields,
+        }))
+
+@contextmanager
+def request(kind: str, name: str):
+    handle = begin_request(kind, name)
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        end_request(handle, status)
+
+def _labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, (list(h.counts), h.sum, h.count)) for k, h in _histograms.items())
+    out, seen = [], set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                out.append(f"# HELP {name} {_help[name]}")
+            out.append(f"# TYPE {name} {kind}")
+
+    for (name, key), value in counters:
+        header(name, "counter")
+        out.append(f"{name}{_labels(key)} {value:g}")
+    for (name, key), (counts, total, count) in histograms:
+        header(name, "histogram")
+        cumulative = 0
+        for bound, n in zip(list(BUCKETS) + ["+Inf"], counts):
+            cumulative += n
+            le = bound if bound == "+Inf" else f"{bound:g}"
+            out.append(f"{name}_bucket{_labels(key, [('le', le)])} {cumulative}")
+        out.append(f"{name}_sum{_labels(key)} {total:.6f}")
+        out.append(f"{name}_count{_labels(key)} {count}")
+    return "\n".join(out) + "\n"
+
+describe("marathon_stage_seconds", "Time spent in each pipeline stage.")
+describe("marathon_request_seconds", "Web request / agent command latency.")
+describe("marathon_requests_total", "Web requests and agent commands by status.")
+describe("marathon_llm_seconds", "LLM call latency by model.")
+describe("marathon_llm_first_chunk_seconds", "Time to the first streamed chunk, by model.")
+describe("marathon_llm_prompt_tokens_total", "Estimated prompt tokens sent, by model.")
+describe("marathon_llm_completion_tokens_total", "Estimated completion tokens received, by model.")
+
+def peak_rss_bytes():
+    # ru_maxrss is in bytes on macOS and KiB on Linux/BSD; no resource module on Windows
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def process_rss_bytes():
+    # current RSS on Linux; peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return peak_rss_bytes()
@@ -1,4 +1,128 @@
-def call_llm(prompt):
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from llm_chat import StaleResponse
+
+MODEL = "mock"
+
+# Streaming timing, overridable from the environment for offline benchmarks.
+FIRST_TOKEN_DELAY = float(os.getenv("MOCK_LLM_FIRST_TOKEN_DELAY", "0.2"))
+CHUNK_DELAY = float(os.getenv("MOCK_LLM_CHUNK_DELAY", "0.02"))
+CHUNK_CHARS = int(os.getenv("MOCK_LLM_CHUNK_CHARS", "8"))
+
+# Simulated provider behaviour for load tests (bench/loadtest.py); off by
+# default, and then streams use the delays above and calls return at once.
+#   MOCK_LLM_LATENCY         time to first token: fixed:<s>, uniform:<lo>,<hi>
+#                            or lognormal:<median>,<sigma>
+#   MOCK_LLM_TOKENS_PER_SEC  output speed after the first token (0 = instant)
+#   MOCK_LLM_ERROR_RATE      share of calls that fail after the first-token wait
+CHARS_PER_TOKEN = 4
+SIM = {"latency": None, "tokens_per_sec": 0.0, "error_rate": 0.0}
+_rng = random.Random()
+
+def parse_latency(spec):
+    """"lognormal:1.2,0.5" -> ("lognormal", (1.2, 0.5)); None/"" -> None."""
+    if not spec:
+        return None
+    kind, _, args = spec.partition(":")
+    params = tuple(float(x) for x in args.split(",") if x)
+    need = {"fixed": 1, "uniform": 2, "lognormal": 2}
+    if need.get(kind) != len(params):
+        raise ValueError(f"Bad latency {spec!r}: use fixed:<s>, uniform:<lo>,<hi> or lognormal:<median>,<sigma>")
+    return kind, params
+
+def configure(latency=None, tokens_per_sec=None, error_rate=None, seed=None):
+    """Set the simulation; arguments left as None keep their current value."""
+    if latency is not None:
+        SIM["latency"] = parse_latency(latency)
+    if tokens_per_sec is not None:
+        SIM["tokens_per_sec"] = float(tokens_per_sec)
+    if error_rate is not None:
+        SIM["error_rate"] = float(error_rate)
+    if seed is not None:
+        _rng.seed(seed)
+
+configure(os.getenv("MOCK_LLM_LATENCY", ""), os.getenv("MOCK_LLM_TOKENS_PER_SEC", "0"),
+          os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+
+def _first_token_delay(default):
+    if SIM["latency"] is None:
+        return default
+    kind, p = SIM["latency"]
+    if kind == "fixed":
+        return p[0]
+    if kind == "uniform":
+        return _rng.uniform(*p)
+    return _rng.lognormvariate(0.0, p[1]) * p[0]
+
+def _wait_first_token(default):
+    time.sleep(_first_token_delay(default))
+    if SIM["error_rate"] and _rng.random() < SIM["error_rate"]:
+        raise RuntimeError("mock LLM error (simulated)")
+
+def _generation_seconds(chars):
+    tps = SIM["tokens_per_sec"]
+    return chars / CHARS_PER_TOKEN / tps if tps > 0 else 0.0
+
+# Prefix reuse as a provider would see it: for plain prompts, the longest
+# prefix shared with a recent prompt (what its prompt cache could serve);
+# for chat follow-ups, the conversation held under previous_response_id
+# against the characters actually sent.
+RECENT_PROMPTS = 64
+STATS = {"prompts": 0, "prompt_chars": 0, "prompt_prefix_chars": 0,
+         "chat_calls": 0, "chat_continued": 0, "chat_chars_sent": 0, "chat_chars_reused": 0}
+_recent = deque(maxlen=RECENT_PROMPTS)
+_conversations = OrderedDict()  # response id -> characters in the conversation so far
+_lock = threading.Lock()
+
+def _shared_prefix(a, b):
+    # binary search on slice equality: C-speed compares instead of a per-char loop
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _record_prompt(prompt):
+    with _lock:
+        shared = max((_shared_prefix(prompt, p) for p in _recent), default=0)
+        _recent.append(prompt)
+        STATS["prompts"] += 1
+        STATS["prompt_chars"] += len(prompt)
+        STATS["prompt_prefix_chars"] += shared
+
+def _record_chat(instructions, messages, previous_response_id, answer):
+    sent = len(instructions) + sum(len(m["content"]) for m in messages)
+    with _lock:
+        reused = 0
+        if previous_response_id:
+            if previous_response_id not in _conversations:
+                raise StaleResponse(previous_response_id)
+            reused = _conversations[previous_response_id]
+            STATS["chat_continued"] += 1
+        STATS["chat_calls"] += 1
+        STATS["chat_chars_sent"] += sent
+        STATS["chat_chars_reused"] += reused
+        response_id = f"mock_{uuid.uuid4().hex[:16]}"
+        _conversations[response_id] = reused + sent - len(instructions) + len(answer)
+        while len(_conversations) > 1000:
+            _conversations.popitem(last=False)
+    return response_id
+
+def reset_stats():
+    with _lock:
+        for k in STATS:
+            STATS[k] = 0
+        _recent.clear()
+
+def _answer():
     return """
 {
   "Monday": "Rest or light strength",
@@ -11,3 +135,42 @@ def call_llm(prompt):
 }
 """
 
+def _complete(answer):
+    # the whole answer at once, after the simulated first token and generation time
+    if SIM["latency"] is not None or SIM["error_rate"]:
+        _wait_first_token(0.0)
+    time.sleep(_generation_seconds(len(answer)))
+    return answer
+
+def call_llm(prompt):
+    _record_prompt(prompt)
+    return _complete(_answer())
+
+def chat_llm(instructions, messages, previous_response_id=None):
+    answer = _answer()
+    response_id = _record_chat(instructions, messages, previous_response_id, answer)
+    return _complete(answer), response_id
+
+def _chunks(text, first_token_delay, chunk_delay, chunk_chars):
+    _wait_first_token(first_token_delay)
+    if SIM["tokens_per_sec"] > 0:
+        chunk_delay = _generation_seconds(chunk_chars)
+    for i in range(0, len(text), chunk_chars):
+        if i:
+            time.sleep(chunk_delay)
+        yield text[i:i + chunk_chars]
+
+def stream_llm(prompt, first_token_delay=None, chunk_delay=None, chunk_chars=None):
+    first_token_delay = FIRST_TOKEN_DELAY if first_token_delay is None else first_token_delay
+    chunk_delay = CHUNK_DELAY if chunk_delay is None else chunk_delay
+    chunk_chars = chunk_chars or CHUNK_CHARS
+
+    _record_prompt(prompt)
+    yield from _chunks(_answer(), first_token_delay, chunk_delay, chunk_chars)
+
+def chat_stream_llm(instructions, messages, previous_response_id=None, result=None):
+    answer = _answer()
+    response_id = _record_chat(instructions, messages, previous_response_id, answer)
+    if result is not None:
+        result["response_id"] = response_id
+    yield from _chunks(answer, FIRST_TOKEN_DELAY, CHUNK_DELAY, CHUNK_CHARS)
@@ -0,0 +1,71 @@
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from plan_tools import compile_plan, sessions_between
+
+# iCalendar (RFC 5545) export of a reference plan: one all-day VEVENT per
+# planned session, written week by week so large plan libraries stream out
+# without the whole calendar being built in memory. Rest days ("OFF") are
+# left off the calendar.
+
+PRODID = "-//marathon-agent//plan export//EN"
+
+def _escape(text: str) -> str:
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+def _fold(line: str) -> str:
+    # content lines are limited to 75 octets; continuation lines start with a space
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, chunk = [], b""
+    for ch in line:
+        b = ch.encode("utf-8")
+        if len(chunk) + len(b) > (75 if not parts else 74):
+            parts.append(chunk.decode("utf-8"))
+            chunk = b""
+        chunk += b
+    parts.append(chunk.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+def _description(week) -> str:
+    lines = [week["week_label"]]
+    if week.get("goal"):
+        lines.append(f"Goal: {week['goal']}")
+    if week.get("approx_km") is not None:
+        lines.append(f"Week volume: ~{week['approx_km']} km")
+    return "\n".join(lines)
+
+def ics_events(plan, start: date = None, end: date = None, stamp: datetime = None, name: str = None):
+    """Yield the calendar as text chunks, one per event plus header and footer."""
+    plan = compile_plan(plan)
+    if not plan.starts:
+        start = end = date.today()
+    start = start or plan.starts[0]
+    end = end or max(plan.ends, default=start)
+    dtstamp = (stamp or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    plan_id = hashlib.sha1((name or plan.get("plan_name", "")).encode("utf-8")).hexdigest()[:12]
+
+    yield "".join(_fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_escape(name or plan.get('plan_name', 'Training plan'))}",
+    ])
+    for d, week, dow, workout in sessions_between(plan, start, end):
+        if not workout or workout.strip().upper() == "OFF":
+            continue
+        yield "".join(_fold(line) for line in [
+            "BEGIN:VEVENT",
+            f"UID:{d.isoformat()}-{plan_id}@marathon-agent",
+            f"DTSTAMP:{dtstamp}",
+            f"DTSTART;VALUE=DATE:{d.strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{(d + timedelta(days=1)).strftime('%Y%m%d')}",
+            f"SUMMARY:{_escape(workout)}",
+            f"DESCRIPTION:{_escape(_description(week))}",
+            "TRANSP:TRANSPARENT",
+            "END:VEVENT",
+        ])
+    yield "END:VCALENDAR\r\n"
@@ -0,0 +1,307 @@
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from workouts import parse_workout
+
+# Local weekly plans and the progression checks they (and any LLM plan) must
+# pass. A plan is {day: session text}; sessions are read with
+# workouts.parse_workout, so the checks apply equally to the reference plan,
+# a generated week or an LLM reply.
+#
+# Generation: the week's volume follows the reference plan's approx_km for
+# the current week, capped at MAX_WEEKLY_RAMP over recent volume (held
+# flat when training load says so, and cut by INJURY_CUT when a note from
+# the last NOTE_DAYS mentions pain, injury or illness), spread over
+# availability.days_per_week runs with the long run on preferred_long_run_day
+# and a rest day before it.
+#
+# Checks, over any number of weeks in one pass of (weeks x 7) arrays:
+#   ramp         weekly km more than MAX_WEEKLY_RAMP above the week before
+#   long_share   long run over LONG_RUN_MAX_SHARE of the week
+#   long_day     the longest run is not on the preferred day
+#   run_days     more runs than days_per_week
+#   hard_days    two hard sessions (long, quality, race) on consecutive days
+#   rest_day     no rest or cross day next to the long run
+#   streak       more than max(MAX_RUN_STREAK, days_per_week) runs in a row
+#
+# Race weeks skip the ramp and long-run checks, but only weeks the caller
+# marks as such (race weeks of the reference plan): what a week's own text
+# says never exempts it, so an LLM reply can't switch its checks off.
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+KM_PER_MILE = 1.60934
+
+MAX_WEEKLY_RAMP = float(os.getenv("PLAN_MAX_WEEKLY_RAMP", "0.10"))
+LONG_RUN_SHARE = float(os.getenv("PLAN_LONG_RUN_SHARE", "0.35"))
+LONG_RUN_MAX_SHARE = float(os.getenv("PLAN_LONG_RUN_MAX_SHARE", "0.5"))
+MAX_RUN_STREAK = int(os.getenv("PLAN_MAX_RUN_STREAK", "4"))
+MIN_WEEK_KM = float(os.getenv("PLAN_MIN_WEEK_KM", "15"))
+INJURY_CUT = float(os.getenv("PLAN_INJURY_CUT", "0.2"))
+NOTE_DAYS = int(os.getenv("PLAN_NOTE_DAYS", "14"))
+MIN_RUN_KM = 3
+MIN_PER_KM = 6.0  # for sessions given only in minutes ("25 min jog")
+HARD_TYPES = {"intervals", "threshold", "race_pace", "progression", "long", "race"}
+INJURY_WORDS = re.compile(r"\b(pain\w*|injur\w*|sore\w*|hurt\w*|ache\w*|aching|niggle\w*|strain\w*|sprain\w*|"
+                          r"tendon\w*|tendin\w*|shin splints?|swollen|swelling|sick|ill|illness|fever|flu|covid)\b",
+                          re.I)
+# "no pain", "not sore anymore", "without any swelling", "pain-free": a
+# negation in the few words before a match (same clause) or "free" after it
+NEGATION = re.compile(r"^(?:no|not|never|without|nothing|zero|\w+n't)$", re.I)
+CLAUSE_END = re.compile(r"[.;:,!?]|\bbut\b", re.I)
+NEGATION_WORDS = 3
+
+class PlanRejected(ValueError):
+    def __init__(self, violations):
+        self.violations = violations
+        super().__init__("; ".join(v["message"] for v in violations))
+
+def parse_plan(text: str) -> dict:
+    """An LLM reply as {day: session}; ValueError unless it is exactly the 7 days as strings."""
+    plan = json.loads(text)
+    if not isinstance(plan, dict) or sorted(plan) != sorted(DAYS):
+        raise ValueError("plan must be a JSON object keyed Monday..Sunday")
+    if not all(isinstance(v, str) for v in plan.values()):
+        raise ValueError("every day must be a single string")
+    return {day: plan[day] for day in DAYS}
+
+def _negated(text: str, start: int, end: int) -> bool:
+    before = CLAUSE_END.split(text[:start])[-1]
+    if any(NEGATION.match(w) for w in re.findall(r"[\w']+", before)[-NEGATION_WORDS:]):
+        return True
+    return re.match(r"[\s-]*free\b", text[end:], re.I) is not None
+
+def mentions_injury(text: str) -> bool:
+    """Pain, injury or illness words that aren't negated ("no pain today" doesn't count)."""
+    return any(not _negated(text, m.start(), m.end()) for m in INJURY_WORDS.finditer(text))
+
+def _note_day(note):
+    # the note's date, or None when it has none we can read
+    stamp = note.get("time") or note.get("ts")
+    try:
+        if isinstance(stamp, (int, float)):
+            return datetime.fromtimestamp(stamp).date()
+        if isinstance(stamp, str):
+            return datetime.fromisoformat(stamp).date()
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None
+
+def injury_notes(notes, today=None) -> list:
+    """Notes from the last NOTE_DAYS days that mention pain, injury or illness."""
+    since = (today or date.today()) - timedelta(days=NOTE_DAYS)
+    out = []
+    for n in notes or []:
+        if not isinstance(n, dict):
+            continue
+        day = _note_day(n)  # undated notes count as recent
+        if (day is None or day >= since) and mentions_injury(str(n.get("text") or "")):
+            out.append(n)
+    return out
+
+def plan_limits(profile: dict, summary: dict, training_load=None, notes=None) -> dict:
+    """
+    check_weeks() arguments for the coming week, from the profile, summary,
+    load and notes (see injury_notes()).
+    """
+    availability = profile.get("availability") or {}
+    recent = max(summary.get("avg_weekly_miles_last_4_weeks") or 0, summary.get("last_week_miles") or 0)
+    load = training_load or {}
+    hold = (load.get("acwr") or 0) > 1.3 or (load.get("form") or 0) < 0
+    prev_km = max(recent * KM_PER_MILE, MIN_WEEK_KM / (1 + MAX_WEEKLY_RAMP))
+    if injury_notes(notes):
+        hold = True
+        prev_km *= 1 - INJURY_CUT
+    return {
+        "days_per_week": min(7, max(1, int(availability.get("days_per_week") or 7))),
+        "long_run_day": availability.get("preferred_long_run_day"),
+        "prev_km": prev_km,
+        "max_ramp": 0.0 if hold else MAX_WEEKLY_RAMP,
+    }
+
+def week_km(sessions: dict) -> float:
+    return float(_arrays([sessions])[0].sum())
+
+def target_km(limits: dict, reference_week=None) -> float:
+    """The reference week's volume (or recent volume without one), capped by the ramp limit."""
+    cap = limits["prev_km"] * (1 + limits["max_ramp"])
+    ref = None
+    if reference_week:
+        ref = reference_week.get("approx_km") or week_km(reference_week["sessions"])
+    return min(ref or limits["prev_km"], cap)
+
+def _rest_days(n, long_idx):
+    # first rest the day before the long run, the others spread evenly back from it
+    rest = []
+    r = 7 - n
+    for k in range(r):
+        d = (long_idx - 1 - round(k * 7 / r)) % 7
+        while d == long_idx or d in rest:
+            d = (d - 1) % 7
+        rest.append(d)
+    return rest
+
+def _long_km(total, n):
+    if n == 1:
+        return total
+    long_km = round(total * max(LONG_RUN_SHARE, 1.3 / n))
+    return min(long_km, int(total * LONG_RUN_MAX_SHARE)) if n > 2 else long_km
+
+def local_plan(profile: dict, summary: dict, training_load=None, reference_week=None, notes=None) -> dict:
+    """A 7-day plan from the rules alone; passes check_plan() for the same inputs."""
+    limits = plan_limits(profile, summary, training_load, notes)
+    total = int(target_km(limits, reference_week))
+    n = limits["days_per_week"]
+    while n > 1 and total - _long_km(total, n) < MIN_RUN_KM * (n - 1):
+        n -= 1  # fewer, longer runs rather than going over the target
+    long_km = _long_km(total, n)
+    long_idx = DAYS.index(limits["long_run_day"]) if limits["long_run_day"] in DAYS else 6
+    rest = _rest_days(n, long_idx)
+    others = [d for d in range(7) if d not in rest and d != long_idx]
+    easy = [(total - long_km) // len(others)] * len(others) if others else []
+    for i in range((total - long_km) - sum(easy)):
+        easy[i] += 1
+    easy = [max(MIN_RUN_KM, min(km, long_km)) for km in easy]
+
+    # one strides session, as far from the long run as possible
+    quality = None
+    if n >= 4 and limits["max_ramp"] > 0:
+        quality = max(others, key=lambda d: min((d - long_idx) % 7, (long_idx - d) % 7))
+
+    preferences = profile.get("preferences") or {}
+    plan = {}
+    strength = preferences.get("strength_training")
+    for d in range(7):
+        if d == long_idx:
+            plan[DAYS[d]] = f"{long_km} km long run"
+        elif d in others:
+            km = easy[others.index(d)]
+            plan[DAYS[d]] = f"{km} km easy + 6×20s strides" if d == quality else f"{km} km easy"
+        elif strength and d != (long_idx - 1) % 7:
+            plan[DAYS[d]] = "Strength"
+            strength = False
+        else:
+            plan[DAYS[d]] = "OFF"
+    return plan
+
+@lru_cache(maxsize=4096)
+def _session(text):
+    # (km, hard) for one session; optional and cross sessions add no km
+    s = parse_workout(text)
+    km = 0.0
+    if not s["optional"] and s["kind"] in ("run", "race"):
+        km = s["distance_km"] if s["distance_km"] is not None else (s["minutes"] or 0) / MIN_PER_KM
+    return km, s["type"] in HARD_TYPES
+
+def _arrays(weeks):
+    # (weeks x 7) km and hard-session flags
+    cells = np.array([[_session(w.get(day) or "") for day in DAYS] for w in weeks], dtype=float).reshape(-1, 7, 2)
+    return cells[:, :, 0], cells[:, :, 1] > 0
+
+def is_race_week(week) -> bool:
+    """True for a reference plan week with a race in it."""
+    return bool(week) and any(parse_workout(t)["kind"] == "race" for t in week["sessions"].values())
+
+def check_weeks(weeks, days_per_week=7, long_run_day=None, prev_km=None, max_ramp=MAX_WEEKLY_RAMP,
+                labels=None, race_weeks=None) -> list:
+    """
+    Violations for consecutive weeks of {day: session}, as
+    [{"week", "rule", "message"}]; empty when every week passes.
+    prev_km is the volume of the week before the first one, if known;
+    race_weeks flags the (trusted) weeks exempt from ramp and long-run checks.
+    """
+    labels = labels or [f"week {i + 1}" for i in range(len(weeks))]
+    km, hard = _arrays(weeks)
+    if not len(km):
+        return []
+    race = np.zeros(len(km), dtype=bool) if race_weeks is None else np.asarray(race_weeks, dtype=bool)
+    is_run = km > 0
+    runs = is_run.sum(axis=1)
+    totals = km.sum(axis=1)
+    long_idx = km.argmax(axis=1)
+    long_km = km.max(axis=1)
+    rows = np.arange(len(km))
+    has_long = (runs >= 3) & ~race
+    hard[rows[has_long], long_idx[has_long]] = True
+
+    out = []
+    def flag(mask, rule, message):
+        for i in np.flatnonzero(mask):
+            out.append({"week": labels[i], "rule": rule, "message": f"{labels[i]}: {message(i)}"})
+
+    prev = np.concatenate([[prev_km or 0.0], totals[:-1]])
+    flag((prev > 0) & ~race & (totals > prev * (1 + max_ramp) + 0.5), "ramp",
+         lambda i: f"{totals[i]:.0f} km is {totals[i] / prev[i] - 1:+.0%} on {prev[i]:.0f} km "
+                   f"(limit {max_ramp:+.0%})")
+    share = np.divide(long_km, totals, out=np.zeros_like(totals), where=totals > 0)
+    flag(has_long & (share > LONG_RUN_MAX_SHARE), "long_share",
+         lambda i: f"long run is {share[i]:.0%} of the week (limit {LONG_RUN_MAX_SHARE:.0%})")
+    if long_run_day in DAYS:
+        d = DAYS.index(long_run_day)
+        flag(has_long & (km[:, d] < long_km), "long_day",
+             lambda i: f"longest run is on {DAYS[long_idx[i]]}, not {long_run_day}")
+    flag(runs > days_per_week, "run_days", lambda i: f"{runs[i]} run days (available: {days_per_week})")
+
+    flat_hard = hard.ravel()
+    back_to_back = np.zeros(len(km), dtype=bool)
+    back_to_back[(np.flatnonzero(flat_hard[1:] & flat_hard[:-1]) + 1) // 7] = True
+    flag(back_to_back, "hard_days", lambda i: "hard sessions on consecutive days")
+
+    if days_per_week < 7:
+        flat_run = is_run.ravel()
+        pos = rows * 7 + long_idx
+        before = np.where(pos > 0, flat_run[np.maximum(pos - 1, 0)], False)
+        after = np.where(pos < flat_run.size - 1, flat_run[np.minimum(pos + 1, flat_run.size - 1)], False)
+        flag(has_long & before & after, "rest_day", lambda i: "no rest day before or after the long run")
+
+    # run streaks across week boundaries, charged to the week they end in
+    edges = np.diff(np.concatenate([[0], is_run.ravel().astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    limit = max(MAX_RUN_STREAK, days_per_week)
+    streak = np.zeros(len(km), dtype=int)
+    np.maximum.at(streak, (ends - 1) // 7, ends - starts)
+    flag(streak > limit, "streak", lambda i: f"{streak[i]} run days in a row (limit {limit})")
+    return out
+
+def check_plan(plan: dict, limits: dict, reference_week=None) -> list:
+    """
+    check_weeks() for one week against plan_limits(). Only a race week of the
+    reference plan is exempt; the plan's own text never is.
+    """
+    return check_weeks([plan], labels=["plan"], race_weeks=[is_race_week(reference_week)], **limits)
+
+def llm_plan(reply: str, limits: dict, reference_week=None) -> dict:
+    """An LLM reply as a plan; PlanRejected if it is malformed or fails check_plan()."""
+    try:
+        plan = parse_plan(reply)
+    except ValueError as e:  # includes JSONDecodeError
+        raise PlanRejected([{"week": "plan", "rule": "format", "message": f"plan: {e}"}])
+    violations = check_plan(plan, limits, reference_week)
+    if violations:
+        raise PlanRejected(violations)
+    return plan
+
+def check_reference(plan: dict, days_per_week=7, long_run_day=None) -> list:
+    """check_weeks() over every week of a reference plan (plan_reference.json shape)."""
+    weeks = plan["weeks"]
+    return check_weeks([w["sessions"] for w in weeks], days_per_week, long_run_day,
+                       labels=[w["week_label"] for w in weeks], race_weeks=[is_race_week(w) for w in weeks])
+
+if __name__ == "__main__":
+    # python3 plan_rules.py [plan_reference.json] [runner_profile.json]
+    import sys
+    plan_path = sys.argv[1] if len(sys.argv) > 1 else "plan_reference.json"
+    profile_path = sys.argv[2] if len(sys.argv) > 2 else "runner_profile.json"
+    with open(plan_path) as f:
+        reference = json.load(f)
+    with open(profile_path) as f:
+        availability = json.load(f).get("availability") or {}
+    problems = check_reference(reference, int(availability.get("days_per_week") or 7),
+                               availability.get("preferred_long_run_day"))
+    print(f"{len(reference['weeks'])} weeks checked, {len(problems)} issue(s)")
+    for p in problems:
+        print(f"  [{p['rule']}] {p['message']}")
@@ -1,17 +1,72 @@
 import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
 from datetime import date, datetime, timedelta
 
 PLAN_PATH = "plan_reference.json"
+COMPILED_CACHE_SIZE = 8
 
-def load_plan():
-    with open(PLAN_PATH, "r") as f:
-        return json.load(f)
+_compiled_plans = OrderedDict()  # id(plan) -> (plan, CompiledPlan)
+_compiled_lock = threading.Lock()
+
+class CompiledPlan(dict):
+    """
+    A loaded plan with lookup tables built once. It is still the plan dict
+    (plan["weeks"] etc. work as before); the indexes are extra attributes:
+      by_date   date -> week index, for O(1) session lookups
+      starts    sorted week start dates, for bisecting to the next week
+                (ends and start_weeks are aligned with it)
+      by_label  lowercased week label -> week
+    """
+
+    def __init__(self, plan):
+        super().__init__(plan)
+        self.by_date = {}
+        self.by_label = {}
+        spans = []
+        for i, w in enumerate(self["weeks"]):
+            self.by_label.setdefault(w["week_label"].lower(), w)
+            start, end = get_date_range(w)
+            spans.append((start, i, end))
+            d = start
+            while d <= end:
+                self.by_date.setdefault(d, i)
+                d += timedelta(days=1)
+        spans.sort()
+        self.starts = [s for s, _, _ in spans]
+        self.start_weeks = [i for _, i, _ in spans]
+        self.ends = [e for _, _, e in spans]
+
+def compile_plan(plan):
+    return plan if isinstance(plan, CompiledPlan) else CompiledPlan(plan)
+
+def load_plan(path=PLAN_PATH):
+    """The plan at `path`, compiled once."""
+    with open(path, "r") as f:
+        return CompiledPlan(json.load(f))
+
+def _compiled(plan) -> CompiledPlan:
+    # Plain plan dicts still work: they are compiled on first use and the
+    # result is kept for the last few dicts (held, so their ids can't be
+    # reused), so repeated lookups don't rebuild the indexes. Treat a plan
+    # as read-only once it has been looked up.
+    if isinstance(plan, CompiledPlan):
+        return plan
+    with _compiled_lock:
+        hit = _compiled_plans.get(id(plan))
+        if hit and hit[0] is plan:
+            _compiled_plans.move_to_end(id(plan))
+            return hit[1]
+    compiled = CompiledPlan(plan)
+    with _compiled_lock:
+        _compiled_plans[id(plan)] = (plan, compiled)
+        while len(_compiled_plans) > COMPILED_CACHE_SIZE:
+            _compiled_plans.popitem(last=False)
+    return compiled
 
 def get_week(plan, week_label: str):
-    for w in plan["weeks"]:
-        if w["week_label"].lower() == week_label.lower():
-            return w
-    return None
+    return _compiled(plan).by_label.get(week_label.lower())
 
 def pretty_week(week):
     lines = []
@@ -31,25 +86,40 @@ def get_date_range(week):
 def workout_on(plan, d: date):
     # find week containing date; then map day name to session
     dow = d.strftime("%A")
-    for w in plan["weeks"]:
-        start, end = get_date_range(w)
-        if start <= d <= end:
-            return w["week_label"], dow, w["sessions"].get(dow)
-    return None, dow, None
+    w = week_for_date(plan, d)
+    if w is None:
+        return None, dow, None
+    return w["week_label"], dow, w["sessions"].get(dow)
 
 def week_for_date(plan, d: date):
-    for w in plan["weeks"]:
-        start, end = get_date_range(w)
-        if start <= d <= end:
-            return w
-    return None
+    plan = _compiled(plan)
+    i = plan.by_date.get(d)
+    return plan["weeks"][i] if i is not None else None
 
 def next_week(plan, d: date):
     # find the next week starting after d
-    candidates = []
-    for w in plan["weeks"]:
-        start, end = get_date_range(w)
-        if start > d:
-            candidates.append((start, w))
-    candidates.sort(key=lambda x: x[0])
-    return candidates[0][1] if candidates else None
+    plan = _compiled(plan)
+    i = bisect_right(plan.starts, d)
+    return plan["weeks"][plan.start_weeks[i]] if i < len(plan.starts) else None
+
+def sessions_between(plan, start: date, end: date):
+    """
+    Yield (date, week, weekday, workout) for every planned day in [start, end],
+    walking the weeks in date order from a bisect instead of looking up each
+    day. Days outside every plan week are skipped.
+    """
+    plan = _compiled(plan)
+    k = max(0, bisect_right(plan.starts, start) - 1)
+    for j in range(k, len(plan.starts)):
+        week_start = plan.starts[j]
+        if week_start > end:
+            break
+        i = plan.start_weeks[j]
+        week = plan["weeks"][i]
+        d = max(week_start, start)
+        last = min(plan.ends[j], end)
+        while d <= last:
+            if plan.by_date.get(d) == i:  # overlapping weeks: same winner as workout_on
+                dow = d.strftime("%A")
+                yield d, week, dow, week["sessions"].get(dow)
+            d += timedelta(days=1)
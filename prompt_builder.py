@@ -1,17 +1,36 @@
 import json
 
-def build_prompt(runner_profile, summary):
+from context_builder import build_context, compact_notes, prune
+
+def plan_context(runner_profile, summary, budget=None, training_load=None):
+    # Returns (context_json, token usage per section)
+    profile = dict(runner_profile)
+    notes = profile.pop("notes", None)
+    return build_context([
+        ("runner_profile", prune(profile)),
+        ("training_summary", summary),
+        ("training_load", training_load),
+        ("notes", compact_notes(notes)),
+    ], budget)
+
+def build_prompt(runner_profile, summary, budget=None, training_load=None, draft=None, request=None):
+    # draft: a plan_rules.local_plan() week to reword or adjust; request: the runner's ask
+    ctx, _ = plan_context(runner_profile, summary, budget, training_load)
+    extra = ""
+    if draft:
+        extra += ("\n\nDraft plan (JSON). It already meets the rules below: keep its days and distances\n"
+                  "and make the wording personal, unless the runner's request needs a change:\n"
+                  + json.dumps(draft, ensure_ascii=False))
+    if request:
+        extra += f"\n\nRunner's request:\n{request}"
     return f"""
 You are an expert running coach.
 
-Runner profile:
-{json.dumps(runner_profile, indent=2)}
-
-Recent training summary:
-{json.dumps(summary, indent=2)}
+Runner profile and recent training summary (JSON):
+{ctx}
 
 Task:
-Create a training plan for the next 7 days.
+Create a training plan for the next 7 days.{extra}
 
 
 Hard rules:
@@ -20,6 +39,7 @@ Hard rules:
 - Each value must be a single string describing the workout.
 - Respect availability and long run day.
 - Keep mileage progression safe based on recent weekly mileage.
+- If training_load shows acwr above 1.3 or negative form, hold or reduce volume this week.
 
 Return JSON only.
 """.strip()
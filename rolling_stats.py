@@ -0,0 +1,109 @@
+from datetime import date
+
+import numpy as np
+from activity_store import refresh_store, source_key
+from analytics import daily_rollup, run_columns
+
+# Window queries over the daily run series. Prefix sums of miles, seconds and
+# run counts give any [start, end] total with two binary searches. Pace
+# percentiles come from per-day pace histograms (fixed 0.1 min/mi bins),
+# which are mergeable, so their prefix sums answer windows the same way.
+
+PACE_MIN, PACE_MAX, PACE_STEP = 4.0, 20.0, 0.1
+PACE_EDGES = np.round(np.arange(PACE_MIN, PACE_MAX + PACE_STEP / 2, PACE_STEP), 2)
+STATUS_WINDOWS = (7, 28, 56, 365)
+
+_series_cache = {}
+
+def _prefix(values, axis=0):
+    values = np.asarray(values)
+    zero = np.zeros((1,) + values.shape[1:], dtype=values.dtype)
+    return np.concatenate([zero, np.cumsum(values, axis=axis)])
+
+def _as_day(d) -> np.datetime64:
+    if isinstance(d, str):
+        d = date.fromisoformat(d)
+    return np.datetime64(d, "D")
+
+class DailySeries:
+    def __init__(self, cols: dict):
+        runs = run_columns(cols)
+        daily = daily_rollup(runs)
+        self.days = daily["day"]
+        self.last_activity = cols["date"].max().astype("datetime64[D]") if len(cols["date"]) else None
+        self.cum_miles = _prefix(daily["miles"])
+        self.cum_seconds = _prefix(daily["seconds"])
+        self.cum_runs = _prefix(daily["runs"].astype(np.int64))
+
+        nbins = len(PACE_EDGES) - 1
+        hist = np.zeros((len(self.days), nbins), dtype=np.int32)
+        pace = runs["pace_min_per_mi"]
+        ok = ~np.isnan(pace)
+        day_idx = np.searchsorted(self.days, runs["day"][ok])
+        # paces outside the grid land in the first/last bin
+        bin_idx = np.clip(np.searchsorted(PACE_EDGES, pace[ok], side="right") - 1, 0, nbins - 1)
+        np.add.at(hist, (day_idx, bin_idx), 1)
+        self.cum_pace_hist = _prefix(hist)
+
+    def _span(self, start, end):
+        lo = int(np.searchsorted(self.days, _as_day(start), side="left"))
+        hi = int(np.searchsorted(self.days, _as_day(end), side="right"))
+        return lo, max(lo, hi)
+
+    @staticmethod
+    def _percentile(counts, q):
+        total = counts.sum()
+        if total == 0:
+            return None
+        target = q * total
+        cum = np.cumsum(counts)
+        i = int(np.searchsorted(cum, target, side="left"))
+        before = cum[i - 1] if i else 0
+        frac = (target - before) / counts[i] if counts[i] else 0.0
+        return round(float(PACE_EDGES[i] + frac * PACE_STEP), 2)
+
+    def query(self, start, end) -> dict:
+        """Totals, averages and pace percentiles for runs on days in [start, end]."""
+        start, end = _as_day(start), _as_day(end)
+        lo, hi = self._span(start, end)
+        miles = float(self.cum_miles[hi] - self.cum_miles[lo])
+        seconds = float(self.cum_seconds[hi] - self.cum_seconds[lo])
+        runs = int(self.cum_runs[hi] - self.cum_runs[lo])
+        days = int((end - start).astype(int)) + 1
+        counts = self.cum_pace_hist[hi] - self.cum_pace_hist[lo]
+        return {
+            "start": str(start),
+            "end": str(end),
+            "days": days,
+            "runs": runs,
+            "miles": round(miles, 2),
+            "hours": round(seconds / 3600, 2),
+            "avg_weekly_miles": round(miles / days * 7, 2) if days > 0 else 0.0,
+            "avg_pace_min_per_mi": round(seconds / 60 / miles, 2) if miles > 0 and seconds > 0 else None,
+            "pace_percentiles_min_per_mi": {
+                f"p{int(q * 100)}": self._percentile(counts, q) for q in (0.2, 0.5, 0.8)
+            } if counts.sum() else None,
+        }
+
+    def windows(self, lengths=STATUS_WINDOWS, end=None) -> dict:
+        """Trailing windows ending on `end` (default: latest activity day)."""
+        end = _as_day(end) if end is not None else self.last_activity
+        if end is None:
+            return {}
+        return {f"last_{n}_days": self.query(end - np.timedelta64(n - 1, "D"), end) for n in lengths}
+
+def daily_series(csv_path: str) -> DailySeries:
+    """Memoized DailySeries for the export; rebuilt only when the CSV changes."""
+    version = source_key(csv_path)
+    hit = _series_cache.get(csv_path)
+    if hit and hit[0] == version:
+        return hit[1]
+    series = DailySeries(refresh_store(csv_path))
+    _series_cache[csv_path] = (version, series)
+    return series
+
+def window_stats(csv_path: str, start, end) -> dict:
+    return daily_series(csv_path).query(start, end)
+
+def status_windows(csv_path: str, end=None) -> dict:
+    return daily_series(csv_path).windows(end=end)
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+
+from athletes import athletes, file_version, source_paths
+from coach_prompt import build_daily_brief_prompt
+from metrics import stage, timed_call
+from plan_tools import workout_on
+
+# Background refresh for the web app. Every SCHEDULER_INTERVAL seconds it
+# stat()s the activity export, plan and memory files of each athlete in the
+# loaded-athlete cache (without reordering it); when any of them changed it
+# rebuilds the derived data (report, daily series, training load, adherence,
+# compiled plan) into the athlete's memo, so request handlers read ready
+# snapshots, and rewrites runner_history.json if it is older than the export.
+# Athletes that aren't loaded are left alone, so the tick never holds more
+# than ATHLETE_CACHE_SIZE athletes' data; they are forgotten when evicted and
+# warmed on the first tick after a request loads them again. Once a day, after
+# BRIEF_HOUR local time, it asks the LLM for a short coaching brief and stores
+# it in memory as daily_brief. Errors are recorded per athlete, and ok_at is
+# each athlete's last check that succeeded.
+
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", "30"))
+BRIEF_HOUR = int(os.getenv("BRIEF_HOUR", "6"))
+BRIEF_RETRY_SECONDS = 900
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def history_stale(paths) -> bool:
+    """runner_history.json is missing or older than the export."""
+    export, history = file_version(paths["activities"]), file_version(paths["history"])
+    return export is not None and (history is None or history[0] < export[0])
+
+def write_history(athlete):
+    from analytics import runner_history  # pandas on first use
+    path = athlete.paths["history"]
+    history = runner_history(athlete.paths["activities"], athlete.report())
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp, path)
+
+class Scheduler:
+    def __init__(self, call_llm, interval=SCHEDULER_INTERVAL, brief_hour=BRIEF_HOUR):
+        self.call_llm = call_llm
+        self.interval = interval
+        self.brief_hour = brief_hour
+        self._versions = {}
+        self._brief_done = {}
+        self._brief_failed = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.status = {"running": False, "last_tick": None, "last_refresh": None, "errors": 0, "athletes": {}}
+        athletes.on_evict.append(self.forget)
+
+    def forget(self, athlete_id):
+        """Called when the athlete is evicted: its memo is gone, so warm it again once reloaded."""
+        self._versions.pop(athlete_id, None)
+
+    def refresh(self, athlete_id) -> bool:
+        """Rebuild a loaded athlete's derived data and stale history. Returns True if it did either."""
+        a = athletes.peek(athlete_id)
+        if a is None:
+            return False
+        versions = tuple(file_version(p) for p in source_paths(athlete_id))
+        refreshed = False
+        with stage("scheduler_refresh"):
+            # the history file only depends on the export
+            if history_stale(a.paths):
+                write_history(a)
+                refreshed = True
+            if self._versions.get(athlete_id) == versions:
+                return refreshed
+            a.state()
+            a.plan()
+            if os.path.exists(a.paths["activities"]):
+                a.report()
+                a.series()
+                a.training_load()
+                a.adherence()
+                a.history()
+        self._versions[athlete_id] = versions
+        return True
+
+    def brief(self, athlete_id, today=None):
+        """Generate today's brief unless it already exists."""
+        today = today or date.today()
+        if self._brief_done.get(athlete_id) == today:
+            return None
+        a = athletes.peek(athlete_id)
+        if a is None:
+            return None
+        existing = a.state().get("daily_brief") or {}
+        if existing.get("date") == today.isoformat() or not a.profile():
+            self._brief_done[athlete_id] = today
+            return None
+        _, _, workout = workout_on(a.plan(), today)
+        report = a.report()
+        prompt = build_daily_brief_prompt(a.profile(), report["summary"], today, workout,
+                                          a.memory.recent_notes(10), a.training_load())
+        text = timed_call(self.call_llm, prompt, self.call_llm.model)
+        brief = {"date": today.isoformat(), "generated_at": _now(), "workout": workout, "text": text.strip()}
+        a.memory.set("daily_brief", brief)
+        self._brief_done[athlete_id] = today
+        return brief
+
+    def run_once(self, now=None):
+        now = now or datetime.now()
+        succeeded = False
+        for athlete_id in athletes.loaded():
+            entry = {}
+            try:
+                if self.refresh(athlete_id):
+                    entry["refreshed_at"] = _now()
+                entry["error"] = None
+                failed = self._brief_failed.get(athlete_id, 0)
+                if now.hour >= self.brief_hour and time.monotonic() - failed > BRIEF_RETRY_SECONDS:
+                    try:
+                        if self.brief(athlete_id, now.date()):
+                            entry["brief_at"] = _now()
+                    except Exception:
+                        # don't call the LLM again on every tick
+                        self._brief_failed[athlete_id] = time.monotonic()
+                        raise
+                entry["ok_at"] = _now()
+                succeeded = True
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+                entry["error_at"] = _now()
+            entry["checked_at"] = _now()
+            with self._lock:
+                self.status["athletes"].setdefault(athlete_id, {}).update(entry)
+        with self._lock:
+            self.status["last_tick"] = _now()
+            # one failing athlete doesn't hold the others' refresh time back,
+            # but a tick where every athlete failed doesn't count
+            if succeeded:
+                self.status["last_refresh"] = self.status["last_tick"]
+            self.status["errors"] = sum(1 for s in self.status["athletes"].values() if s.get("error"))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self.status["running"] = True
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.status["running"] = False
+
+    def report(self) -> dict:
+        with self._lock:
+            return json.loads(json.dumps(self.status))
@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+# Production server for web_app: a fixed pool of request threads instead of
+# Flask's debug server. No extra dependency is needed; werkzeug ships with
+# Flask. Slow LLM work is further bounded by llm_pool.
+
+WEB_THREADS = int(os.getenv("WEB_THREADS", "16"))
+
+class PooledWSGIServer(BaseWSGIServer):
+    multithread = True
+
+    def __init__(self, host, port, app, threads=WEB_THREADS, **kwargs):
+        super().__init__(host, port, app, **kwargs)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+def serve(app, host="127.0.0.1", port=5000, threads=WEB_THREADS):
+    server = PooledWSGIServer(host, port, app, threads=threads)
+    print(f"Serving on http://{host}:{port} with {threads} request threads")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,191 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# True best efforts from per-activity GPS/FIT streams in a Strava bulk export
+# (activities/<id>.gpx[.gz] or .fit[.gz] next to activities.csv). The run
+# files come from the Filename column of the activity store. Each new file is
+# parsed once, in a process pool, and its fastest segment for every standard
+# distance goes into an index, so later runs only touch files they have not
+# seen. A file that fails to parse is logged and recorded with its error, and
+# skipped until it changes. The pool spawns its workers rather than forking,
+# since the web app calls this with its request, scheduler and cache threads
+# (and their locks) live.
+
+STANDARD_DISTANCES_M = {
+    "best_1_mile": 1609.34,
+    "best_5k": 5000.0,
+    "best_10k": 10000.0,
+    "best_half_marathon": 21097.5,
+}
+STREAM_SUFFIXES = (".gpx", ".gpx.gz", ".fit", ".fit.gz")
+EARTH_RADIUS_M = 6371008.8
+RECENT_DAYS = 56
+
+log = logging.getLogger("marathon.streams")
+
+def stream_paths(csv_path: str):
+    base = os.path.dirname(csv_path) or "."
+    return os.path.join(base, "activities"), os.path.join(base, "streams_index.json")
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def parse_gpx(path):
+    lats, lons, times = [], [], []
+    with _open(path) as f:
+        for _, el in ET.iterparse(f):
+            if el.tag.endswith("}trkpt") or el.tag == "trkpt":
+                t = next((c.text for c in el if c.tag.endswith("time")), None)
+                if t:
+                    lats.append(float(el.get("lat")))
+                    lons.append(float(el.get("lon")))
+                    times.append(t)
+                el.clear()
+    if len(times) < 2:
+        return None
+    lat, lon = np.radians(lats), np.radians(lons)
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+    step = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+    ts = pd.to_datetime(pd.Series(times), utc=True, format="ISO8601")
+    start = ts.iloc[0]
+    return {
+        "distance_m": np.concatenate([[0.0], np.cumsum(step)]),
+        "elapsed_s": (ts - start).dt.total_seconds().to_numpy(),
+        "start": start.tz_convert(None).to_datetime64(),
+    }
+
+def parse_fit(path):
+    try:
+        import fitparse  # optional; FIT files are skipped without it
+    except ImportError:
+        return None
+    with _open(path) as f:
+        records = [
+            (r.get_value("timestamp"), r.get_value("distance"))
+            for r in fitparse.FitFile(f.read()).get_messages("record")
+        ]
+    records = [(t, d) for t, d in records if t is not None and d is not None]
+    if len(records) < 2:
+        return None
+    times = np.array([t for t, _ in records], dtype="datetime64[ms]")
+    return {
+        "distance_m": np.maximum.accumulate(np.array([d for _, d in records], dtype=np.float64)),
+        "elapsed_s": (times - times[0]).astype(np.float64) / 1000.0,
+        "start": times[0],
+    }
+
+def fastest_segment(distance_m: np.ndarray, elapsed_s: np.ndarray, target_m: float):
+    """
+    Shortest time to cover target_m anywhere in the stream. For every start
+    point the matching end point comes from one vectorized searchsorted (the
+    two-pointer sweep); the end time is interpolated between samples.
+    """
+    if len(distance_m) < 2 or distance_m[-1] - distance_m[0] < target_m:
+        return None
+    goal = distance_m + target_m
+    j = np.searchsorted(distance_m, goal, side="left")
+    ok = j < len(distance_m)
+    i, j, goal = np.nonzero(ok)[0], j[ok], goal[ok]
+    d0, d1 = distance_m[j - 1], distance_m[j]
+    t0, t1 = elapsed_s[j - 1], elapsed_s[j]
+    frac = np.where(d1 > d0, (goal - d0) / np.where(d1 > d0, d1 - d0, 1.0), 0.0)
+    times = t0 + frac * (t1 - t0) - elapsed_s[i]
+    return float(times.min())
+
+def process_file(path: str):
+    """
+    Parse one stream file and return its best efforts (runs in a worker);
+    {"error": ...} instead of raising when the file is corrupt.
+    """
+    try:
+        stream = parse_fit(path) if ".fit" in path else parse_gpx(path)
+        if stream is None:
+            return None
+        best = {label: fastest_segment(stream["distance_m"], stream["elapsed_s"], meters)
+                for label, meters in STANDARD_DISTANCES_M.items()}
+        return {"start": str(stream["start"].astype("datetime64[s]")), "best": best}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+def _run_files(csv_path, activities_dir):
+    # Prefer the export's own Filename column (kept in the store for runs
+    # only) so only runs are parsed; without it, every file in the folder.
+    from activity_store import refresh_store
+    names = np.unique(refresh_store(csv_path)["filename"])
+    names = names[names != ""]
+    if len(names) == 0:
+        return sorted(os.path.join(activities_dir, f) for f in os.listdir(activities_dir)
+                      if f.endswith(STREAM_SUFFIXES))
+    base = os.path.dirname(csv_path) or "."
+    files = (os.path.join(base, str(f)) for f in names)
+    return sorted(f for f in files if f.endswith(STREAM_SUFFIXES) and os.path.exists(f))
+
+def refresh_streams(csv_path: str, workers=None) -> dict:
+    """Process stream files not yet in the index; returns the index {file: {...}}."""
+    activities_dir, index_path = stream_paths(csv_path)
+    if not os.path.isdir(activities_dir):
+        return {}
+    try:
+        with open(index_path, "r") as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = {}
+
+    files = _run_files(csv_path, activities_dir)
+    todo = [p for p in files
+            if index.get(os.path.basename(p), {}).get("mtime_ns") != os.stat(p).st_mtime_ns]
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for path, result in zip(todo, pool.map(process_file, todo, chunksize=8)):
+                if result and "error" in result:
+                    log.warning("skipping stream %s: %s", path, result["error"])
+                index[os.path.basename(path)] = {"mtime_ns": os.stat(path).st_mtime_ns, **(result or {})}
+        tmp = index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, index_path)
+    return index
+
+def best_efforts(index: dict, days=RECENT_DAYS):
+    """Fastest segment per standard distance over the latest `days` of streams."""
+    entries = [(np.datetime64(e["start"]), name, e["best"]) for name, e in index.items() if e.get("best")]
+    if not entries:
+        return None
+    cutoff = max(s for s, _, _ in entries) - np.timedelta64(days, "D")
+    out = {}
+    for label, meters in STANDARD_DISTANCES_M.items():
+        cands = [(b[label], s, name) for s, name, b in entries if s >= cutoff and b.get(label)]
+        if not cands:
+            out[label] = None
+            continue
+        seconds, start, name = min(cands)
+        miles = meters / 1609.34
+        out[label] = {
+            "date": str(start.astype("datetime64[D]")),
+            "time_s": round(seconds, 1),
+            "distance_mi": round(miles, 2),
+            "pace_min_per_mi": round(seconds / 60 / miles, 2),
+            "activity_file": name,
+        }
+    return out
+
+def stream_best_efforts(csv_path: str, workers=None):
+    return best_efforts(refresh_streams(csv_path, workers))
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/activities.csv"
+    t0 = datetime.now()
+    index = refresh_streams(path)
+    print(f"✅ {len(index)} streams indexed in {(datetime.now() - t0).total_seconds():.1f}s")
+    print(json.dumps(best_efforts(index), indent=2))
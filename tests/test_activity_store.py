@@ -0,0 +1,32 @@
+import activity_store
+from activity_store import refresh_store
+
+HEADER = "Activity Date,Activity Type,Activity Name,Distance,Moving Time\n"
+
+
+def test_units_are_detected_from_every_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(activity_store, "INGEST_CHUNK_ROWS", 2)
+    rows = [f"2026-09-0{d} 07:00:00,Run,Blank,,1800\n" for d in (1, 2)]
+    rows += [f"2026-09-0{d} 07:00:00,Run,Easy,{8046.7 + d},2400\n" for d in (3, 4, 5)]
+    csv = tmp_path / "activities.csv"
+    csv.write_text(HEADER + "".join(rows))
+    miles = refresh_store(str(csv))["distance_mi"]
+    assert abs(float(miles[-1]) - 5.0) < 0.01
+
+
+def test_ingest_reports_peak_rss(tmp_path):
+    csv = tmp_path / "activities.csv"
+    csv.write_text(HEADER + "2026-09-01 07:00:00,Run,Easy,5.0,2400\n")
+    refresh_store(str(csv))
+    meta = activity_store._load_meta(activity_store.store_paths(str(csv))[1])
+    assert 1 < meta["ingest"]["peak_rss_mb"] < 1e5
+
+
+def test_concurrent_refreshes_of_a_cold_store(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    csv = tmp_path / "activities.csv"
+    csv.write_text(HEADER + "".join(f"2026-09-{d:02d} 07:00:00,Run,Easy,5.0,2400\n" for d in range(1, 29)))
+    with ThreadPoolExecutor(6) as pool:
+        results = list(pool.map(lambda _: refresh_store(str(csv)), range(12)))
+    assert all(len(r["date"]) == 28 for r in results)
+    assert not [p for p in tmp_path.iterdir() if ".tmp" in p.name]
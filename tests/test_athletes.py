@@ -0,0 +1,32 @@
+from datetime import date
+
+import athletes
+from athletes import Athlete
+
+
+def athlete(tmp_path, monkeypatch):
+    monkeypatch.setattr(athletes, "athlete_paths", lambda athlete_id: {
+        "memory": str(tmp_path / "memory.json"), "activities": str(tmp_path / "activities.csv"),
+        "plan": str(tmp_path / "plan.json"), "history": str(tmp_path / "runner_history.json")})
+    (tmp_path / "memory.json").write_text("{}")
+    return Athlete("a")
+
+
+def test_memos_for_different_dates_dont_evict_each_other(tmp_path, monkeypatch):
+    a = athlete(tmp_path, monkeypatch)
+    builds = []
+
+    def adherence(as_of):
+        return a._versioned(f"adherence:{as_of}", [], lambda: builds.append(as_of) or as_of,
+                            keep=("adherence:", 2))
+
+    today, other, third = date(2026, 10, 18), date(2026, 9, 1), date(2026, 8, 1)
+    for d in (today, other, today, other):
+        adherence(d)
+    assert builds == [today, other]
+    adherence(today)
+    adherence(third)  # evicts the least recently used date
+    adherence(today)
+    assert builds == [today, other, third]
+    adherence(other)
+    assert builds == [today, other, third, other]
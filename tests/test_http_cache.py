@@ -0,0 +1,47 @@
+import os
+
+from flask import Flask
+
+from http_cache import GZIP_MIN_BYTES, conditional_json
+
+
+def client(tmp_path):
+    source = tmp_path / "source.json"
+    source.write_text("1")
+    app = Flask(__name__)
+
+    @app.get("/small")
+    def small():
+        return conditional_json(("small", str(source)), [str(source)], lambda: {"v": source.read_text()})
+
+    @app.get("/big")
+    def big():
+        return conditional_json(("big", str(source)), [str(source)], lambda: {"v": "x" * GZIP_MIN_BYTES})
+
+    return app.test_client(), source
+
+
+def test_etag_wins_over_if_modified_since(tmp_path):
+    c, source = client(tmp_path)
+    first = c.get("/small")
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+    assert c.get("/small", headers={"If-None-Match": etag}).status_code == 304
+    # changed within the same second: Last-Modified is unchanged, the ETag is not
+    source.write_text("2")
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    again = c.get("/small", headers={"If-None-Match": etag, "If-Modified-Since": last_modified})
+    assert again.status_code == 200
+    assert again.get_json() == {"v": "2"}
+    assert c.get("/small", headers={"If-Modified-Since": last_modified}).status_code == 200
+
+
+def test_gzip_body_has_its_own_etag(tmp_path):
+    c, _ = client(tmp_path)
+    plain = c.get("/big")
+    zipped = c.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert zipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gz"'
+    revalidated = c.get("/big", headers={"Accept-Encoding": "gzip", "If-None-Match": zipped.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == zipped.headers["ETag"]
@@ -0,0 +1,40 @@
+import llm_cache
+from llm_cache import LLMCache
+
+
+def cache(tmp_path, replies, **options):
+    replies = iter(replies)
+    return LLMCache(lambda prompt: next(replies), model="test", cache_dir=str(tmp_path / "cache"), **options)
+
+
+def test_fresh_call_replaces_the_entry(tmp_path):
+    c = cache(tmp_path, ["stale", "fresh", "unused"])
+    assert c("q") == "stale"
+    assert c("q", bypass=True) == "fresh"
+    assert c("q") == "fresh"
+    assert c.stats["hits"] == 1
+
+
+def test_fresh_stream_replaces_the_entry(tmp_path):
+    c = cache(tmp_path, ["stale"], stream_call=lambda prompt: iter(["fr", "esh"]))
+    assert c("q") == "stale"
+    assert "".join(c.stream("q", bypass=True)) == "fresh"
+    assert c("q") == "fresh"
+
+
+def test_discarded_reply_is_not_replayed(tmp_path):
+    c = cache(tmp_path, ["not json", "good"])
+    assert c("q") == "not json"
+    c.discard("q")
+    assert c("q") == "good"
+
+
+def test_eviction_keeps_the_limit_without_rescanning_every_write(tmp_path, monkeypatch):
+    c = cache(tmp_path, [str(i) for i in range(100)], max_entries=50)
+    scans = []
+    evict = c._evict
+    monkeypatch.setattr(c, "_evict", lambda: (scans.append(1), evict()))
+    for i in range(100):
+        c(f"q{i}")
+    assert 45 <= len(list((tmp_path / "cache").iterdir())) <= 50
+    assert len(scans) <= 12
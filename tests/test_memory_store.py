@@ -0,0 +1,45 @@
+import json
+
+from memory_store import MemoryStore
+
+NOTES = [{"time": "2026-01-01T08:00", "text": "left knee sore"}, {"time": "2026-01-02T08:00", "text": "fine"}]
+
+
+def old_memory(tmp_path):
+    path = tmp_path / "memory.json"
+    path.write_text(json.dumps({"runner_profile": {"name": "A"}, "notes": NOTES}))
+    return path
+
+
+def test_opening_and_reading_leave_an_old_file_alone(tmp_path):
+    path = old_memory(tmp_path)
+    before = path.read_text()
+    store = MemoryStore(str(path))
+    assert store.load()["notes"] == NOTES
+    assert store.recent_notes(1) == NOTES[-1:]
+    assert "notes" not in store.state()
+    assert path.read_text() == before
+    assert not (tmp_path / "memory.notes.jsonl").exists()
+
+
+def test_first_write_moves_inline_notes_to_the_log(tmp_path):
+    path = old_memory(tmp_path)
+    store = MemoryStore(str(path))
+    store.add_note({"time": "2026-01-03T08:00", "text": "easy run"})
+    assert "notes" not in json.loads(path.read_text())
+    assert [n["text"] for n in store.load()["notes"]] == ["left knee sore", "fine", "easy run"]
+    assert [n["text"] for n in MemoryStore(str(path)).recent_notes(2)] == ["fine", "easy run"]
+
+
+def test_explicit_migrate(tmp_path):
+    path = old_memory(tmp_path)
+    assert MemoryStore(str(path)).migrate() == 2
+    assert MemoryStore(str(path)).migrate() == 0
+    assert MemoryStore(str(path)).load()["notes"] == NOTES
+
+
+def test_inline_notes_are_searchable_before_migration(tmp_path):
+    store = MemoryStore(str(old_memory(tmp_path)))
+    assert store.relevant_notes("knee", k=1, recent=0) == NOTES[:1]
+    store.add_note({"time": "2026-01-03T08:00", "text": "easy run"})
+    assert store.relevant_notes("knee", k=1, recent=0) == NOTES[:1]
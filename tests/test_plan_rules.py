@@ -0,0 +1,101 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from plan_rules import (PlanRejected, check_plan, check_weeks, injury_notes, llm_plan, local_plan, mentions_injury,
+                        plan_limits, week_km)
+
+PROFILE = {"availability": {"days_per_week": 5, "preferred_long_run_day": "Saturday"},
+           "preferences": {"strength_training": True}}
+SUMMARY = {"avg_weekly_miles_last_4_weeks": 20.0, "last_week_miles": 18.0}  # ~32 km
+LOAD = {"acwr": 1.0, "form": 1.0}
+
+GOOD = {"Monday": "Strength", "Tuesday": "6 km easy + 6×20s strides", "Wednesday": "6 km easy",
+        "Thursday": "6 km easy", "Friday": "OFF", "Saturday": "11 km long run", "Sunday": "5 km easy"}
+
+def limits():
+    return plan_limits(PROFILE, SUMMARY, LOAD)
+
+def rules(violations):
+    return {v["rule"] for v in violations}
+
+def test_local_plan_passes_its_own_checks():
+    assert check_plan(local_plan(PROFILE, SUMMARY, LOAD), limits()) == []
+
+def test_good_plan_accepted():
+    assert llm_plan(json.dumps(GOOD), limits()) == GOOD
+
+@pytest.mark.parametrize("reply", ["not json", json.dumps({"Monday": "OFF"}),
+                                   json.dumps(dict(GOOD, Monday=["OFF"]))])
+def test_malformed_reply_rejected(reply):
+    with pytest.raises(PlanRejected) as e:
+        llm_plan(reply, limits())
+    assert rules(e.value.violations) == {"format"}
+
+def test_ramp_long_share_and_long_day():
+    plan = dict(GOOD, Tuesday="10 km easy", Saturday="8 km", Sunday="40 km long run")
+    assert {"ramp", "long_share", "long_day"} <= rules(check_plan(plan, limits()))
+
+def test_hard_days_rest_day_and_run_days():
+    plan = dict(GOOD, Monday="8 km", Friday="6×1 km @ race pace", Thursday="3×10 min threshold")
+    assert {"hard_days", "rest_day", "run_days"} <= rules(check_plan(plan, limits()))
+
+def test_hold_when_load_is_high():
+    held = plan_limits(PROFILE, SUMMARY, {"acwr": 1.5, "form": -3})
+    # 34 km on ~32 km recent: within the 10% ramp, but not when holding
+    assert "ramp" in rules(check_plan(GOOD, held))
+    assert check_plan(GOOD, limits()) == []
+
+@pytest.mark.parametrize("wording", ["second half faster", "last 5 km at marathon pace", "half marathon 🏁"])
+def test_session_text_cannot_exempt_the_week(wording):
+    # 95 km on ~32 km recent with a 40 km long run, however the long run is worded
+    plan = dict(GOOD, Tuesday="15 km easy", Wednesday="10 km", Thursday="15 km easy",
+                Saturday=f"40 km, {wording}", Sunday="15 km")
+    with pytest.raises(PlanRejected) as e:
+        llm_plan(json.dumps(plan), limits())
+    assert "ramp" in rules(e.value.violations)
+
+def test_reference_race_week_is_exempt():
+    race_week = {"sessions": dict(GOOD, Saturday="BOSTON HALF MARATHON 🏁")}
+    plan = dict(GOOD, Saturday="BOSTON HALF MARATHON 🏁", Sunday="OFF")
+    assert "ramp" not in rules(check_plan(dict(plan, Tuesday="20 km"), limits(), race_week))
+    assert "ramp" in rules(check_plan(dict(plan, Tuesday="20 km"), limits()))
+
+def test_check_weeks_flags_each_week():
+    weeks = [GOOD, dict(GOOD, Saturday="20 km long run"), GOOD]
+    out = check_weeks(weeks, 5, "Saturday", prev_km=33)
+    assert [(v["week"], v["rule"]) for v in out if v["rule"] == "ramp"] == [("week 2", "ramp")]
+
+def test_check_weeks_streak_across_weeks():
+    every_day = {d: "5 km easy" for d in GOOD}
+    out = check_weeks([every_day, every_day], 5, None)
+    assert "streak" in rules(out)
+
+def test_injury_note_holds_and_cuts_volume():
+    notes = [{"time": datetime.now().isoformat(timespec="seconds"), "text": "left calf sore after the long run"}]
+    held = plan_limits(PROFILE, SUMMARY, LOAD, notes)
+    assert held["max_ramp"] == 0 and held["prev_km"] < limits()["prev_km"]
+    plan = local_plan(PROFILE, SUMMARY, LOAD, notes=notes)
+    assert check_plan(plan, held) == []
+    assert week_km(plan) < week_km(local_plan(PROFILE, SUMMARY, LOAD))
+
+def test_old_or_unrelated_notes_ignored():
+    notes = [{"time": "2020-01-01T08:00:00", "text": "knee pain"},
+             {"time": "2099-01-01T08:00:00", "text": "moved long run to Saturday"}]
+    assert plan_limits(PROFILE, SUMMARY, LOAD, notes) == limits()
+
+@pytest.mark.parametrize("text", ["no pain today", "not sore anymore", "ran without any pain",
+                                  "knee is pain-free now", "haven't been sick all month"])
+def test_negated_injury_words_ignored(text):
+    assert not mentions_injury(text)
+
+@pytest.mark.parametrize("text", ["left knee sore", "no swelling, but the shin hurts",
+                                  "not great: calf pain after the long run"])
+def test_injury_words_still_found(text):
+    assert mentions_injury(text)
+
+def test_bad_note_timestamps_dont_crash():
+    notes = [{"time": 1234, "text": "knee pain"}, {"time": ["x"], "text": "sore"},
+             {"time": "yesterday", "text": "ill"}, "not a note", {"text": None}]
+    assert [n["text"] for n in injury_notes(notes)] == ["sore", "ill"]
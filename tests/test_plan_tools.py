@@ -0,0 +1,33 @@
+import json
+from datetime import date
+
+import plan_tools
+from plan_tools import get_week, load_plan, next_week, sessions_between, week_for_date, workout_on
+
+PLAN = {"weeks": [
+    {"week_label": "Week 1", "date_range": "2026-09-07 to 2026-09-13", "sessions": {"Monday": "5 km easy"}},
+    {"week_label": "Week 2", "date_range": "2026-09-14 to 2026-09-20", "sessions": {"Sunday": "12 km long run"}},
+]}
+
+
+def test_plain_dicts_still_work():
+    plan = json.loads(json.dumps(PLAN))
+    assert get_week(plan, "week 2")["week_label"] == "Week 2"
+    assert week_for_date(plan, date(2026, 9, 8))["week_label"] == "Week 1"
+    assert next_week(plan, date(2026, 9, 8))["week_label"] == "Week 2"
+    assert workout_on(plan, date(2026, 9, 7)) == ("Week 1", "Monday", "5 km easy")
+    assert [d for d, _, _, w in sessions_between(plan, date(2026, 9, 7), date(2026, 9, 20)) if w] == [
+        date(2026, 9, 7), date(2026, 9, 20)]
+
+
+def test_plain_dict_is_compiled_once():
+    plan = json.loads(json.dumps(PLAN))
+    compiled = plan_tools._compiled(plan)
+    assert plan_tools._compiled(plan) is compiled
+    assert plan_tools._compiled(json.loads(json.dumps(PLAN))) is not compiled
+
+
+def test_load_plan_is_compiled(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text(json.dumps(PLAN))
+    assert isinstance(load_plan(str(path)), plan_tools.CompiledPlan)
@@ -0,0 +1,41 @@
+import os
+
+import scheduler
+from scheduler import Scheduler, history_stale
+
+
+def test_last_refresh_only_moves_when_a_refresh_succeeds(monkeypatch):
+    monkeypatch.setattr(scheduler.athletes, "loaded", lambda: ["a", "b"])
+    s = Scheduler(call_llm=None, brief_hour=24)
+    monkeypatch.setattr(s, "refresh", lambda athlete_id: 1 / 0)
+    s.run_once()
+    status = s.report()
+    assert status["last_refresh"] is None and status["errors"] == 2
+    assert "ok_at" not in status["athletes"]["a"]
+
+    monkeypatch.setattr(s, "refresh", lambda athlete_id: athlete_id == "a" or 1 / 0)
+    s.run_once()
+    status = s.report()
+    assert status["last_refresh"] == status["last_tick"]
+    assert status["athletes"]["a"]["ok_at"] and status["athletes"]["a"]["error"] is None
+    assert "ok_at" not in status["athletes"]["b"] and status["errors"] == 1
+
+
+def test_unloaded_athletes_are_left_alone(monkeypatch):
+    monkeypatch.setattr(scheduler.athletes, "peek", lambda athlete_id: None)
+    s = Scheduler(call_llm=None)
+    assert s.refresh("someone") is False
+    assert s.brief("someone") is None
+
+
+def test_history_is_stale_only_when_older_than_the_export(tmp_path):
+    paths = {"activities": str(tmp_path / "activities.csv"), "history": str(tmp_path / "runner_history.json")}
+    assert not history_stale(paths)
+    open(paths["activities"], "w").close()
+    assert history_stale(paths)
+    open(paths["history"], "w").close()
+    os.utime(paths["activities"], ns=(0, 10**18))
+    os.utime(paths["history"], ns=(0, 2 * 10**18))
+    assert not history_stale(paths)
+    os.utime(paths["activities"], ns=(0, 3 * 10**18))
+    assert history_stale(paths)
@@ -0,0 +1,30 @@
+import json
+import os
+
+from streams import refresh_streams, stream_paths
+
+HEADER = "Activity Date,Activity Type,Activity Name,Distance,Moving Time,Filename\n"
+
+
+def gpx(points):
+    pts = "".join(f'<trkpt lat="{lat}" lon="0.0"><time>2026-09-01T07:{m:02d}:00Z</time></trkpt>'
+                  for m, lat in enumerate(points))
+    return f'<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>{pts}</trkseg></trk></gpx>'
+
+
+def test_only_run_files_from_the_store_are_parsed(tmp_path):
+    csv = tmp_path / "activities.csv"
+    csv.write_text(HEADER
+                   + "2026-09-01 07:00:00,Run,Easy,5.0,2400,activities/1.gpx\n"
+                   + "2026-09-02 07:00:00,Ride,Bike,20.0,3600,activities/2.gpx\n"
+                   + "2026-09-03 07:00:00,Run,Broken,5.0,2400,activities/3.gpx\n")
+    folder, index_path = stream_paths(str(csv))
+    os.mkdir(folder)
+    (tmp_path / "activities" / "1.gpx").write_text(gpx([i * 0.01 for i in range(30)]))
+    (tmp_path / "activities" / "2.gpx").write_text(gpx([i * 0.01 for i in range(30)]))
+    (tmp_path / "activities" / "3.gpx").write_text("<gpx><trk")
+    index = refresh_streams(str(csv), workers=1)
+    assert sorted(index) == ["1.gpx", "3.gpx"]
+    assert index["1.gpx"]["best"]["best_5k"] > 0
+    assert "error" in index["3.gpx"]
+    assert json.loads(open(index_path).read()) == index
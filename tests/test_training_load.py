@@ -0,0 +1,28 @@
+import numpy as np
+
+from training_load import compute_load, update_load
+
+DAYS = np.array(["2026-09-01", "2026-09-03", "2026-09-05", "2026-09-06"], dtype="datetime64[D]")
+MILES = np.array([5.0, 6.0, 4.0, 10.0])
+
+
+def test_load_is_as_of_the_last_run_without_a_date():
+    result, _ = compute_load(DAYS, MILES)
+    assert result["as_of"] == "2026-09-06"
+
+
+def test_days_off_up_to_today_decay_the_load():
+    last, _ = compute_load(DAYS, MILES)
+    later, _ = compute_load(DAYS, MILES, "2026-09-20")
+    assert later["as_of"] == "2026-09-20"
+    assert later["acute_weekly_miles"] < last["acute_weekly_miles"]
+    assert later["chronic_weekly_miles"] < last["chronic_weekly_miles"]
+    # the acute load falls faster, so two idle weeks look like detraining
+    assert later["acwr"] < last["acwr"]
+
+
+def test_checkpoint_update_matches_full_recompute():
+    _, checkpoint = compute_load(DAYS[:2], MILES[:2])
+    stepped, _ = update_load(checkpoint, DAYS, MILES, "2026-09-20")
+    full, _ = compute_load(DAYS, MILES, "2026-09-20")
+    assert stepped == full
@@ -0,0 +1,45 @@
+import pytest
+
+from workouts import HALF_KM, parse_workout
+
+@pytest.mark.parametrize("text", [
+    "Easy 8 km, second half faster",
+    "12 km with 6 km at marathon pace",
+    "16 km incl. 8 km @ MP",
+    "3×3 km @ race pace",
+    "10 km at half marathon pace",
+    "14 km, first half marathon effort easy",
+])
+def test_pace_workouts_are_not_races(text):
+    assert parse_workout(text)["kind"] == "run"
+
+@pytest.mark.parametrize("text", ["BOSTON HALF MARATHON 🏁", "Half marathon", "Marathon", "10k race", "Race day"])
+def test_races(text):
+    assert parse_workout(text)["kind"] == "race"
+
+def test_half_marathon_race_distance():
+    assert parse_workout("BOSTON HALF MARATHON 🏁")["distance_km"] == HALF_KM
+
+@pytest.mark.parametrize("text, km", [
+    ("12 km with 6 km at marathon pace", 12.0),
+    ("16 km incl. 8 km @ MP", 16.0),
+    ("16 km including 8 km steady", 16.0),
+    ("20 km (last 8 km fast)", 20.0),
+    ("2 km easy → 3 km steady → 1 km easy", 6.0),
+    ("3×3 km @ race pace", 9.0),
+    ("5×1 km @ 5:20–5:30/km", 5.0),
+    ("6 km easy + 4×20s strides", 6.0),
+])
+def test_distance_counts_the_outer_run(text, km):
+    assert parse_workout(text)["distance_km"] == km
+
+def test_marathon_pace_type():
+    assert parse_workout("12 km with 6 km at marathon pace")["type"] == "race_pace"
+
+def test_minutes_only():
+    assert parse_workout("60 min with 3×10 min tempo")["minutes"] == 60.0
+    assert parse_workout("4×5 min comfortably hard")["minutes"] == 20.0
+
+def test_results_are_not_shared():
+    parse_workout("7 km easy")["distance_km"] = 99
+    assert parse_workout("7 km easy")["distance_km"] == 7.0
@@ -0,0 +1,119 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+# Offline BM25 retrieval over the append-only memory logs (notes and chat
+# transcripts). A log is parsed once and afterwards only from the byte offset
+# it was last read to, so entries appended by any process are indexed on the
+# next query. Postings are per-term lists of (entry id, term count); a query
+# adds its terms' BM25 weights into one score array, which keeps searches in
+# the low milliseconds at tens of thousands of entries.
+
+K1, B = 1.2, 0.75
+TOKEN = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset("""
+a about after am an and any are as at be been before but by can could did do does doing for from
+had has have how i if in into is it its just me my of on or our should so than that the them then
+there this to was we were what when which will with would you your
+""".split())
+
+def tokens(text: str) -> list:
+    out = []
+    for t in TOKEN.findall((text or "").lower()):
+        if t in STOPWORDS:
+            continue
+        if len(t) > 4 and t.endswith("s") and not t.endswith("ss"):
+            t = t[:-1]  # "shins" and "shin" are the same note
+        out.append(t)
+    return out
+
+class TextIndex:
+    def __init__(self):
+        self.entries = []
+        self.lengths = []
+        self.postings = {}  # term -> ([entry ids], [term counts])
+        self._arrays = {}   # term -> (ids, counts) as NumPy, dropped when the term grows
+        self._lengths = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry, text: str):
+        counts = Counter(tokens(text))
+        doc = len(self.entries)
+        self.entries.append(entry)
+        self.lengths.append(sum(counts.values()))
+        self._lengths = None
+        for term, n in counts.items():
+            ids, tfs = self.postings.setdefault(term, ([], []))
+            ids.append(doc)
+            tfs.append(n)
+            self._arrays.pop(term, None)
+
+    def _posting(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            ids, tfs = self.postings[term]
+            arrays = self._arrays[term] = (np.array(ids, dtype=np.int64), np.array(tfs, dtype=np.float64))
+        return arrays
+
+    def search(self, query: str, k: int = 8) -> list:
+        """Up to k (score, entry) pairs, best first; entries sharing no term with the query are skipped."""
+        n = len(self.entries)
+        terms = [t for t in set(tokens(query)) if t in self.postings]
+        if not n or not terms or k <= 0:
+            return []
+        if self._lengths is None:
+            self._lengths = np.array(self.lengths, dtype=np.float64)
+        norm = K1 * (1 - B + B * self._lengths / max(self._lengths.mean(), 1.0))
+        scores = np.zeros(n)
+        for term in terms:
+            ids, tfs = self._posting(term)
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (K1 + 1) / (tfs + norm[ids])
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(float(scores[i]), self.entries[i]) for i in hits]
+
+class LogIndex:
+    """TextIndex over a JSON-lines log, caught up from its last offset before each search."""
+
+    def __init__(self, path: str, text_of):
+        self.path = path
+        self.text_of = text_of
+        self.index = TextIndex()
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def _catch_up(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size < self.offset:  # rewritten or truncated: start over
+            self.index, self.offset = TextIndex(), 0
+        if size == self.offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = data.rfind(b"\n") + 1  # a line still being written waits for the next search
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crashed process
+            self.index.add(entry, self.text_of(entry))
+        self.offset += end
+
+    def search(self, query: str, k: int = 8) -> list:
+        with self._lock:
+            self._catch_up()
+            return self.index.search(query, k)
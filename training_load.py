@@ -0,0 +1,162 @@
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from activity_store import refresh_store, source_key, store_paths
+from analytics import daily_rollup, run_columns
+
+# Acute/chronic training load over the daily mileage series. Both loads are
+# exponentially weighted moving averages of miles per day (alpha = 2/(N+1),
+# N = 7 and 28 days); their ratio (ACWR) and difference (form, chronic minus
+# acute) are the usual fatigue signals.
+#
+# The full history goes through one vectorized filter. The filter state as of
+# the last completed day is then checkpointed next to the activity store, so
+# when the export only gains new days the update just steps the two
+# averages forward from the checkpoint instead of refiltering everything.
+#
+# Days without runs count as zero load, including the days between the last
+# run and today: the result is decayed forward to `as_of` (default today), so
+# a week off shows up as falling acute load rather than the last run's numbers.
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+LOAD_VERSION = 1
+
+_load_cache = {}
+
+def _alpha(n: int) -> float:
+    return 2.0 / (n + 1)
+
+def load_path(csv_path: str) -> str:
+    npz, _ = store_paths(csv_path)
+    return npz[: -len(".store.npz")] + ".load.json"
+
+def ewma(x: np.ndarray, n: int, start: float = 0.0) -> np.ndarray:
+    """EWMA of x starting from `start` (one vectorized pass)."""
+    values = pd.Series(np.concatenate([[start], x])).ewm(alpha=_alpha(n), adjust=False).mean()
+    return values.to_numpy()[1:]
+
+def _step(value: float, n: int, gap: int, miles: float) -> float:
+    # advance `gap` days where only the last one has miles
+    keep = 1.0 - _alpha(n)
+    return value * keep ** gap + _alpha(n) * miles
+
+def _zone(acwr):
+    if acwr is None:
+        return None
+    if acwr < 0.8:
+        return "detraining"
+    if acwr <= 1.3:
+        return "optimal"
+    if acwr <= 1.5:
+        return "caution"
+    return "high_risk"
+
+def _result(day, acute, chronic, as_of=None) -> dict:
+    # zero-load days from the last run up to as_of
+    gap = int((np.datetime64(as_of, "D") - day).astype(int)) if as_of is not None else 0
+    if gap > 0:
+        day = np.datetime64(as_of, "D")
+        acute *= (1 - _alpha(ACUTE_DAYS)) ** gap
+        chronic *= (1 - _alpha(CHRONIC_DAYS)) ** gap
+    acute, chronic = float(acute), float(chronic)
+    acwr = round(acute / chronic, 2) if chronic > 0 else None
+    return {
+        "as_of": str(day),
+        "acute_weekly_miles": round(acute * 7, 1),
+        "chronic_weekly_miles": round(chronic * 7, 1),
+        "acwr": acwr,
+        "acwr_zone": _zone(acwr),
+        "form": round((chronic - acute) * 7, 1),
+    }
+
+def compute_load(days: np.ndarray, miles: np.ndarray, as_of=None):
+    """Full recompute: dense daily series, both filters. Returns (result, checkpoint)."""
+    if len(days) == 0:
+        return None, None
+    first, last = days[0], days[-1]
+    dense = np.zeros(int((last - first).astype(int)) + 1)
+    np.add.at(dense, (days - first).astype(int), miles)
+    acute, chronic = ewma(dense, ACUTE_DAYS), ewma(dense, CHRONIC_DAYS)
+    checkpoint = {
+        "version": LOAD_VERSION,
+        "day": str(last - np.timedelta64(1, "D")),
+        "acute": float(acute[-2]) if len(dense) > 1 else 0.0,
+        "chronic": float(chronic[-2]) if len(dense) > 1 else 0.0,
+        "miles_through_day": float(dense[:-1].sum()),
+    }
+    return _result(last, acute[-1], chronic[-1], as_of), checkpoint
+
+def update_load(checkpoint: dict, days: np.ndarray, miles: np.ndarray, as_of=None):
+    """
+    Step the checkpointed averages over the days after it. Returns
+    (result, checkpoint), or (None, None) if the history before the
+    checkpoint changed and a full recompute is needed.
+    """
+    if not checkpoint or checkpoint.get("version") != LOAD_VERSION or len(days) == 0:
+        return None, None
+    day = np.datetime64(checkpoint["day"], "D")
+    i = int(np.searchsorted(days, day, side="right"))
+    if not np.isclose(miles[:i].sum(), checkpoint["miles_through_day"]) or i == len(days):
+        return None, None
+
+    acute, chronic, prev = checkpoint["acute"], checkpoint["chronic"], day
+    new_checkpoint = None
+    last = days[-1]
+    for d, m in zip(days[i:], miles[i:]):
+        gap = int((d - prev).astype(int))
+        if d == last:
+            # the latest day can still gain runs, so checkpoint just before it
+            base = (acute * (1 - _alpha(ACUTE_DAYS)) ** (gap - 1),
+                    chronic * (1 - _alpha(CHRONIC_DAYS)) ** (gap - 1))
+            new_checkpoint = {
+                "version": LOAD_VERSION,
+                "day": str(d - np.timedelta64(1, "D")),
+                "acute": base[0],
+                "chronic": base[1],
+                "miles_through_day": float(miles[:-1].sum()),
+            }
+        acute = _step(acute, ACUTE_DAYS, gap, float(m))
+        chronic = _step(chronic, CHRONIC_DAYS, gap, float(m))
+        prev = d
+    return _result(last, acute, chronic, as_of), new_checkpoint
+
+def _read_checkpoint(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_checkpoint(path, checkpoint):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+def load_from_columns(cols: dict, checkpoint_path=None, as_of=None) -> dict:
+    """Training load as of `as_of` (default today) for normalized activity columns,
+    using/refreshing the checkpoint if given."""
+    as_of = as_of or date.today()
+    daily = daily_rollup(run_columns(cols))
+    days, miles = daily["day"], daily["miles"]
+    checkpoint = _read_checkpoint(checkpoint_path) if checkpoint_path else None
+    result, new_checkpoint = update_load(checkpoint, days, miles, as_of)
+    if result is None:
+        result, new_checkpoint = compute_load(days, miles, as_of)
+    if checkpoint_path and new_checkpoint and new_checkpoint != checkpoint:
+        _write_checkpoint(checkpoint_path, new_checkpoint)
+    return result
+
+def training_load(csv_path: str) -> dict:
+    """Memoized training load for the export; checkpointed on disk between processes."""
+    version = (source_key(csv_path), date.today())
+    hit = _load_cache.get(csv_path)
+    if hit and hit[0] == version:
+        return hit[1]
+    result = load_from_columns(refresh_store(csv_path), load_path(csv_path))
+    _load_cache[csv_path] = (version, result)
+    return result
@@ -1,97 +1,299 @@
-from flask import Flask, request, jsonify, send_from_directory
-from datetime import date, timedelta
+from flask import Flask, Response, g, request, jsonify, send_from_directory
+from datetime import date, datetime, timedelta
 import json
+import os
+import re
+import time
 
 # --- import your existing stuff ---
-from plan_tools import load_plan, workout_on, week_for_date, next_week
-from coach_prompt import build_coach_chat_prompt
-from llm_openai import call_llm
+from plan_tools import workout_on, week_for_date, next_week, sessions_between
+from plan_ics import ics_events
+from coach_prompt import coach_chat_context
+from chat_sessions import converse, converse_stream, sessions as chat_sessions
+from memory_store import RECENT_NOTES
+from llm_pool import pool as llm_pool, LLMBusy, LLMTimeout
+from athletes import athletes, list_athletes, UnknownAthlete, DEFAULT_ATHLETE
+from agent import call_llm
+from batch_plans import jobs as batch_jobs, job_checkpoint_path, start_job
+from scheduler import Scheduler
+from adherence import adherence_summary
+from http_cache import conditional_json, conditional_stream, responses
+import metrics
 
-# If these exist in your project already, import them:
-# - load_memory()
-# - save_memory() (optional)
-# - get_training_summary() (your Strava summary)
-from agent import load_memory, get_training_summary  # adjust if your names differ
-
-def load_runner_history(path="runner_history.json"):
-    try:
-        with open(path, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
+# Every /api/... route also exists as /api/a/<athlete_id>/...; the unprefixed
+# form serves the default (single-user) athlete.
 
 app = Flask(__name__, static_folder="web", static_url_path="")
 
-mem = load_memory()
-plan_ref = load_plan()
+# started from __main__; keeps derived data warm and writes the daily brief
+scheduler = Scheduler(call_llm)
+
+def athlete_route(rule, **options):
+    def register(view):
+        view = app.route("/api/a/<athlete_id>" + rule, **options)(view)
+        return app.route("/api" + rule, defaults={"athlete_id": DEFAULT_ATHLETE}, **options)(view)
+    return register
+
+@app.before_request
+def start_request_timer():
+    g.metrics = metrics.begin_request("http", request.endpoint or "unmatched")
+
+@app.after_request
+def finish_request_timer(response):
+    athlete = (request.view_args or {}).get("athlete_id")
+    metrics.end_request(g.pop("metrics", None), response.status_code, method=request.method, athlete=athlete)
+    return response
+
+@app.teardown_request
+def finish_failed_request(error):
+    # after_request is skipped when a view raises
+    metrics.end_request(g.pop("metrics", None), 500)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.errorhandler(UnknownAthlete)
+def unknown_athlete(e):
+    return jsonify({"error": f"Unknown athlete: {e.args[0]}"}), 404
 
 @app.get("/")
 def index():
     return send_from_directory("web", "index.html")
 
-@app.get("/api/status")
-def api_status():
-    summary = get_training_summary()
-    history = load_runner_history()
-    return jsonify({
-        "runner_profile": mem.get("runner_profile"),
-        "training_summary": summary,
-        "runner_history": history,
-        "notes": mem.get("notes", [])[-10:]
-    })
-
-@app.get("/api/plan/today")
-def api_plan_today():
-    wk, dow, workout = workout_on(plan_ref, date.today())
-    return jsonify({"date": date.today().isoformat(), "week": wk, "day": dow, "workout": workout})
-
-@app.get("/api/plan/tomorrow")
-def api_plan_tomorrow():
-    d = date.today() + timedelta(days=1)
-    wk, dow, workout = workout_on(plan_ref, d)
-    return jsonify({"date": d.isoformat(), "week": wk, "day": dow, "workout": workout})
-
-@app.post("/api/note")
-def api_note():
+@app.get("/api/athletes")
+def api_athletes():
+    return jsonify({"athletes": list_athletes(), "cache": athletes.report()})
+
+def _midnight():
+    # responses that depend on today's date can't be older than this
+    return datetime.combine(date.today(), datetime.min.time()).astimezone()
+
+@athlete_route("/status", methods=["GET"])
+def api_status(athlete_id):
+    a = athletes.get(athlete_id)
+
+    def build():
+        series = a.series()
+        return {
+            "runner_profile": a.profile(),
+            "training_summary": a.report()["summary"],
+            "windows": series.windows() if series else {},
+            "training_load": a.training_load(),
+            "adherence": adherence_summary(a.adherence()),
+            "runner_history": a.history(),
+            "daily_brief": a.state().get("daily_brief"),
+            "notes": a.memory.recent_notes(10)
+        }
+
+    sources = [a.paths["memory"], a.memory.journal_path, a.memory.notes_path,
+               a.paths["activities"], a.paths["history"], a.paths["plan"]]
+    # adherence depends on today's date
+    return conditional_json((athlete_id, "status"), sources, build, vary=(date.today(),), as_of=_midnight())
+
+@athlete_route("/adherence", methods=["GET"])
+def api_adherence(athlete_id):
+    # per-day, per-week and whole-plan plan vs actual; ?as_of=YYYY-MM-DD (default today)
+    a = athletes.get(athlete_id)
+    try:
+        as_of = date.fromisoformat(request.args["as_of"]) if request.args.get("as_of") else date.today()
+    except ValueError:
+        return jsonify({"error": "as_of must be YYYY-MM-DD"}), 400
+    sources = [a.paths["activities"], a.paths["plan"]]
+    return conditional_json((athlete_id, "adherence"), sources, lambda: a.adherence(as_of), vary=(as_of,),
+                            as_of=None if request.args.get("as_of") else _midnight())
+
+@athlete_route("/stats", methods=["GET"])
+def api_stats(athlete_id):
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD, or no params for the standard windows
+    series = athletes.get(athlete_id).series()
+    if series is None:
+        return jsonify({"error": "No activities for this athlete"}), 404
+    csv = [athletes.get(athlete_id).paths["activities"]]
+    start_str, end_str = request.args.get("start"), request.args.get("end")
+    if not start_str and not end_str:
+        return conditional_json((athlete_id, "stats"), csv, series.windows)
+    try:
+        end = date.fromisoformat(end_str) if end_str else date.today()
+        start = date.fromisoformat(start_str) if start_str else end - timedelta(days=55)
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+    if start > end:
+        return jsonify({"error": "start must be on or before end"}), 400
+    return conditional_json((athlete_id, "stats", start, end), csv, lambda: series.query(start, end),
+                            as_of=None if end_str else _midnight())
+
+def plan_day(athlete_id, name, d):
+    a = athletes.get(athlete_id)
+
+    def build():
+        wk, dow, workout = workout_on(a.plan(), d)
+        return {"date": d.isoformat(), "week": wk, "day": dow, "workout": workout}
+
+    return conditional_json((athlete_id, name), [a.paths["plan"]], build, vary=(d,), as_of=_midnight())
+
+@athlete_route("/plan/today", methods=["GET"])
+def api_plan_today(athlete_id):
+    return plan_day(athlete_id, "plan/today", date.today())
+
+@athlete_route("/plan/tomorrow", methods=["GET"])
+def api_plan_tomorrow(athlete_id):
+    return plan_day(athlete_id, "plan/tomorrow", date.today() + timedelta(days=1))
+
+@athlete_route("/note", methods=["POST"])
+def api_note(athlete_id):
+    a = athletes.get(athlete_id)
     data = request.get_json(force=True) or {}
     text = (data.get("text") or "").strip()
     if not text:
         return jsonify({"error": "Missing note text"}), 400
-    mem.setdefault("notes", []).append({"ts": date.today().isoformat(), "text": text})
-    # If you have a save_memory() function, call it here:
-    # save_memory(mem)
+    a.memory.add_note({"time": datetime.now().isoformat(timespec="seconds"), "text": text})
     return jsonify({"ok": True})
 
-@app.post("/api/chat")
-def api_chat():
+def chat_turn(a, question):
+    # the session's context block (changes only with the data) plus what was
+    # retrieved for this question, which goes with the turn itself
+    plan_ref = a.plan()
+    cw = week_for_date(plan_ref, date.today())
+    nw = next_week(plan_ref, date.today())
+    summary, history, load = a.report()["summary"], a.history(), a.training_load()
+    adherence = adherence_summary(a.adherence())
+    with metrics.stage("retrieve_notes"):
+        notes = a.memory.relevant_notes(question, recent=0)
+        past_chats = a.memory.relevant_chats(question)
+
+    with metrics.stage("build_prompt"):
+        ctx, _ = coach_chat_context(
+            runner_profile=a.profile(),
+            summary=summary,
+            notes=a.memory.recent_notes(RECENT_NOTES),
+            current_week=cw,
+            next_week=nw,
+            history=history,
+            training_load=load,
+            adherence=adherence,
+        )
+    return {"ctx": ctx, "notes": notes, "past_chats": past_chats}
+
+def save_chat(a, question, answer):
+    a.memory.add_chat(question, answer, datetime.now().isoformat(timespec="seconds"))
+
+@athlete_route("/chat", methods=["POST"])
+def api_chat(athlete_id):
+    a = athletes.get(athlete_id)
+    data = request.get_json(force=True) or {}
+    question = (data.get("question") or "").strip()
+    if not question:
+        return jsonify({"error": "Missing question"}), 400
+
+    # "session_id" continues a conversation (a new one is started otherwise);
+    # "fresh": true skips the response cache
+    session = chat_sessions.get(data.get("session_id"), athlete_id)
+    turn = chat_turn(a, question)
+    try:
+        answer = converse(session, call_llm, question=question, run=llm_pool.run,
+                          bypass=bool(data.get("fresh")), **turn)
+    except LLMBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except LLMTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    save_chat(a, question, answer)
+    return jsonify({"answer": answer, "session_id": session.id})
+
+def sse(data, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+@athlete_route("/chat/stream", methods=["POST"])
+def api_chat_stream(athlete_id):
+    # Server-Sent Events: one "data" frame per text chunk, then "done".
+    a = athletes.get(athlete_id)
     data = request.get_json(force=True) or {}
     question = (data.get("question") or "").strip()
     if not question:
         return jsonify({"error": "Missing question"}), 400
 
-    summary = get_training_summary()
-    notes = mem.get("notes", [])
-    history = load_runner_history()
+    session = chat_sessions.get(data.get("session_id"), athlete_id)
+    turn = chat_turn(a, question)
+    bypass = bool(data.get("fresh"))
+    model = call_llm.model
 
-    cw = week_for_date(plan_ref, date.today())
-    nw = next_week(plan_ref, date.today())
+    def events():
+        # runs after the request has been logged, so it reports straight to the histograms
+        yield sse({"session_id": session.id}, event="session")
+        t0, first = time.perf_counter(), None
+        try:
+            for chunk in converse_stream(session, call_llm, question=question, stream=llm_pool.stream,
+                                         bypass=bypass, done=lambda answer: save_chat(a, question, answer), **turn):
+                if first is None:
+                    first = time.perf_counter() - t0
+                    metrics.observe("marathon_llm_first_chunk_seconds", first, model=model)
+                yield sse({"delta": chunk})
+        except Exception as e:
+            yield sse({"error": str(e)}, event="error")
+            return
+        metrics.observe("marathon_llm_seconds", time.perf_counter() - t0, model=model)
+        yield sse({}, event="done")
 
-    prompt = build_coach_chat_prompt(
-        question=question,
-        runner_profile=mem["runner_profile"],
-        summary=summary,
-        notes=notes,
-        current_week=cw,
-        next_week=nw,
-        history=history
-    )
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+BATCH_JOB_ID = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{4}$")
+
+# option: (type check, description for the error)
+BATCH_OPTIONS = {
+    "concurrency": (lambda v: type(v) is int and 1 <= v <= 64, "an integer from 1 to 64"),
+    "rate": (lambda v: type(v) in (int, float) and v >= 0, "a number >= 0"),
+    "burst": (lambda v: type(v) is int and 1 <= v <= 1000, "an integer from 1 to 1000"),
+    "retries": (lambda v: type(v) is int and 0 <= v <= 10, "an integer from 0 to 10"),
+    "use_llm": (lambda v: type(v) is bool, "true or false"),
+}
+
+@app.post("/api/batch/plans")
+def api_batch_plans():
+    # {"athletes": [...], "concurrency": 4, "rate": 2, "resume": "<job id>", "use_llm": false}; all athletes by default
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    ids = data.get("athletes") or list_athletes()
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return jsonify({"error": "athletes must be a list of ids"}), 400
+    options = {}
+    for key, (valid, expected) in BATCH_OPTIONS.items():
+        if key in data:
+            if not valid(data[key]):
+                return jsonify({"error": f"{key} must be {expected}"}), 400
+            options[key] = data[key]
+    resume = data.get("resume")
+    if resume is not None and not (isinstance(resume, str) and BATCH_JOB_ID.match(resume)
+                                   and os.path.exists(job_checkpoint_path(resume))):
+        return jsonify({"error": "resume must be the id of an earlier job"}), 400
+    job_id = start_job(ids, call_llm, resume_job=resume, **options)
+    return jsonify({"job": job_id}), 202
+
+@app.get("/api/batch/plans/<job_id>")
+def api_batch_plan_job(job_id):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
 
-    answer = call_llm(prompt)
-    return jsonify({"answer": answer.strip()})
+@app.get("/api/llm/cache")
+def api_llm_cache():
+    return jsonify(call_llm.stats)
 
-@app.get("/api/plan/week")
-def api_plan_week():
+@app.get("/api/chat/sessions")
+def api_chat_sessions():
+    return jsonify(chat_sessions.report())
+
+@app.get("/api/llm/pool")
+def api_llm_pool():
+    return jsonify({**llm_pool.stats, "workers": llm_pool.workers, "queue_limit": llm_pool.queue_limit})
+
+@athlete_route("/plan/week", methods=["GET"])
+def api_plan_week(athlete_id):
     # Optional query param: ?start=YYYY-MM-DD
+    a = athletes.get(athlete_id)
     start_str = request.args.get("start")
     if start_str:
         start = date.fromisoformat(start_str)
@@ -100,25 +302,95 @@ def api_plan_week():
         today = date.today()
         start = today - timedelta(days=today.weekday())
 
-    days = []
-    for i in range(7):
-        d = start + timedelta(days=i)
-        wk, dow, workout = workout_on(plan_ref, d)
-        days.append({
+    def build():
+        plan_ref = a.plan()
+        days = []
+        for i in range(7):
+            d = start + timedelta(days=i)
+            wk, dow, workout = workout_on(plan_ref, d)
+            days.append({
+                "date": d.isoformat(),
+                "weekday": dow,
+                "week_label": wk,
+                "workout": workout or "OFF"
+            })
+
+        return {
+            "start": start.isoformat(),
+            "end": (start + timedelta(days=6)).isoformat(),
+            "days": days
+        }
+
+    as_of = None if start_str else _midnight()
+    return conditional_json((athlete_id, "plan/week"), [a.paths["plan"]], build, vary=(start,), as_of=as_of)
+
+def _date_args(required=True):
+    # (start, end, error_response) from ?start=&end=
+    start_str, end_str = request.args.get("start"), request.args.get("end")
+    if required and not (start_str and end_str):
+        return None, None, (jsonify({"error": "start and end are required (YYYY-MM-DD)"}), 400)
+    try:
+        start = date.fromisoformat(start_str) if start_str else None
+        end = date.fromisoformat(end_str) if end_str else None
+    except ValueError:
+        return None, None, (jsonify({"error": "Dates must be YYYY-MM-DD"}), 400)
+    if start and end and start > end:
+        return None, None, (jsonify({"error": "start must be on or before end"}), 400)
+    return start, end, None
+
+@athlete_route("/plan/range", methods=["GET"])
+def api_plan_range(athlete_id):
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD; only days inside plan weeks are listed
+    a = athletes.get(athlete_id)
+    start, end, error = _date_args()
+    if error:
+        return error
+
+    def build():
+        days = [{
             "date": d.isoformat(),
             "weekday": dow,
-            "week_label": wk,
+            "week_label": week["week_label"],
             "workout": workout or "OFF"
-        })
+        } for d, week, dow, workout in sessions_between(a.plan(), start, end)]
+        return {"start": start.isoformat(), "end": end.isoformat(), "days": days}
+
+    return conditional_json((athlete_id, "plan/range"), [a.paths["plan"]], build, vary=(start, end))
+
+@athlete_route("/plan.ics", methods=["GET"])
+def api_plan_ics(athlete_id):
+    # whole plan by default; ?start=&end= narrows it
+    a = athletes.get(athlete_id)
+    start, end, error = _date_args(required=False)
+    if error:
+        return error
+    plan_path = a.paths["plan"]
+    stamp = datetime.fromtimestamp(os.stat(plan_path).st_mtime).astimezone()
+    return conditional_stream(
+        (athlete_id, "plan.ics"), [plan_path],
+        lambda: ics_events(a.plan(), start, end, stamp=stamp),
+        mimetype="text/calendar", vary=(start, end),
+        headers={"Content-Disposition": f'attachment; filename="{athlete_id}-plan.ics"'},
+    )
 
-    return jsonify({
-        "start": start.isoformat(),
-        "end": (start + timedelta(days=6)).isoformat(),
-        "days": days
-    })
+@app.get("/api/scheduler")
+def api_scheduler():
+    return jsonify(scheduler.report())
+
+@app.get("/api/http/cache")
+def api_http_cache():
+    return jsonify(responses.report())
 
 
 if __name__ == "__main__":
     # http://127.0.0.1:5000
-    app.run(debug=True)
-
+    # MARATHON_ENV=production serves with a fixed request thread pool
+    if os.getenv("MARATHON_SCHEDULER", "1") != "0":
+        # under the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves
+        if os.getenv("MARATHON_ENV") == "production" or os.getenv("WERKZEUG_RUN_MAIN") == "true":
+            scheduler.start()
+    if os.getenv("MARATHON_ENV") == "production":
+        from serving import serve
+        serve(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")))
+    else:
+        app.run(debug=True)
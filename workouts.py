@@ -0,0 +1,97 @@
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
+# Parser for the free-text sessions in plan_reference.json, e.g.
+# "6 km easy + 4×20s strides", "5×1 km @ race pace", "20 min jog", "OFF".
+# Plans repeat the same few dozen strings, so results are memoized per
+# string and every regex is compiled once.
+#
+# A distance after "with", "incl." or "@" is part of the one before it
+# ("12 km with 6 km at marathon pace" is 12 km), so only the head counts.
+# Marathon or half-marathon pace, and "second half faster", are workouts:
+# a race says "race" (not "race pace"), names the (half) marathon, or has 🏁.
+
+KM_PER_UNIT = {"km": 1.0, "k": 1.0, "mi": 1.60934, "mile": 1.60934, "miles": 1.60934, "m": 0.001}
+HALF_KM, MARATHON_KM = 21.0975, 42.195
+
+_NUM = r"(\d+(?:[.,]\d+)?)"
+_REPEAT_DIST = re.compile(_NUM + r"\s*[×x]\s*" + _NUM + r"\s*(km|k|mi|miles?|m)\b", re.I)
+_DIST = re.compile(_NUM + r"(?:\s*[–-]\s*" + _NUM + r")?\s*(km|k|mi|miles?|m)\b", re.I)
+_REPEAT_MIN = re.compile(_NUM + r"\s*[×x]\s*" + _NUM + r"\s*min\b", re.I)
+_MIN = re.compile(_NUM + r"(?:\s*[–-]\s*" + _NUM + r")?\s*min\b", re.I)
+_PAREN = re.compile(r"\([^)]*\)")
+_PACE = re.compile(r"@\s*[\d:–\- ]+(?:/\s*(?:km|mi))?")
+_PARTS = re.compile(r"\bwith\b|\bincl(?:\.|uding\b|\b)|@", re.I)
+
+REST_WORDS = re.compile(r"^\s*(off|rest(?: day)?)\s*$", re.I)
+CROSS_WORDS = re.compile(r"\b(strength|pilates|gym|yoga|cross|bike|swim|mobility)\b", re.I)
+_NOT_PACE = r"(?!\s*-?\s*pace\b)"
+RACE_WORDS = re.compile(
+    r"🏁|\brace\b" + _NOT_PACE
+    + r"|(?<!second )(?<!first )\bhalf[ -]marathon\b" + _NOT_PACE
+    + r"|(?<!half )(?<!half-)\bmarathon\b" + _NOT_PACE,
+    re.I)
+TYPE_WORDS = [
+    ("race_pace", re.compile(r"(?:race|marathon)[ -]?pace|\bMP\b|\bHMP\b", re.I)),
+    ("intervals", re.compile(r"\d\s*[×x]\s*\d+(?:[.,]\d+)?\s*(?:km|k|mi|m|min)\b", re.I)),
+    ("threshold", re.compile(r"threshold|tempo|comfortably hard", re.I)),
+    ("long", re.compile(r"\blong\b", re.I)),
+    ("progression", re.compile(r"→|fast|steady", re.I)),
+    ("strides", re.compile(r"strides", re.I)),
+    ("easy", re.compile(r"easy|relaxed|slow|jog|recovery", re.I)),
+]
+
+def _num(s):
+    return float(s.replace(",", "."))
+
+def _range(lo, hi):
+    # "20–25 min" counts as the midpoint
+    return (_num(lo) + _num(hi)) / 2 if hi else _num(lo)
+
+def parse_workout(text):
+    """
+    {"kind": "rest"|"cross"|"run"|"race", "type", "distance_km", "minutes",
+    "optional"} for one session string. distance_km/minutes are None when
+    the session doesn't say. Returns a new dict on every call.
+    """
+    return dict(_parse(text))
+
+def _head(body, pattern):
+    # the part before "with"/"incl."/"@" if it has its own amount, else everything
+    head = _PARTS.split(body, 1)[0]
+    return head if pattern.search(head) else body
+
+@lru_cache(maxsize=4096)
+def _parse(text):
+    raw = (text or "").strip()
+    out = {"kind": "run", "type": "run", "distance_km": None, "minutes": None,
+           "optional": raw.lower().startswith("optional")}
+    if not raw or REST_WORDS.match(raw):
+        return MappingProxyType({**out, "kind": "rest", "type": "rest"})
+
+    body = _PAREN.sub(" ", raw)  # "(last 8 km fast)" is inside the total
+    dist_body = _PACE.sub(" ", _head(body, _DIST))
+    km = 0.0
+    for reps, dist, unit in _REPEAT_DIST.findall(dist_body):
+        km += _num(reps) * _num(dist) * KM_PER_UNIT[unit.lower()]
+    rest = _REPEAT_DIST.sub(" ", dist_body)
+    for lo, hi, unit in _DIST.findall(rest):
+        km += _range(lo, hi) * KM_PER_UNIT[unit.lower()]
+    min_body = _PACE.sub(" ", _head(body, _MIN))
+    minutes = sum(_num(r) * _num(m) for r, m in _REPEAT_MIN.findall(min_body))
+    minutes += sum(_range(lo, hi) for lo, hi in _MIN.findall(_REPEAT_MIN.sub(" ", min_body)))
+    if km:
+        out["distance_km"] = round(km, 2)
+    if minutes:
+        out["minutes"] = round(minutes, 1)
+
+    if RACE_WORDS.search(raw):
+        out["kind"] = out["type"] = "race"
+        if out["distance_km"] is None:
+            out["distance_km"] = HALF_KM if re.search(r"half", raw, re.I) else MARATHON_KM
+        return MappingProxyType(out)
+    if CROSS_WORDS.search(raw) and out["distance_km"] is None and out["minutes"] is None:
+        return MappingProxyType({**out, "kind": "cross", "type": "cross"})
+    out["type"] = next((name for name, pattern in TYPE_WORDS if pattern.search(raw)), "run")
+    return MappingProxyType(out)